@@ -0,0 +1,23 @@
+# Generated by Django 5.1.6 on 2026-10-17 06:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0002_alter_user_id'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='used_bytes',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AlterField(
+            model_name='user',
+            name='quota',
+            field=models.BigIntegerField(default=5368709120),
+        ),
+    ]
@@ -13,7 +13,8 @@ class User(AbstractBaseUser, PermissionsMixin):
     is_active = models.BooleanField(default=True)
     is_staff = models.BooleanField(default=False)
     date_joined = models.DateTimeField(auto_now_add=True)
-    quota = models.IntegerField(default=1024 * 1024 * 1024 * 5)  # Default quota in GB
+    quota = models.BigIntegerField(default=1024 * 1024 * 1024 * 5)  # Default quota in GB
+    used_bytes = models.BigIntegerField(default=0)  # Total size of the user's files, kept up to date by drive
 
     objects = UserManager()
 
@@ -59,15 +59,12 @@ class LoginSerializer(serializers.Serializer):
 
 
 class StorageInfoSerializer(serializers.ModelSerializer):
-    used_storage = serializers.SerializerMethodField()
+    used_storage = serializers.IntegerField(source="used_bytes", read_only=True)
 
     class Meta:
         model = User
         fields = ["quota", "used_storage"]
 
-    def get_used_storage(self, obj):
-        return sum(file.size for file in obj.files.all())
-
 class RegisterSerializer(serializers.ModelSerializer):
     password = serializers.CharField(write_only=True)
     token = serializers.SerializerMethodField(read_only=True)
@@ -76,6 +76,18 @@ TEMPLATES = [
 WSGI_APPLICATION = "config.wsgi.application"
 ASGI_APPLICATION = "config.asgi.application"
 
+# Change feed over WebSockets; multi-node deployments need a shared layer
+# such as channels_redis
+CHANNEL_LAYERS = {
+    "default": {"BACKEND": "channels.layers.InMemoryChannelLayer"},
+}
+
+# Share links and listings are invalidated through the default cache, which
+# must be shared by all workers outside of DEBUG (see drive.E001)
+CACHES = {
+    "default": env.cache("CACHE_URL", default="locmemcache://"),
+}
+
 DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.sqlite3",
@@ -116,6 +128,31 @@ if not DEBUG:
 MEDIA_URL = "/media/"
 MEDIA_ROOT = BASE_DIR / "media"
 
+# Check quotas before accepting an upload, and hash uploads while they
+# stream in so they can be stored by content
+FILE_UPLOAD_HANDLERS = [
+    "drive.uploadhandlers.QuotaUploadHandler",
+    "drive.uploadhandlers.HashingMemoryFileUploadHandler",
+    "drive.uploadhandlers.HashingTemporaryFileUploadHandler",
+]
+
+# Hand file downloads to the front proxy: "x-accel-redirect" (nginx, with an
+# internal location mapping DRIVE_SENDFILE_PREFIX to MEDIA_ROOT) or "x-sendfile"
+DRIVE_SENDFILE = env("DRIVE_SENDFILE", default=None)
+DRIVE_SENDFILE_PREFIX = env("DRIVE_SENDFILE_PREFIX", default="/protected/")
+
+# Post-upload processing runs in `manage.py run_worker`; eager mode runs the
+# jobs in the web process right after the commit instead (development, tests)
+DRIVE_TASKS_EAGER = env.bool("DRIVE_TASKS_EAGER", default=False)
+
+# Deleted files and folders stay in the trash this long before
+# `manage.py purge_trash` (run it daily from cron) removes them for good
+DRIVE_TRASH_RETENTION_DAYS = env.int("DRIVE_TRASH_RETENTION_DAYS", default=30)
+
+# Resumable uploads that receive no chunk for this long stop reserving quota,
+# and `manage.py expire_uploads` (run it hourly from cron) drops them
+DRIVE_UPLOAD_EXPIRY_HOURS = env.int("DRIVE_UPLOAD_EXPIRY_HOURS", default=24)
+
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
 AUTH_USER_MODEL = "accounts.User"
@@ -132,7 +169,9 @@ REST_FRAMEWORK = {
     ],
     'DEFAULT_THROTTLE_RATES': {
         'anon': '200/day',
-        'user': '1000/day'
+        'user': '1000/day',
+        # Per client and link, on the public share link views
+        'share_link': '100/hour',
     }
 }
 
@@ -8,9 +8,8 @@ from rest_framework_simplejwt.views import (
 from django.conf import settings
 from django.conf.urls.static import static
 from django.views.decorators.csrf import csrf_exempt
-from graphene_file_upload.django import FileUploadGraphQLView
 
-from drive.views import FolderViewSet, FileViewSet, ShareLinkAPIView
+from drive.views import FolderViewSet, FileViewSet, UploadViewSet, ChangeFeedView, BulkOperationView, TrashView, GraphQLView, download_file, file_thumbnail, share_link, share_link_download
 from accounts.views import (
     TokenObtainView,
     RegisterView,
@@ -23,6 +22,7 @@ from accounts.views import (
 router = routers.DefaultRouter()
 router.register("folders", FolderViewSet, basename="folder")
 router.register("files", FileViewSet, basename="file")
+router.register("uploads", UploadViewSet, basename="upload")
 
 urlpatterns = [
     path("", include("accounts.urls")),
@@ -30,7 +30,7 @@ urlpatterns = [
 
     # Admin routes
     path("admin/", admin.site.urls),
-    path("graphql/", csrf_exempt(FileUploadGraphQLView.as_view(graphiql=True))),
+    path("graphql/", csrf_exempt(GraphQLView.as_view(graphiql=True))),
     # Authentication routes
     path("api/v1/token/", TokenObtainView.as_view(), name="token"),
     path("api/v1/token/refresh/", TokenRefreshView.as_view(), name="token-refresh"),
@@ -42,6 +42,13 @@ urlpatterns = [
     # User routes
     path("api/user/", UserDetailView.as_view(), name="user-detail"),
     # API routes
+    # Async views, streaming without holding a thread under ASGI
+    path("api/files/<uuid:pk>/download/", download_file, name="file-download"),
+    path("api/files/<uuid:pk>/thumbnail/<int:size>/", file_thumbnail, name="file-thumbnail"),
+    path("api/share/<uuid:token>/", share_link, name="share-link"),
+    path("api/share/<uuid:token>/download/", share_link_download, name="share-link-download"),
+    path("api/changes/", ChangeFeedView.as_view(), name="changes"),
+    path("api/bulk/<str:operation>/", BulkOperationView.as_view(), name="bulk"),
+    path("api/trash/", TrashView.as_view(), name="trash"),
     path("api/", include(router.urls)),
-    path("api/share/<uuid:token>/", ShareLinkAPIView.as_view(), name="share-link"),
 ] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
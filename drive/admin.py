@@ -2,7 +2,7 @@ from django.contrib.admin import AdminSite
 from django.contrib import admin
 from django.utils.html import format_html
 from django.urls import reverse
-from .models import Folder, File, Share, ShareLink
+from .models import Blob, Folder, File, Share, ShareLink
 
 
 @admin.register(Folder)
@@ -120,6 +120,14 @@ class ShareLinkAdmin(admin.ModelAdmin):
             'created_by', 'file', 'folder'
         )
 
+@admin.register(Blob)
+class BlobAdmin(admin.ModelAdmin):
+    list_display = ("sha256", "size", "ref_count", "created_at")
+    search_fields = ("sha256",)
+    ordering = ("-created_at",)
+    readonly_fields = ("sha256", "file", "size", "ref_count", "created_at")
+
+
 AdminSite.site_header = "Loot Administration"
 AdminSite.site_title = "Loot Drive Admin"
 AdminSite.index_title = "Welcome to Loot Drive Admin"
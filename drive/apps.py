@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class DriveConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'drive'
+
+    def ready(self):
+        from . import checks  # noqa: F401
+        from . import signals  # noqa: F401
+        from . import processing  # noqa: F401
@@ -0,0 +1,131 @@
+import posixpath
+import re
+import zipfile
+from django.utils import timezone
+
+from .models import File
+
+BLOCK_SIZE = 256 * 1024
+
+# Formats that are already compressed and gain nothing from deflate
+COMPRESSED_TYPES = {
+    "application/zip",
+    "application/gzip",
+    "application/x-gzip",
+    "application/x-bzip2",
+    "application/x-xz",
+    "application/x-7z-compressed",
+    "application/x-rar-compressed",
+    "application/vnd.rar",
+    "application/zstd",
+    "application/pdf",
+    "application/epub+zip",
+    "application/java-archive",
+}
+COMPRESSED_PREFIXES = ("image/", "video/", "audio/", "application/vnd.openxmlformats-", "application/vnd.oasis.opendocument.")
+UNCOMPRESSED_TYPES = {"image/svg+xml", "image/bmp", "image/x-ms-bmp", "image/tiff", "audio/wav", "audio/x-wav"}
+
+
+def is_compressed(mime_type):
+    """Whether content of this MIME type is already compressed."""
+    mime_type = (mime_type or "").lower()
+    if mime_type in UNCOMPRESSED_TYPES:
+        return False
+    return mime_type in COMPRESSED_TYPES or mime_type.startswith(COMPRESSED_PREFIXES)
+
+
+class _Sink:
+    """Unseekable file-like object buffering what ZipFile writes until it is drained.
+
+    Without `tell`/`seek` ZipFile writes sizes and CRCs in data descriptors
+    after each member instead of seeking back, so nothing has to be buffered
+    beyond the current block.
+    """
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def _safe_name(name, placeholder="unnamed"):
+    """Make an item name safe to use as one component of a member path.
+
+    Names are not trusted to be free of separators: "../../x" or "/etc/x"
+    would otherwise let the archive write outside the folder it is
+    extracted to. Separators are dropped along with "." and ".." parts.
+    """
+    parts = [part for part in re.split(r"[/\\]+", name or "") if part not in ("", ".", "..")]
+    return "_".join(parts) or placeholder
+
+
+def _unique(name, used):
+    """Rename `name` to "stem-2.ext", "stem-3.ext"... if it is already in `used`."""
+    candidate, n = name, 1
+    stem, ext = posixpath.splitext(name)
+    while candidate in used:
+        n += 1
+        candidate = f"{stem}-{n}{ext}"
+    used.add(candidate)
+    return candidate
+
+
+def _date_time(moment):
+    return max(timezone.localtime(moment).timetuple()[:6], (1980, 1, 1, 0, 0, 0))
+
+
+def stream_folder(folder):
+    """Generate a ZIP64 archive of a folder and everything below it.
+
+    Folders are read up front to build the archive paths, then files are
+    iterated from the database and copied one block at a time, so memory
+    stays constant in the size of the files. Data is yielded as soon as it
+    is compressed, so the client starts receiving the archive immediately.
+
+    Args:
+        folder: The Folder at the root of the archive
+
+    Yields:
+        bytes: Consecutive parts of the archive
+    """
+    return (data for data in _write_folder(folder) if data)
+
+
+def _write_folder(folder):
+    sink = _Sink()
+    used = set()
+    paths = {}
+    with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_DEFLATED, allowZip64=True) as archive:
+        for sub in folder.get_descendants(include_self=True).order_by("depth", "name").only("id", "name", "parent_folder_id", "created_at"):
+            parent = paths.get(sub.parent_folder_id, "") if sub.pk != folder.pk else ""
+            paths[sub.pk] = _unique(posixpath.join(parent, _safe_name(sub.name)), used)
+            info = zipfile.ZipInfo(paths[sub.pk] + "/", _date_time(sub.created_at))
+            info.external_attr = (0o40755 << 16) | 0x10
+            archive.writestr(info, b"")
+        yield sink.drain()
+
+        # A file can still be live in a trashed folder, e.g. an upload committed to it
+        files = File.objects.filter(
+                folder__path__startswith=folder.path, folder__deleted_at__isnull=True).order_by("folder_id", "name")
+        for file in files.iterator(chunk_size=500):
+            info = zipfile.ZipInfo(_unique(posixpath.join(paths[file.folder_id], _safe_name(file.name)), used), _date_time(file.created_at))
+            info.external_attr = 0o644 << 16
+            info.compress_type = zipfile.ZIP_STORED if is_compressed(file.mime_type) else zipfile.ZIP_DEFLATED
+            # Known sizes let ZipFile pick ZIP64 headers for members over 4 GB
+            info.file_size = file.size or 0
+            with file.file.storage.open(file.file.name, "rb") as source, archive.open(info, "w") as target:
+                for block in iter(lambda: source.read(BLOCK_SIZE), b""):
+                    target.write(block)
+                    yield sink.drain()
+            yield sink.drain()
+    yield sink.drain()
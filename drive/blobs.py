@@ -0,0 +1,160 @@
+import hashlib
+import os
+from collections import defaultdict
+from functools import partial
+from django.core.files import File as DjangoFile
+from django.core.files.storage import default_storage
+from django.db import transaction, IntegrityError
+from django.db.models import F
+
+from .models import Blob, File, blob_path
+
+BLOCK_SIZE = 64 * 1024
+
+
+def hash_file(content):
+    """Compute the SHA-256 digest of a Django File by streaming its chunks."""
+    digest = hashlib.sha256()
+    content.seek(0)
+    for chunk in content.chunks(BLOCK_SIZE):
+        digest.update(chunk)
+    content.seek(0)
+    return digest.hexdigest()
+
+
+def _acquire(sha256, size, write):
+    """Take a reference on the blob for `sha256`, writing its bytes if it is new.
+
+    Args:
+        sha256: Digest of the content
+        size: Size of the content in bytes
+        write: Callable storing the content under a storage name and returning
+            the name actually used; only called when no blob exists yet
+    """
+    for attempt in range(2):
+        try:
+            with transaction.atomic():
+                if Blob.objects.filter(pk=sha256).update(ref_count=F('ref_count') + 1):
+                    return Blob.objects.get(pk=sha256)
+                blob = Blob(sha256=sha256, size=size, ref_count=1)
+                name = blob_path(blob, None)
+                blob.file.name = name if default_storage.exists(name) else write(name)
+                blob.save(force_insert=True)
+                return blob
+        except IntegrityError:
+            # Another upload created the blob first, take a reference on it instead
+            if attempt:
+                raise
+
+
+def store_file(content):
+    """Store a Django File (e.g. an upload) as a blob and take a reference on it.
+
+    Uses the digest computed while the upload was streamed when the upload
+    handler provided one, and reads the content once otherwise.
+
+    Returns:
+        Blob: The blob now holding the content
+    """
+    sha256 = getattr(content, 'sha256', None) or hash_file(content)
+    return _acquire(sha256, content.size, lambda name: default_storage.save(name, content))
+
+
+def store_path(path, sha256, size):
+    """Store a local staging file as a blob and take a reference on it.
+
+    The file is renamed into place when storage is on the local filesystem
+    and copied into storage otherwise. It is removed in every case.
+
+    Returns:
+        Blob: The blob now holding the content
+    """
+    def write(name):
+        try:
+            target = default_storage.path(name)
+        except NotImplementedError:
+            with open(path, 'rb') as staging:
+                return default_storage.save(name, DjangoFile(staging))
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        os.replace(path, target)
+        return name
+
+    blob = _acquire(sha256, size, write)
+    if os.path.exists(path):
+        os.remove(path)
+    return blob
+
+
+def add_references(counts):
+    """Take extra references on blobs, e.g. when files are copied.
+
+    Blobs gaining the same number of references are updated together, so
+    copying a whole folder costs one UPDATE per distinct count, typically
+    just one.
+
+    Args:
+        counts: Maps blob digests to the number of references to add
+    """
+    by_count = defaultdict(list)
+    for sha256, count in counts.items():
+        by_count[count].append(sha256)
+    for count, digests in by_count.items():
+        Blob.objects.filter(pk__in=digests).update(ref_count=F('ref_count') + count)
+
+
+def release(sha256, count=1):
+    """Drop references on a blob, deleting it and its bytes once the transaction commits unused."""
+    Blob.objects.filter(pk=sha256).update(ref_count=F('ref_count') - count)
+    if Blob.objects.filter(pk=sha256, ref_count__lte=0).exists():
+        transaction.on_commit(lambda: delete_unused(sha256))
+
+
+def release_many(counts):
+    """Drop references on many blobs, e.g. when files are purged.
+
+    Blobs losing the same number of references are updated together, see
+    `add_references`.
+
+    Args:
+        counts: Maps blob digests to the number of references to drop
+    """
+    add_references({sha256: -count for sha256, count in counts.items()})
+    for sha256 in Blob.objects.filter(pk__in=list(counts), ref_count__lte=0).values_list('pk', flat=True):
+        transaction.on_commit(partial(delete_unused, sha256))
+
+
+def release_content(storage, name):
+    """Delete the bytes of a file stored before blobs, once no file uses them.
+
+    Such files own their bytes, but copies may share them.
+    """
+    def delete_content():
+        if not File.all_objects.filter(file=name).exists():
+            storage.delete(name)
+
+    transaction.on_commit(delete_content)
+
+
+def delete_unused(sha256):
+    """Delete a blob and its bytes, unless it was referenced again.
+
+    The row stays locked while its bytes are deleted: an upload of the
+    same content either takes a reference before, or waits for the row to
+    be gone and writes the bytes anew, it never reuses bytes being deleted.
+
+    Returns:
+        bool: Whether the blob was deleted
+    """
+    with transaction.atomic():
+        blob = Blob.objects.select_for_update().filter(pk=sha256, ref_count__lte=0).first()
+        if blob is None:
+            return False
+        for name in [*blob.previews.values_list('file', flat=True), blob.file.name]:
+            default_storage.delete(name)
+        blob.delete()
+    return True
+
+
+def collect_garbage():
+    """Delete blobs no file references any more. Returns how many were deleted."""
+    return sum(delete_unused(sha256) for sha256 in Blob.objects.filter(ref_count__lte=0).values_list('pk', flat=True))
@@ -0,0 +1,109 @@
+import threading
+import time
+from collections import OrderedDict
+from django.core.cache import caches
+
+_MISSING = object()
+
+
+class LRUCache:
+    """A small thread-safe in-process cache with LRU eviction and a TTL per entry.
+
+    Args:
+        maxsize: Number of entries kept before the least recently used is evicted
+        ttl: Seconds an entry stays valid
+    """
+
+    def __init__(self, maxsize=1024, ttl=5):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            value, expires = self._data.get(key, (_MISSING, 0))
+            if value is _MISSING:
+                return default
+            if expires < time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + (self.ttl if ttl is None else ttl))
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class TieredCache:
+    """An in-process LRU tier in front of a shared Django cache backend.
+
+    Reads are answered from process memory when possible, then from the
+    shared backend, which is refilled by the caller on a miss. Deleting a
+    key clears it from the backend and from this process; other processes
+    keep their copy until its short local TTL runs out.
+
+    Args:
+        prefix: Namespace of the keys in the shared backend
+        version: Version of the cached format, bump it to ignore old entries
+        ttl: Seconds entries live in the shared backend
+        local_ttl: Seconds entries live in process memory
+        maxsize: Number of entries kept in process memory
+        alias: Django cache alias of the shared backend
+    """
+
+    def __init__(self, prefix, version=1, ttl=300, local_ttl=5, maxsize=1024, alias="default"):
+        self.prefix = prefix
+        self.version = version
+        self.ttl = ttl
+        self.local = LRUCache(maxsize, local_ttl)
+        self.alias = alias
+
+    @property
+    def backend(self):
+        return caches[self.alias]
+
+    def make_key(self, key):
+        return f"{self.prefix}:{key}"
+
+    def get(self, key, default=None):
+        value = self.local.get(key, _MISSING)
+        if value is _MISSING:
+            value = self.backend.get(self.make_key(key), _MISSING, version=self.version)
+            if value is _MISSING:
+                return default
+            self.local.set(key, value)
+        return value
+
+    def set(self, key, value):
+        self.backend.set(self.make_key(key), value, self.ttl, version=self.version)
+        self.local.set(key, value)
+
+    def delete(self, key):
+        self.backend.delete(self.make_key(key), version=self.version)
+        self.local.delete(key)
+
+    async def aget(self, key, default=None):
+        value = self.local.get(key, _MISSING)
+        if value is _MISSING:
+            value = await self.backend.aget(self.make_key(key), _MISSING, version=self.version)
+            if value is _MISSING:
+                return default
+            self.local.set(key, value)
+        return value
+
+    async def aset(self, key, value):
+        await self.backend.aset(self.make_key(key), value, self.ttl, version=self.version)
+        self.local.set(key, value)
@@ -0,0 +1,100 @@
+import base64
+from django.contrib.auth import get_user_model
+from django.db import connection
+
+from .models import Change, File, Folder, Share
+from .pagination import InvalidCursor
+
+CHANGE_PAGE_SIZE = 500
+MAX_CHANGE_PAGE_SIZE = 5000
+
+
+def journal_entries(action, item):
+    """Build the journal rows recording a change to a File, Folder or Share."""
+    if isinstance(item, Share):
+        fields = dict(kind=Change.Kind.SHARE, parent_id=item.file_id or item.folder_id, name=item.permission)
+        users = {item.shared_by_id, item.shared_with_id}
+    elif isinstance(item, File):
+        fields = dict(kind=Change.Kind.FILE, parent_id=item.folder_id, name=item.name, size=item.size)
+        users = {item.user_id}
+    else:
+        fields = dict(kind=Change.Kind.FOLDER, parent_id=item.parent_folder_id, name=item.name)
+        users = {item.user_id}
+    return [Change(user_id=user_id, action=action, item_id=item.pk, **fields) for user_id in users if user_id]
+
+
+def append(entries):
+    """Append journal rows. Call it inside the transaction making the change.
+
+    A client resumes after the last `seq` it has read, so a user's rows
+    must become visible in `seq` order: on databases where transactions
+    commit concurrently, a row with a lower `seq` could otherwise commit
+    after a client read past it, and be skipped for good. The users are
+    locked until the transaction ends, so their rows are allocated and
+    committed one transaction at a time. SQLite already serializes writers.
+    """
+    if connection.features.has_select_for_update:
+        user_ids = sorted({entry.user_id for entry in entries})
+        list(get_user_model().objects.select_for_update().filter(pk__in=user_ids).order_by("pk").values_list("pk"))
+    Change.objects.bulk_create(entries)
+
+
+def record(action, item):
+    """Append a change to the journal. Call it inside the transaction making the change."""
+    append(journal_entries(action, item))
+
+
+def encode_change_cursor(seq):
+    return base64.urlsafe_b64encode(f"seq|{seq}".encode()).decode()
+
+
+def decode_change_cursor(cursor):
+    """Decode a cursor produced by `encode_change_cursor`.
+
+    Raises:
+        InvalidCursor: If the cursor is not a change cursor.
+    """
+    try:
+        prefix, seq = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        if prefix != "seq":
+            raise ValueError(prefix)
+        return int(seq)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise InvalidCursor("Invalid cursor") from e
+
+
+def changes_since(user, since=None, limit=None):
+    """Read the changes of a user's drive after a cursor.
+
+    Only the latest state of each item within the page is returned, so a
+    file renamed ten times since the last sync costs one delta. Each item
+    keeps the position of its first change, so a folder still comes before
+    the items created in it, and an item created within the page is
+    reported as created unless it was deleted again.
+
+    Args:
+        user: User whose journal is read
+        since: Cursor returned by the previous call, None to start from the beginning
+        limit: Number of journal entries to read (default 500, max 5000)
+
+    Returns:
+        tuple: (changes, cursor to resume from, whether more changes follow)
+
+    Raises:
+        InvalidCursor: If `since` is not a valid cursor.
+    """
+    seq = decode_change_cursor(since) if since else 0
+    limit = CHANGE_PAGE_SIZE if limit is None else max(1, min(limit, MAX_CHANGE_PAGE_SIZE))
+    rows = list(Change.objects.filter(user=user, seq__gt=seq).order_by("seq")[:limit + 1])
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    latest = {}
+    for change in rows:
+        key = (change.kind, change.item_id)
+        first = latest.get(key)
+        if first is not None and first.action == Change.Action.CREATED and change.action != Change.Action.DELETED:
+            change.action = Change.Action.CREATED
+        # Replacing the value of a key keeps its place in the dict
+        latest[key] = change
+    return list(latest.values()), encode_change_cursor(rows[-1].seq if rows else seq), has_more
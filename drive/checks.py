@@ -0,0 +1,29 @@
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.checks import Error, register
+
+
+@register()
+def check_shared_cache(app_configs, **kwargs):
+    """Refuse process-local caches behind share links and listings outside of DEBUG.
+
+    Revoked share links and listing generations are only seen by other
+    workers through the shared tier of their caches: with a per-process
+    backend, workers that did not handle a change keep serving stale data
+    until their entries expire.
+    """
+    from .listings import listing_cache
+    from .sharelinks import share_link_cache
+
+    if settings.DEBUG:
+        return []
+    return [
+        Error(
+            f"The {alias!r} cache is local to each process.",
+            hint="Point CACHE_URL at a cache shared by all workers, such as rediscache:// or pymemcache://.",
+            id="drive.E001",
+        )
+        for alias in sorted({share_link_cache.alias, listing_cache.alias})
+        if isinstance(caches[alias], LocMemCache)
+    ]
@@ -0,0 +1,71 @@
+from channels.db import database_sync_to_async
+from channels.generic.websocket import AsyncJsonWebsocketConsumer
+from django.core.exceptions import ValidationError
+
+from .events import user_group, folder_group
+from .models import Folder
+
+
+class DriveConsumer(AsyncJsonWebsocketConsumer):
+    """Pushes changes to the user's files, folders and shares as they happen.
+
+    Every connection receives the changes to the user's own items. Clients
+    send `{"subscribe": "<folder id>"}` to also follow a folder shared with
+    them, and `{"unsubscribe": "<folder id>"}` to stop. Access to a followed
+    folder is checked again for every event, and a subscription whose share
+    was revoked is dropped with `{"unsubscribed": "<folder id>", "revoked": true}`.
+    """
+
+    async def connect(self):
+        self.user = self.scope.get("user")
+        if self.user is None or not self.user.is_authenticated:
+            await self.close(code=4401)
+            return
+        self.groups = [user_group(self.user.pk)]
+        # Folder followed through each subscribed group
+        self.folders = {}
+        await self.channel_layer.group_add(self.groups[0], self.channel_name)
+        await self.accept()
+
+    async def disconnect(self, code):
+        for group in getattr(self, "groups", []):
+            await self.channel_layer.group_discard(group, self.channel_name)
+
+    async def receive_json(self, content, **kwargs):
+        if "subscribe" in content:
+            folder_id = content["subscribe"]
+            if not await self.can_view(folder_id):
+                await self.send_json({"error": "Folder not found or unauthorized", "folder": folder_id})
+                return
+            group = folder_group(folder_id)
+            if group not in self.groups:
+                self.groups.append(group)
+                self.folders[group] = folder_id
+                await self.channel_layer.group_add(group, self.channel_name)
+            await self.send_json({"subscribed": folder_id})
+        elif "unsubscribe" in content:
+            await self.leave(folder_group(content["unsubscribe"]))
+            await self.send_json({"unsubscribed": content["unsubscribe"]})
+
+    async def leave(self, group):
+        if group in self.groups:
+            self.groups.remove(group)
+            self.folders.pop(group, None)
+            await self.channel_layer.group_discard(group, self.channel_name)
+
+    async def drive_event(self, message):
+        folder_id = self.folders.get(message.get("group"))
+        if folder_id is not None and not await self.can_view(folder_id):
+            # The share was revoked or has expired since the subscription
+            await self.leave(message["group"])
+            await self.send_json({"unsubscribed": folder_id, "revoked": True})
+            return
+        await self.send_json(message["event"])
+
+    @database_sync_to_async
+    def can_view(self, folder_id):
+        try:
+            folder = Folder.objects.get(pk=folder_id)
+        except (Folder.DoesNotExist, ValidationError, ValueError):
+            return False
+        return folder.has_permission(self.user, "view")
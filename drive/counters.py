@@ -0,0 +1,109 @@
+import atexit
+import logging
+import threading
+import time
+from collections import Counter, deque
+from asgiref.sync import sync_to_async
+from django.apps import apps
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.models import F
+
+logger = logging.getLogger(__name__)
+
+
+class BufferedCounter:
+    """Accumulates increments of an integer column in memory and writes them in batches.
+
+    `add` only appends the key to a deque, which is thread-safe without a
+    lock, so hot rows never wait on the database. Every `interval` seconds or
+    `max_pending` increments, the pending increments are summed per row and
+    written with one `F(field) + n` UPDATE per row. The UPDATEs are atomic,
+    so any number of worker processes can buffer the same rows side by side.
+    A background thread, started by the first increment, also flushes every
+    `interval` seconds so an idle process does not sit on its counts, and
+    pending increments are flushed when the process exits.
+
+    Args:
+        model: "app_label.ModelName" of the counted model
+        field: Name of the counter column
+        interval: Maximum number of seconds increments stay buffered
+        max_pending: Number of buffered increments that triggers a flush
+    """
+
+    def __init__(self, model, field, interval=None, max_pending=1000):
+        self.model = model
+        self.field = field
+        self.interval = interval if interval is not None else getattr(settings, "DRIVE_COUNTER_FLUSH_INTERVAL", 5)
+        self.max_pending = max_pending
+        self._pending = deque()
+        self._last_flush = time.monotonic()
+        self._flushing = threading.Lock()
+        self._flusher = None
+        atexit.register(self.flush)
+
+    def add(self, key):
+        self._pending.append(key)
+        self._start_flusher()
+        if self._flush_due():
+            self.flush()
+
+    async def aadd(self, key):
+        self._pending.append(key)
+        self._start_flusher()
+        if self._flush_due():
+            await sync_to_async(self.flush)()
+
+    def _start_flusher(self):
+        if self._flusher is None:
+            with self._flushing:
+                if self._flusher is None:
+                    self._flusher = threading.Thread(target=self._flush_periodically, name=f"flush-{self.field}", daemon=True)
+                    self._flusher.start()
+
+    def _flush_periodically(self):
+        while True:
+            time.sleep(self.interval)
+            if self._pending:
+                self.flush()
+                close_old_connections()
+
+    def _flush_due(self):
+        return len(self._pending) >= self.max_pending or time.monotonic() - self._last_flush >= self.interval
+
+    def pending(self, key):
+        """Number of increments of `key` buffered by this process."""
+        return sum(1 for k in list(self._pending) if k == key)
+
+    def flush(self):
+        """Write the buffered increments to the database.
+
+        Only one thread flushes at a time; others skip and leave their
+        increments for it or the next flush. Database errors are logged and
+        never raised: the increments that could not be written are kept
+        for the next flush, and the download that triggered it goes on.
+        """
+        if not self._flushing.acquire(blocking=False):
+            return
+        try:
+            self._last_flush = time.monotonic()
+            counts = Counter()
+            while self._pending:
+                counts[self._pending.popleft()] += 1
+            model = apps.get_model(self.model)
+            while counts:
+                key, n = counts.popitem()
+                try:
+                    model.objects.filter(pk=key).update(**{self.field: F(self.field) + n})
+                except Exception:
+                    logger.exception("Could not flush %s.%s increments", self.model, self.field)
+                    # Keep what could not be written for the next flush
+                    self._pending.extend([key] * n)
+                    for k, m in counts.items():
+                        self._pending.extend([k] * m)
+                    return
+        finally:
+            self._flushing.release()
+
+
+download_counter = BufferedCounter("drive.ShareLink", "download_count")
@@ -0,0 +1,231 @@
+import asyncio
+import re
+from urllib.parse import quote
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import content_disposition_header, http_date, parse_http_date_safe
+
+RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+BLOCK_SIZE = 256 * 1024
+
+
+class FileRange:
+    """Read-only view of `length` bytes of a file, starting at `start`.
+
+    The underlying file is positioned at `start` and `fileno()` is exposed,
+    so WSGI servers with `wsgi.file_wrapper` support (e.g. gunicorn) send
+    the range with zero-copy `os.sendfile`, bounded by Content-Length.
+    Everything else streams it through `read()`, which never runs past the end.
+    """
+
+    def __init__(self, file, start, length):
+        self.file = file
+        self.remaining = length
+        file.seek(start)
+
+    def read(self, size=-1):
+        if size is None or size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size) if size else b""
+        self.remaining -= len(data)
+        return data
+
+    def fileno(self):
+        return self.file.fileno()
+
+    def close(self):
+        self.file.close()
+
+
+def is_asgi(request):
+    """Whether the request is served by the ASGI handler."""
+    return isinstance(getattr(request, "_request", request), ASGIRequest)
+
+
+async def aread_range(storage, name, start, length):
+    """Asynchronously yield `length` bytes of a stored file from `start`.
+
+    Each read runs in a worker thread that is released between blocks, so a
+    slow client only holds a suspended coroutine, not a thread.
+    """
+    source = await asyncio.to_thread(storage.open, name, "rb")
+    try:
+        await asyncio.to_thread(source.seek, start)
+        remaining = length
+        while remaining > 0:
+            block = await asyncio.to_thread(source.read, min(BLOCK_SIZE, remaining))
+            if not block:
+                break
+            remaining -= len(block)
+            yield block
+    finally:
+        await asyncio.to_thread(source.close)
+
+
+async def aiterate(iterator):
+    """Drive a synchronous iterator from async code, one item at a time.
+
+    Items are produced on the request's sync thread, so an iterator reading
+    from the database keeps using the same connection. Django would
+    otherwise consume a synchronous streaming body whole before sending it.
+    """
+    next_item = sync_to_async(next)
+    done = object()
+    try:
+        while (item := await next_item(iterator, done)) is not done:
+            yield item
+    finally:
+        if hasattr(iterator, "close"):
+            await sync_to_async(iterator.close)()
+
+
+def file_etag(file):
+    """Strong ETag of a File: its content hash, or size and mtime for legacy files."""
+    if file.blob_id:
+        return f'"{file.blob_id}"'
+    return f'"{file.size:x}-{int(file_last_modified(file)):x}"'
+
+
+def file_last_modified(file):
+    """Modification time of a File's content as a POSIX timestamp."""
+    if file.blob_id:
+        # Blobs are immutable, the upload time is their modification time
+        return file.created_at.timestamp()
+    try:
+        return file.file.storage.get_modified_time(file.file.name).timestamp()
+    except (NotImplementedError, OSError):
+        return file.created_at.timestamp()
+
+
+def parse_range(header, size):
+    """Parse a single-range `Range` header.
+
+    Returns:
+        tuple: (start, length) of the requested range, or None to send the
+            whole file (no header, or a multi-range request)
+
+    Raises:
+        ValueError: If the range cannot be satisfied.
+    """
+    if not header or "," in header:
+        return None
+    match = RANGE_RE.match(header.strip())
+    if not match or match.groups() == ("", ""):
+        raise ValueError(header)
+    first, last = match.groups()
+    if first:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+    else:
+        start = max(size - int(last), 0)
+        end = size - 1
+    if start >= size or end < start:
+        raise ValueError(header)
+    return start, end - start + 1
+
+
+def if_range_matches(request, etag, last_modified):
+    """Check the `If-Range` precondition; a stale validator means sending the whole file."""
+    if_range = request.headers.get("If-Range")
+    if not if_range:
+        return True
+    if if_range.startswith('"') or if_range.startswith("W/"):
+        return if_range == etag
+    date = parse_http_date_safe(if_range)
+    return date is not None and int(last_modified) <= date
+
+
+def serve_file(request, file, as_attachment=True):
+    """Build the response sending a File's content to the client.
+
+    Answers conditional requests (`If-None-Match`, `If-Modified-Since`, ...)
+    with 304/412 without opening the file, and honours single byte ranges.
+    When DRIVE_SENDFILE is 'x-accel-redirect' or 'x-sendfile' the transfer
+    is handed to the front proxy, which then also takes care of the ranges.
+    Under ASGI the body is streamed asynchronously.
+
+    The content is only read while the response is sent, so this can be
+    called from async views as well.
+    """
+    etag = file_etag(file)
+    last_modified = file_last_modified(file)
+    response = get_conditional_response(request, etag=etag, last_modified=int(last_modified))
+    if response is not None:
+        return response
+
+    offload = getattr(settings, "DRIVE_SENDFILE", None)
+    if offload:
+        response = HttpResponse(content_type=file.mime_type or "application/octet-stream")
+        if offload == "x-accel-redirect":
+            response["X-Accel-Redirect"] = quote(settings.DRIVE_SENDFILE_PREFIX + file.file.name)
+        else:
+            response["X-Sendfile"] = file.file.path
+        response["Content-Disposition"] = content_disposition_header(as_attachment, file.name)
+    else:
+        byte_range = None
+        if if_range_matches(request, etag, last_modified):
+            try:
+                byte_range = parse_range(request.headers.get("Range"), file.size)
+            except ValueError:
+                response = HttpResponse(status=416)
+                response["Content-Range"] = f"bytes */{file.size}"
+                return response
+
+        start, length = byte_range or (0, file.size)
+        status = 206 if byte_range else 200
+        content_type = file.mime_type or "application/octet-stream"
+        if is_asgi(request):
+            response = StreamingHttpResponse(
+                    aread_range(file.file.storage, file.file.name, start, length),
+                    status=status,
+                    content_type=content_type
+                    )
+            response["Content-Disposition"] = content_disposition_header(as_attachment, file.name)
+        else:
+            response = FileResponse(
+                    FileRange(file.file.storage.open(file.file.name, "rb"), start, length),
+                    status=status,
+                    as_attachment=as_attachment,
+                    filename=file.name,
+                    content_type=content_type
+                    )
+        response["Content-Length"] = str(length)
+        if byte_range:
+            response["Content-Range"] = f"bytes {start}-{start + length - 1}/{file.size}"
+
+    response["Accept-Ranges"] = "bytes"
+    response["ETag"] = etag
+    response["Last-Modified"] = http_date(last_modified)
+    response["Cache-Control"] = "private, no-cache"
+    return response
+
+
+async def aserve_preview(request, preview, immutable=False):
+    """Build the response sending a rendered preview.
+
+    Previews are small, so they are read whole in a worker thread. With
+    `immutable`, the URL pins the content and the response is cached for a
+    year without revalidation.
+    """
+    etag = f'"{preview.blob_id}-{preview.size}"'
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        storage, name = preview.file.storage, preview.file.name
+
+        def read():
+            with storage.open(name, "rb") as content:
+                return content.read()
+
+        response = HttpResponse(await asyncio.to_thread(read), content_type="image/jpeg")
+    response["ETag"] = etag
+    response["Cache-Control"] = "private, max-age=31536000, immutable" if immutable else "private, no-cache"
+    return response
+
+
+def is_full_download(request):
+    """Whether a request fetches a file from its first byte, for download counting."""
+    header = request.headers.get("Range", "")
+    return not header or header.replace(" ", "").startswith("bytes=0-")
@@ -0,0 +1,75 @@
+import uuid
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Folder, File, Share
+
+CREATED, UPDATED, DELETED = "created", "updated", "deleted"
+
+
+def user_group(user_id):
+    """Channel group receiving every change to the items of a user."""
+    return f"drive.user.{uuid.UUID(str(user_id)).hex}"
+
+
+def folder_group(folder_id):
+    """Channel group receiving every change in a folder's subtree."""
+    return f"drive.folder.{uuid.UUID(str(folder_id)).hex}"
+
+
+def _path_ids(path):
+    return [segment for segment in path.strip("/").split("/") if segment]
+
+
+def describe(action, item):
+    """Build the event for a change to a File, Folder or Share and the groups it goes to.
+
+    Returns:
+        tuple: (event, groups)
+    """
+    event = {"action": action, "id": str(item.pk), "at": timezone.now().isoformat()}
+    groups = set()
+    if isinstance(item, Share):
+        event.update(
+                kind="share",
+                file=str(item.file_id) if item.file_id else None,
+                folder=str(item.folder_id) if item.folder_id else None,
+                shared_with=str(item.shared_with_id),
+                permission=item.permission
+                )
+        groups.update([user_group(item.shared_by_id), user_group(item.shared_with_id)])
+        return event, groups
+
+    if isinstance(item, File):
+        event.update(kind="file", name=item.name, folder=str(item.folder_id) if item.folder_id else None)
+        folder_path = ""
+        if item.folder_id:
+            folder = item._state.fields_cache.get("folder")
+            folder_path = folder.path if folder else (
+                Folder.all_objects.filter(pk=item.folder_id).values_list("path", flat=True).first() or "")
+        ids = _path_ids(folder_path)
+    else:
+        event.update(kind="folder", name=item.name, parent_folder=str(item.parent_folder_id) if item.parent_folder_id else None)
+        ids = _path_ids(item.path)
+
+    if item.user_id:
+        groups.add(user_group(item.user_id))
+    # Subscribers of any folder above the item, and of a folder itself, hear about it
+    groups.update(folder_group(pk) for pk in ids)
+    return event, groups
+
+
+def publish(action, item):
+    """Push a change to the subscribed WebSocket clients once the transaction commits."""
+    layer = get_channel_layer()
+    if layer is None:
+        return
+    event, groups = describe(action, item)
+
+    def send():
+        for group in groups:
+            async_to_sync(layer.group_send)(group, {"type": "drive.event", "event": event, "group": group})
+
+    transaction.on_commit(send)
@@ -0,0 +1,99 @@
+import time
+import uuid
+from django.db import transaction
+
+from .caching import TieredCache
+
+LISTING_TTL = 600
+
+# Listings are immutable once stored: a new generation means new keys, so
+# they can also be kept in process memory
+listing_cache = TieredCache("drive:listing", ttl=LISTING_TTL, local_ttl=LISTING_TTL)
+
+
+def folder_scope(user_id, folder_id):
+    """Name of the listing of a folder, or of a user's root when `folder_id` is None."""
+    if folder_id:
+        return f"folder:{uuid.UUID(str(folder_id)).hex}"
+    return f"root:{uuid.UUID(str(user_id)).hex}"
+
+
+def _generation_key(scope):
+    return f"drive:listing-gen:{scope}"
+
+
+def _new_generation():
+    # Unique even when a generation was evicted, so stale listings are never reused
+    return time.time_ns()
+
+
+def generation(scope):
+    backend = listing_cache.backend
+    gen = backend.get(_generation_key(scope))
+    if gen is None:
+        gen = _new_generation()
+        if not backend.add(_generation_key(scope), gen, None):
+            gen = backend.get(_generation_key(scope), gen)
+    return gen
+
+
+async def ageneration(scope):
+    backend = listing_cache.backend
+    gen = await backend.aget(_generation_key(scope))
+    if gen is None:
+        gen = _new_generation()
+        if not await backend.aadd(_generation_key(scope), gen, None):
+            gen = await backend.aget(_generation_key(scope), gen)
+    return gen
+
+
+def bump(*scopes):
+    """Invalidate every cached listing of the given scopes.
+
+    The generation is bumped now and once more after the transaction
+    commits, so a listing read concurrently with the change cannot be
+    cached under the new generation.
+    """
+    def bump_now():
+        backend = listing_cache.backend
+        for scope in scopes:
+            backend.set(_generation_key(scope), _new_generation(), None)
+
+    bump_now()
+    transaction.on_commit(bump_now)
+
+
+def listing_key(user, scope, gen, variant):
+    return f"{scope}:{gen}:{user.pk.hex}:{variant}"
+
+
+def cached_listing(user, folder_id, variant, build):
+    """Get a listing of a folder as seen by `user`, building it on a miss.
+
+    Args:
+        user: The user viewing the listing
+        folder_id: The listed folder, None for the user's root
+        variant: Distinguishes the different listings of one folder (format, page...)
+        build: Function returning the listing, only called on a miss
+
+    Returns:
+        The listing as returned by `build`
+    """
+    scope = folder_scope(user.pk, folder_id)
+    key = listing_key(user, scope, generation(scope), variant)
+    listing = listing_cache.get(key)
+    if listing is None:
+        listing = build()
+        listing_cache.set(key, listing)
+    return listing
+
+
+async def acached_listing(user, folder_id, variant, build):
+    """Async version of `cached_listing`, with `build` a coroutine function."""
+    scope = folder_scope(user.pk, folder_id)
+    key = listing_key(user, scope, await ageneration(scope), variant)
+    listing = await listing_cache.aget(key)
+    if listing is None:
+        listing = await build()
+        await listing_cache.aset(key, listing)
+    return listing
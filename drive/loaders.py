@@ -0,0 +1,255 @@
+import uuid
+from collections import defaultdict
+from django.contrib.auth import get_user_model
+
+from .models import Folder, File, Share, ShareLink
+from .permissions import resolve_permissions
+
+User = get_user_model()
+
+
+class BatchLoader:
+    """Batches lookups of one computed field across every row of a GraphQL response.
+
+    List resolvers prime the loaders with the rows they return. The first time
+    any primed row asks for its value, the values of all pending rows are
+    fetched together, so a field costs one query per page instead of one per row.
+
+    Attributes:
+        model: Model whose rows feed keys into this loader
+    """
+
+    model = None
+
+    def __init__(self, loaders):
+        self.loaders = loaders
+        self._pending = set()
+        self._cache = {}
+
+    def key_for(self, obj):
+        return obj.pk
+
+    def missing(self):
+        """Value for keys the batch did not return anything for."""
+        return None
+
+    def prime(self, key):
+        if key is not None and key not in self._cache:
+            self._pending.add(key)
+
+    def load(self, key):
+        if key is None:
+            return self.missing()
+        if key not in self._cache:
+            self._pending.add(key)
+            keys = list(self._pending)
+            self._pending.clear()
+            values = self.batch_load(keys)
+            for k in keys:
+                self._cache[k] = values.get(k, self.missing())
+        return self._cache[key]
+
+    def load_for(self, obj):
+        return self.load(self.key_for(obj))
+
+    def batch_load(self, keys):
+        """Fetch the values for `keys` and return them as a dict."""
+        raise NotImplementedError
+
+
+class ObjectLoader(BatchLoader):
+    """Loads the target of a forward foreign key (e.g. `file.user`)."""
+
+    related_model = None
+    attname = None
+
+    def key_for(self, obj):
+        return getattr(obj, self.attname)
+
+    def batch_load(self, keys):
+        objects = self.related_model.objects.in_bulk(keys)
+        self.loaders.prime(objects.values())
+        return objects
+
+
+class ExistsLoader(BatchLoader):
+    """Tells whether any related row points at each key (e.g. `file.shares.exists()`)."""
+
+    related_model = None
+    field = None
+
+    def missing(self):
+        return False
+
+    def batch_load(self, keys):
+        attname = self.related_model._meta.get_field(self.field).attname
+        found = self.related_model.objects.filter(**{f"{attname}__in": keys}).order_by().values_list(attname, flat=True)
+        return dict.fromkeys(found, True)
+
+
+class GroupLoader(BatchLoader):
+    """Loads the rows of a reverse foreign key (e.g. `folder.files.all()`)."""
+
+    related_model = None
+    field = None
+
+    def missing(self):
+        return []
+
+    def batch_load(self, keys):
+        attname = self.related_model._meta.get_field(self.field).attname
+        groups = defaultdict(list)
+        rows = list(self.related_model.objects.filter(**{f"{attname}__in": keys}))
+        for row in rows:
+            groups[getattr(row, attname)].append(row)
+        self.loaders.prime(rows)
+        return groups
+
+
+class FileUserLoader(ObjectLoader):
+    model, related_model, attname = File, User, "user_id"
+
+
+class FileFolderLoader(ObjectLoader):
+    model, related_model, attname = File, Folder, "folder_id"
+
+
+class FileHasSharesLoader(ExistsLoader):
+    model, related_model, field = File, Share, "file"
+
+
+class FileHasShareLinksLoader(ExistsLoader):
+    model, related_model, field = File, ShareLink, "file"
+
+
+class FileSharesLoader(GroupLoader):
+    model, related_model, field = File, Share, "file"
+
+
+class FileShareLinksLoader(GroupLoader):
+    model, related_model, field = File, ShareLink, "file"
+
+
+class FolderUserLoader(ObjectLoader):
+    model, related_model, attname = Folder, User, "user_id"
+
+
+class FolderParentLoader(ObjectLoader):
+    model, related_model, attname = Folder, Folder, "parent_folder_id"
+
+
+class FolderHasSharesLoader(ExistsLoader):
+    model, related_model, field = Folder, Share, "folder"
+
+
+class FolderHasShareLinksLoader(ExistsLoader):
+    model, related_model, field = Folder, ShareLink, "folder"
+
+
+class FolderSharesLoader(GroupLoader):
+    model, related_model, field = Folder, Share, "folder"
+
+
+class FolderShareLinksLoader(GroupLoader):
+    model, related_model, field = Folder, ShareLink, "folder"
+
+
+class FolderFilesLoader(GroupLoader):
+    model, related_model, field = Folder, File, "folder"
+
+
+class FolderChildrenLoader(GroupLoader):
+    model, related_model, field = Folder, Folder, "parent_folder"
+
+
+class FolderAncestorsLoader(BatchLoader):
+    """Loads the ancestors of many folders at once, keyed by materialized path."""
+
+    model = Folder
+
+    def key_for(self, obj):
+        return obj.path
+
+    def missing(self):
+        return []
+
+    def batch_load(self, keys):
+        ids_by_path = {
+            path: [uuid.UUID(segment) for segment in path.strip("/").split("/")[:-1]]
+            for path in keys
+        }
+        folders = Folder.objects.in_bulk({pk for ids in ids_by_path.values() for pk in ids})
+        self.loaders.prime(folders.values())
+        return {
+            path: [folders[pk] for pk in ids if pk in folders]
+            for path, ids in ids_by_path.items()
+        }
+
+
+class PermissionLoader(BatchLoader):
+    """Resolves the permission of the requesting user on many items at once."""
+
+    def batch_load(self, keys):
+        ids = "file_ids" if self.model is File else "folder_ids"
+        return resolve_permissions(self.loaders.user, **{ids: keys})
+
+
+class FilePermissionLoader(PermissionLoader):
+    model = File
+
+
+class FolderPermissionLoader(PermissionLoader):
+    model = Folder
+
+
+LOADER_CLASSES = [
+    FileUserLoader,
+    FileFolderLoader,
+    FileHasSharesLoader,
+    FileHasShareLinksLoader,
+    FileSharesLoader,
+    FileShareLinksLoader,
+    FolderUserLoader,
+    FolderParentLoader,
+    FolderHasSharesLoader,
+    FolderHasShareLinksLoader,
+    FolderSharesLoader,
+    FolderShareLinksLoader,
+    FolderFilesLoader,
+    FolderChildrenLoader,
+    FolderAncestorsLoader,
+    FilePermissionLoader,
+    FolderPermissionLoader,
+]
+
+
+class Loaders:
+    """The set of loaders belonging to a single request.
+
+    Attributes:
+        user: The user making the request
+    """
+
+    def __init__(self, user=None):
+        self.user = user
+        self._loaders = {cls: cls(self) for cls in LOADER_CLASSES}
+
+    def __getitem__(self, loader_class):
+        return self._loaders[loader_class]
+
+    def prime(self, objects):
+        """Register rows so their fields are fetched in the same batch. Returns `objects`."""
+        for obj in objects:
+            for loader in self._loaders.values():
+                if isinstance(obj, loader.model):
+                    loader.prime(loader.key_for(obj))
+        return objects
+
+
+def get_loaders(info):
+    """Get the loaders of the current request, creating them on first use."""
+    loaders = getattr(info.context, "drive_loaders", None)
+    if loaders is None:
+        loaders = Loaders(getattr(info.context, "user", None))
+        info.context.drive_loaders = loaders
+    return loaders
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from drive.blobs import collect_garbage
+
+
+class Command(BaseCommand):
+    help = "Delete stored blobs that are no longer referenced by any file."
+
+    def handle(self, *args, **options):
+        deleted = collect_garbage()
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} unreferenced blob(s)."))
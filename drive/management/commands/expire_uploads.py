@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from drive.uploads import expire_uploads
+
+
+class Command(BaseCommand):
+    help = "Abort the resumable uploads that received no chunk for DRIVE_UPLOAD_EXPIRY_HOURS."
+
+    def handle(self, *args, **options):
+        expired = expire_uploads()
+        self.stdout.write(self.style.SUCCESS(f"Expired {expired} upload(s)."))
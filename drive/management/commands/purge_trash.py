@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from drive.trash import purge_trash
+
+
+class Command(BaseCommand):
+    help = "Delete the files and folders that stayed in the trash longer than DRIVE_TRASH_RETENTION_DAYS."
+
+    def handle(self, *args, **options):
+        purged = purge_trash()
+        self.stdout.write(self.style.SUCCESS(f"Purged {purged} trashed item(s)."))
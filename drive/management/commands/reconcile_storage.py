@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from drive.quota import reconcile_usage
+
+
+class Command(BaseCommand):
+    help = "Recompute the storage used by every user from their files."
+
+    def handle(self, *args, **options):
+        updated = reconcile_usage()
+        self.stdout.write(self.style.SUCCESS(f"Reconciled storage usage of {updated} user(s)."))
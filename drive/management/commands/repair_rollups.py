@@ -0,0 +1,19 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from drive.rollups import recompute
+
+
+class Command(BaseCommand):
+    help = "Recompute the size and item counts of every folder from the files and folders it holds."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+                "--user",
+                help="Only repair the folders of the user with this email"
+                )
+
+    def handle(self, *args, **options):
+        user = get_user_model().objects.get(email=options["user"]) if options["user"] else None
+        repaired = recompute(user=user)
+        self.stdout.write(self.style.SUCCESS(f"Repaired {repaired} folder(s)."))
@@ -0,0 +1,62 @@
+import multiprocessing
+import os
+import signal
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from drive.tasks import work
+
+
+def _run(burst, poll_interval, stopping):
+    # Connections inherited from the parent cannot be shared across processes
+    connections.close_all()
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    work(burst=burst, poll_interval=poll_interval, should_stop=stopping.is_set)
+
+
+class Command(BaseCommand):
+    help = "Run background jobs from the task queue in a pool of worker processes."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+                "--processes",
+                type=int,
+                default=os.cpu_count() or 1,
+                help="Number of worker processes (default: number of CPUs)"
+                )
+        parser.add_argument(
+                "--poll-interval",
+                type=float,
+                default=1.0,
+                help="Seconds to wait before polling an empty queue again"
+                )
+        parser.add_argument(
+                "--burst",
+                action="store_true",
+                help="Exit once the queue has no due job"
+                )
+
+    def handle(self, *args, **options):
+        stopping = multiprocessing.Event()
+        # Workers finish their current job before exiting
+        signal.signal(signal.SIGTERM, lambda *_: stopping.set())
+        connections.close_all()
+        processes = [
+            multiprocessing.Process(
+                target=_run,
+                args=(options["burst"], options["poll_interval"], stopping),
+                daemon=True
+                )
+            for _ in range(max(1, options["processes"]))
+        ]
+        for process in processes:
+            process.start()
+        self.stdout.write(f"Started {len(processes)} worker process(es).")
+        try:
+            for process in processes:
+                process.join()
+        except KeyboardInterrupt:
+            stopping.set()
+            for process in processes:
+                process.join()
+        self.stdout.write(self.style.SUCCESS("Workers stopped."))
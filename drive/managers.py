@@ -1,33 +1,34 @@
 from django.db import models
-from datetime import datetime
+
 
 class SharedItemQuerySet(models.QuerySet):
-    def for_user(self, user):
-        """Get all items shared with a specific user."""
-        return self.filter(
-            models.Q(shares__shared_with=user) |
-            models.Q(folder__shares__shared_with=user),
-            shares__is_active=True,
-            shares__expires_at__gt=datetime.now() | models.Q(shares__expires_at__isnull=True)
-        ).distinct()
+    def trashed(self):
+        """Get the items in the trash, waiting to be purged."""
+        return self.filter(deleted_at__isnull=False)
+
+    def for_user(self, user, permission='view'):
+        """Get all items shared with a specific user, directly or through a parent folder."""
+        from drive.permissions import shared_with
+        return self.filter(shared_with(user, self.model, permission))
 
 
 class FileQuerySet(SharedItemQuerySet):
     def editable_by(self, user):
         """Get files that user can edit."""
-        return self.for_user(user).filter(
-            models.Q(shares__permission='edit') |
-            models.Q(shares__permission='manage') |
-            models.Q(folder__shares__permission='edit') |
-            models.Q(folder__shares__permission='manage')
-        )
+        return self.for_user(user, permission='edit')
 
 
 class FolderQuerySet(SharedItemQuerySet):
     def editable_by(self, user):
         """Get folders that user can edit."""
-        return self.for_user(user).filter(
-            models.Q(shares__permission='edit') |
-            models.Q(shares__permission='manage')
-        )
+        return self.for_user(user, permission='edit')
+
+
+class LiveManager(models.Manager):
+    """Default manager of files and folders, hiding the ones in the trash.
+
+    Trashed rows stay reachable through the model's `all_objects` manager.
+    """
 
+    def get_queryset(self):
+        return super().get_queryset().filter(deleted_at__isnull=True)
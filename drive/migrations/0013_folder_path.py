@@ -0,0 +1,49 @@
+# Generated by Django 5.1.6 on 2026-10-17 06:01
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_paths(apps, schema_editor):
+    Folder = apps.get_model('drive', 'Folder')
+    parents = dict(Folder.objects.values_list('id', 'parent_folder_id'))
+    paths = {}
+
+    def build(folder_id):
+        if folder_id not in paths:
+            parent_id = parents[folder_id]
+            prefix, depth = build(parent_id) if parent_id else ("/", -1)
+            paths[folder_id] = (f"{prefix}{folder_id.hex}/", depth + 1)
+        return paths[folder_id]
+
+    folders = []
+    for folder_id in parents:
+        path, depth = build(folder_id)
+        folders.append(Folder(id=folder_id, path=path, depth=depth))
+    Folder.objects.bulk_update(folders, ['path', 'depth'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('drive', '0012_remove_folder_unique_folder_per_user_and_parent_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='folder',
+            name='depth',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Number of ancestors above this folder'),
+        ),
+        migrations.AddField(
+            model_name='folder',
+            name='path',
+            field=models.TextField(default='', editable=False, help_text="Materialized path of ancestor ids (e.g. '/<root>/<parent>/<self>/')"),
+        ),
+        migrations.AddIndex(
+            model_name='folder',
+            index=models.Index(fields=['path'], name='folder_path_idx', opclasses=['text_pattern_ops']),
+        ),
+        migrations.RunPython(backfill_paths, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 5.1.6 on 2026-10-17 06:40
+
+from django.db import migrations
+
+SQLITE_INDEX_TABLE = 'drive_search_index'
+
+
+def create_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor == 'postgresql':
+        schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        schema_editor.execute("CREATE INDEX IF NOT EXISTS file_name_trgm_idx ON drive_file USING gin (name gin_trgm_ops)")
+        schema_editor.execute("CREATE INDEX IF NOT EXISTS folder_name_trgm_idx ON drive_folder USING gin (name gin_trgm_ops)")
+        return
+
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pragma_module_list WHERE name = 'fts5'")
+        if cursor.fetchone() is None:
+            return
+    schema_editor.execute(
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {SQLITE_INDEX_TABLE} USING fts5("
+        "name, kind UNINDEXED, item_id UNINDEXED, user_id UNINDEXED, tokenize = 'trigram')"
+    )
+    for model_name, kind in (('File', 'file'), ('Folder', 'folder')):
+        model = apps.get_model('drive', model_name)
+        rows = model.objects.values_list('id', 'name', 'user_id').iterator(chunk_size=2000)
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f"INSERT INTO {SQLITE_INDEX_TABLE} (rowid, name, kind, item_id, user_id) VALUES (%s, %s, %s, %s, %s)",
+                [(pk.int & (2 ** 63 - 1), name, kind, pk.hex, user_id.hex if user_id else None) for pk, name, user_id in rows]
+            )
+
+
+def drop_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor == 'postgresql':
+        schema_editor.execute("DROP INDEX IF EXISTS file_name_trgm_idx")
+        schema_editor.execute("DROP INDEX IF EXISTS folder_name_trgm_idx")
+    elif connection.vendor == 'sqlite':
+        schema_editor.execute(f"DROP TABLE IF EXISTS {SQLITE_INDEX_TABLE}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('drive', '0013_folder_path'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 5.1.6 on 2026-10-17 06:07
+
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('drive', '0014_search_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UploadSession',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, help_text='Unique identifier for the upload', primary_key=True, serialize=False)),
+                ('name', models.CharField(help_text='Name of the file being uploaded', max_length=255)),
+                ('size', models.BigIntegerField(help_text='Total size of the file in bytes')),
+                ('chunk_size', models.PositiveIntegerField(default=8388608, help_text='Size of every chunk except the last one, in bytes')),
+                ('offset', models.BigIntegerField(default=0, help_text='Number of bytes received and acknowledged so far')),
+                ('mime_type', models.CharField(blank=True, help_text='MIME type detected from the first chunk', max_length=100)),
+                ('created_at', models.DateTimeField(auto_now_add=True, help_text='When the upload was started')),
+                ('file', models.OneToOneField(blank=True, help_text='File created when the upload was committed', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='upload_session', to='drive.file')),
+                ('folder', models.ForeignKey(blank=True, help_text='Folder the file will be created in', null=True, on_delete=django.db.models.deletion.CASCADE, related_name='upload_sessions', to='drive.folder')),
+                ('user', models.ForeignKey(help_text='User who started the upload', on_delete=django.db.models.deletion.CASCADE, related_name='upload_sessions', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Upload Session',
+                'verbose_name_plural': 'Upload Sessions',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='UploadChunk',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('index', models.PositiveIntegerField(help_text='Position of the chunk in the upload, starting at 0')),
+                ('offset', models.BigIntegerField(help_text='Byte offset of the chunk in the file')),
+                ('size', models.PositiveIntegerField(help_text='Size of the chunk in bytes')),
+                ('sha256', models.CharField(help_text='SHA-256 checksum of the chunk', max_length=64)),
+                ('session', models.ForeignKey(help_text='Upload this chunk belongs to', on_delete=django.db.models.deletion.CASCADE, related_name='chunks', to='drive.uploadsession')),
+            ],
+            options={
+                'verbose_name': 'Upload Chunk',
+                'verbose_name_plural': 'Upload Chunks',
+                'ordering': ['index'],
+                'constraints': [models.UniqueConstraint(fields=('session', 'index'), name='unique_upload_chunk')],
+            },
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.1.6 on 2026-10-17 06:09
+
+import django.db.models.deletion
+import drive.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('drive', '0015_upload_sessions'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Blob',
+            fields=[
+                ('sha256', models.CharField(help_text='SHA-256 digest of the content', max_length=64, primary_key=True, serialize=False)),
+                ('file', models.FileField(help_text='The stored content', max_length=255, upload_to=drive.models.blob_path)),
+                ('size', models.BigIntegerField(help_text='Size of the content in bytes')),
+                ('ref_count', models.PositiveIntegerField(default=0, help_text='Number of files using this content')),
+                ('created_at', models.DateTimeField(auto_now_add=True, help_text='Date and time when the content was first stored')),
+            ],
+            options={
+                'verbose_name': 'Blob',
+                'verbose_name_plural': 'Blobs',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.AddField(
+            model_name='file',
+            name='blob',
+            field=models.ForeignKey(blank=True, editable=False, help_text='Deduplicated content of the file', null=True, on_delete=django.db.models.deletion.PROTECT, related_name='files', to='drive.blob'),
+        ),
+    ]
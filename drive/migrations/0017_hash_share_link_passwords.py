@@ -0,0 +1,24 @@
+from django.contrib.auth.hashers import identify_hasher, make_password
+from django.db import migrations
+
+
+def hash_passwords(apps, schema_editor):
+    # Share link passwords used to be stored as plain text
+    ShareLink = apps.get_model('drive', 'ShareLink')
+    for link in ShareLink.objects.exclude(password=None).exclude(password=''):
+        try:
+            identify_hasher(link.password)
+        except ValueError:
+            link.password = make_password(link.password)
+            link.save(update_fields=['password'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('drive', '0016_blob'),
+    ]
+
+    operations = [
+        migrations.RunPython(hash_passwords, migrations.RunPython.noop),
+    ]
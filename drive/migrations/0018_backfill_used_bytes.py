@@ -0,0 +1,22 @@
+from django.db import migrations
+from django.db.models import OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+
+def backfill_used_bytes(apps, schema_editor):
+    User = apps.get_model('accounts', 'User')
+    File = apps.get_model('drive', 'File')
+    totals = File.objects.filter(user=OuterRef('pk')).order_by().values('user').annotate(total=Sum('size')).values('total')
+    User.objects.update(used_bytes=Coalesce(Subquery(totals), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0003_used_bytes'),
+        ('drive', '0017_hash_share_link_passwords'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_used_bytes, migrations.RunPython.noop),
+    ]
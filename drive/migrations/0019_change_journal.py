@@ -0,0 +1,80 @@
+# Generated by Django 5.1.6 on 2026-10-17 06:23
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import F
+
+
+def backfill_journal(apps, schema_editor):
+    """Start the journal with a 'created' entry for everything that already exists."""
+    File = apps.get_model('drive', 'File')
+    Folder = apps.get_model('drive', 'Folder')
+    Share = apps.get_model('drive', 'Share')
+    Change = apps.get_model('drive', 'Change')
+    File.objects.update(updated_at=F('created_at'))
+    Folder.objects.update(updated_at=F('created_at'))
+
+    def entries():
+        # Parents before children, so replaying the journal always finds the parent
+        for folder in Folder.objects.order_by('depth', 'created_at').iterator():
+            yield Change(user_id=folder.user_id, action='created', kind='folder', item_id=folder.pk,
+                         parent_id=folder.parent_folder_id, name=folder.name)
+        for file in File.objects.order_by('created_at').iterator():
+            yield Change(user_id=file.user_id, action='created', kind='file', item_id=file.pk,
+                         parent_id=file.folder_id, name=file.name, size=file.size)
+        for share in Share.objects.order_by('shared_at').iterator():
+            for user_id in {share.shared_by_id, share.shared_with_id}:
+                yield Change(user_id=user_id, action='created', kind='share', item_id=share.pk,
+                             parent_id=share.file_id or share.folder_id, name=share.permission)
+
+    batch = []
+    for change in entries():
+        if change.user_id:
+            batch.append(change)
+        if len(batch) >= 1000:
+            Change.objects.bulk_create(batch)
+            batch = []
+    Change.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('drive', '0018_backfill_used_bytes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='file',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, help_text='Date and time when the file was last modified'),
+        ),
+        migrations.AddField(
+            model_name='folder',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, help_text='Date and time when the folder was last modified'),
+        ),
+        migrations.CreateModel(
+            name='Change',
+            fields=[
+                ('seq', models.BigAutoField(help_text='Position of the change in the journal', primary_key=True, serialize=False)),
+                ('action', models.CharField(choices=[('created', 'Created'), ('updated', 'Updated'), ('deleted', 'Deleted')], help_text='What happened to the item', max_length=10)),
+                ('kind', models.CharField(choices=[('file', 'File'), ('folder', 'Folder'), ('share', 'Share')], help_text='Type of the changed item', max_length=10)),
+                ('item_id', models.UUIDField(help_text='Id of the changed item')),
+                ('parent_id', models.UUIDField(blank=True, help_text='Folder containing the item, or the shared item for shares', null=True)),
+                ('name', models.CharField(blank=True, help_text='Name of the item after the change', max_length=255)),
+                ('size', models.BigIntegerField(blank=True, help_text='Size of a file after the change', null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True, help_text='When the change happened')),
+                ('user', models.ForeignKey(help_text='User whose view of the drive changed', on_delete=django.db.models.deletion.CASCADE, related_name='changes', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Change',
+                'verbose_name_plural': 'Changes',
+                'ordering': ['seq'],
+                'indexes': [models.Index(fields=['user', 'seq'], name='change_user_seq_idx')],
+            },
+        ),
+        migrations.RunPython(backfill_journal, migrations.RunPython.noop),
+    ]
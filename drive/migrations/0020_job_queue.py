@@ -0,0 +1,39 @@
+# Generated by Django 5.1.6 on 2026-10-17 06:28
+
+import django.core.serializers.json
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('drive', '0019_change_journal'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Job',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('task', models.CharField(help_text='Registered name of the task to run', max_length=100)),
+                ('args', models.JSONField(blank=True, default=list, encoder=django.core.serializers.json.DjangoJSONEncoder, help_text='Positional arguments of the task')),
+                ('kwargs', models.JSONField(blank=True, default=dict, encoder=django.core.serializers.json.DjangoJSONEncoder, help_text='Keyword arguments of the task')),
+                ('priority', models.SmallIntegerField(default=0, help_text='Jobs with a higher priority run first')),
+                ('status', models.CharField(choices=[('queued', 'Queued'), ('running', 'Running'), ('failed', 'Failed')], default='queued', help_text='Where the job is in its lifecycle', max_length=10)),
+                ('attempts', models.PositiveSmallIntegerField(default=0, help_text='Number of times the job was started')),
+                ('max_attempts', models.PositiveSmallIntegerField(default=3, help_text='Number of starts after which a failing job is given up')),
+                ('run_at', models.DateTimeField(default=django.utils.timezone.now, help_text='The job is not started before this time')),
+                ('locked_at', models.DateTimeField(blank=True, help_text='When a worker last claimed the job', null=True)),
+                ('locked_by', models.CharField(blank=True, help_text='Worker that last claimed the job', max_length=100)),
+                ('last_error', models.TextField(blank=True, help_text='Traceback of the last failed attempt')),
+                ('created_at', models.DateTimeField(auto_now_add=True, help_text='When the job was queued')),
+            ],
+            options={
+                'verbose_name': 'Job',
+                'verbose_name_plural': 'Jobs',
+                'ordering': ['-priority', 'run_at', 'id'],
+                'indexes': [models.Index(fields=['status', '-priority', 'run_at'], name='job_ready_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.1.6 on 2026-10-17 06:31
+
+import django.db.models.deletion
+import drive.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('drive', '0020_job_queue'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Preview',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('size', models.PositiveSmallIntegerField(help_text='Longest side of the preview in pixels')),
+                ('file', models.FileField(help_text='The rendered preview', max_length=255, upload_to=drive.models.preview_path)),
+                ('created_at', models.DateTimeField(auto_now_add=True, help_text='Date and time when the preview was rendered')),
+                ('blob', models.ForeignKey(help_text='Content the preview was rendered from', on_delete=django.db.models.deletion.CASCADE, related_name='previews', to='drive.blob')),
+            ],
+            options={
+                'verbose_name': 'Preview',
+                'verbose_name_plural': 'Previews',
+                'constraints': [models.UniqueConstraint(fields=('blob', 'size'), name='unique_preview_size')],
+            },
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.1.6 on 2026-10-17 06:38
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('drive', '0021_previews'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='folder',
+            name='unique_folder_name',
+        ),
+        migrations.RemoveConstraint(
+            model_name='folder',
+            name='unique_root_folder_name',
+        ),
+        migrations.AddField(
+            model_name='file',
+            name='deleted_at',
+            field=models.DateTimeField(blank=True, editable=False, help_text='When the file, or the folder it is in, was moved to the trash', null=True),
+        ),
+        migrations.AddField(
+            model_name='folder',
+            name='deleted_at',
+            field=models.DateTimeField(blank=True, editable=False, help_text='When the folder was moved to the trash, with everything in it', null=True),
+        ),
+        migrations.AddConstraint(
+            model_name='folder',
+            constraint=models.UniqueConstraint(condition=models.Q(('deleted_at__isnull', True)), fields=('user', 'parent_folder', 'name'), name='unique_folder_name'),
+        ),
+        migrations.AddConstraint(
+            model_name='folder',
+            constraint=models.UniqueConstraint(condition=models.Q(('deleted_at__isnull', True), ('parent_folder__isnull', True)), fields=('user', 'name'), name='unique_root_folder_name'),
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 5.1.6 on 2026-10-17 06:44
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import F, Func, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_rollups(apps, schema_editor):
+    Folder = apps.get_model('drive', 'Folder')
+    File = apps.get_model('drive', 'File')
+    for trashed in (False, True):
+        # Trashed items count towards the folders they were trashed with.
+        # Everything in the subtree counts, whoever added it.
+        same_state = {'deleted_at': OuterRef('deleted_at')} if trashed else {'deleted_at__isnull': True}
+        files = File.objects.filter(folder__path__startswith=OuterRef('path'), **same_state).order_by()
+        folders = Folder.objects.filter(path__startswith=OuterRef('path'), **same_state).exclude(pk=OuterRef('pk')).order_by()
+        Folder.objects.filter(deleted_at__isnull=not trashed).update(
+            total_size=Coalesce(Subquery(files.annotate(total=Func(F('size'), function='SUM')).values('total')[:1]), 0),
+            file_count=Coalesce(Subquery(files.annotate(total=Func(F('pk'), function='COUNT')).values('total')[:1]), 0),
+            folder_count=Coalesce(Subquery(folders.annotate(total=Func(F('pk'), function='COUNT')).values('total')[:1]), 0),
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('drive', '0022_trash'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='folder',
+            name='file_count',
+            field=models.IntegerField(default=0, editable=False, help_text='Number of files in this folder and its subfolders'),
+        ),
+        migrations.AddField(
+            model_name='folder',
+            name='folder_count',
+            field=models.IntegerField(default=0, editable=False, help_text='Number of subfolders at any depth below this folder'),
+        ),
+        migrations.AddField(
+            model_name='folder',
+            name='total_size',
+            field=models.BigIntegerField(default=0, editable=False, help_text='Size in bytes of all the files in this folder and its subfolders'),
+        ),
+        migrations.AddIndex(
+            model_name='folder',
+            index=models.Index(fields=['user', '-total_size'], name='folder_size_idx'),
+        ),
+        migrations.RunPython(backfill_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.1.6 on 2026-10-17 06:47
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('drive', '0023_folder_rollups'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='file',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True)), fields=['folder', '-created_at', '-id'], name='file_listing_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='file',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True), ('folder__isnull', True)), fields=['user', '-created_at', '-id'], name='file_root_listing_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='folder',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True)), fields=['parent_folder', '-created_at', '-id'], name='folder_listing_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='folder',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True), ('parent_folder__isnull', True)), fields=['user', '-created_at', '-id'], name='folder_root_listing_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='share',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['shared_with', 'expires_at'], name='share_active_idx'),
+        ),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 5.1.6 on 2026-10-17 06:49
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('drive', '0024_listing_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='folder',
+            name='folder_size_idx',
+        ),
+        migrations.AddIndex(
+            model_name='file',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True)), fields=['user', 'created_at', 'id'], name='file_by_created_at_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='file',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True)), fields=['user', 'updated_at', 'id'], name='file_by_updated_at_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='file',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True)), fields=['user', 'name', 'id'], name='file_by_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='file',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True)), fields=['user', 'size', 'id'], name='file_by_size_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='folder',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True)), fields=['user', 'created_at', 'id'], name='folder_by_created_at_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='folder',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True)), fields=['user', 'updated_at', 'id'], name='folder_by_updated_at_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='folder',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True)), fields=['user', 'name', 'id'], name='folder_by_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='folder',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True)), fields=['user', 'total_size', 'id'], name='folder_by_total_size_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.6 on 2026-10-17 07:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('drive', '0025_sort_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='uploadsession',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, help_text='When the last chunk was acknowledged, or the upload started'),
+        ),
+    ]
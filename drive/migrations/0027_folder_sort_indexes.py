@@ -0,0 +1,39 @@
+# Generated by Django 5.1.6 on 2026-10-17 07:32
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('drive', '0026_upload_activity'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='file',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True)), fields=['folder', 'updated_at', 'id'], name='file_in_by_updated_at_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='file',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True)), fields=['folder', 'name', 'id'], name='file_in_by_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='file',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True)), fields=['folder', 'size', 'id'], name='file_in_by_size_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='folder',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True)), fields=['parent_folder', 'updated_at', 'id'], name='folder_in_by_updated_at_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='folder',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True)), fields=['parent_folder', 'name', 'id'], name='folder_in_by_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='folder',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True)), fields=['parent_folder', 'total_size', 'id'], name='folder_in_by_total_size_idx'),
+        ),
+    ]
@@ -1,17 +1,22 @@
 import uuid
 import os
-import magic
-from django.db import models
-from django.db.models import UniqueConstraint, Q
+from django.db import models, transaction
+from django.db.models import UniqueConstraint, Q, F, Value
+from django.db.models.functions import Concat, Substr
+from django.utils import timezone
 from django.contrib.auth import get_user_model
 from django.core.validators import RegexValidator
 from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
 from django.contrib.auth.hashers import make_password, check_password
 
-from drive.managers import FileQuerySet, FolderQuerySet
+from drive.managers import FileQuerySet, FolderQuerySet, LiveManager
 
 User = get_user_model()
 
+# Subtree aggregates of a Folder, see drive.rollups
+ROLLUP_FIELDS = ('total_size', 'file_count', 'folder_count')
+
 
 def user_directory_path(instance, filename):
     """Generate a unique file path for uploaded files using the user's email and a UUID.
@@ -28,6 +33,112 @@ def user_directory_path(instance, filename):
     return os.path.join(instance.user.email, filename)
 
 
+def blob_path(instance, filename):
+    """Generate the content-addressed storage path of a blob.
+
+    Args:
+        instance: The Blob model instance
+        filename: Ignored, blobs are named after their SHA-256 digest
+
+    Returns:
+        str: Path where the blob will be stored (e.g., 'blobs/ab/cd/abcd...')
+    """
+    digest = instance.sha256
+    return os.path.join("blobs", digest[:2], digest[2:4], digest)
+
+
+class Blob(models.Model):
+    """Stores the bytes of uploaded files once per distinct content.
+
+    Attributes:
+        sha256: SHA-256 digest of the content, used as primary key
+        file: The stored content
+        size: Size of the content in bytes
+        ref_count: Number of File rows pointing at this blob
+        created_at: Timestamp when the content was first stored
+    """
+
+    sha256 = models.CharField(
+            max_length=64,
+            primary_key=True,
+            help_text="SHA-256 digest of the content"
+            )
+    file = models.FileField(
+            upload_to=blob_path,
+            max_length=255,
+            help_text="The stored content"
+            )
+    size = models.BigIntegerField(
+            help_text="Size of the content in bytes"
+            )
+    ref_count = models.PositiveIntegerField(
+            default=0,
+            help_text="Number of files using this content"
+            )
+    created_at = models.DateTimeField(
+            auto_now_add=True,
+            help_text="Date and time when the content was first stored"
+            )
+
+    class Meta:
+        verbose_name = "Blob"
+        verbose_name_plural = "Blobs"
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return self.sha256
+
+
+def preview_path(instance, filename):
+    """Generate the storage path of a preview from the digest of its blob and its size.
+
+    Returns:
+        str: e.g. 'previews/ab/cd/abcd...-256.jpg'
+    """
+    digest = instance.blob_id
+    return os.path.join("previews", digest[:2], digest[2:4], f"{digest}-{instance.size}.jpg")
+
+
+class Preview(models.Model):
+    """A thumbnail rendered from a blob, shared by every file with that content.
+
+    Attributes:
+        blob: The content the preview was rendered from
+        size: Length in pixels of the longest side the preview fits in
+        file: The rendered JPEG
+        created_at: Timestamp when the preview was rendered
+    """
+
+    blob = models.ForeignKey(
+            Blob,
+            on_delete=models.CASCADE,
+            related_name="previews",
+            help_text="Content the preview was rendered from"
+            )
+    size = models.PositiveSmallIntegerField(
+            help_text="Longest side of the preview in pixels"
+            )
+    file = models.FileField(
+            upload_to=preview_path,
+            max_length=255,
+            help_text="The rendered preview"
+            )
+    created_at = models.DateTimeField(
+            auto_now_add=True,
+            help_text="Date and time when the preview was rendered"
+            )
+
+    class Meta:
+        verbose_name = "Preview"
+        verbose_name_plural = "Previews"
+        constraints = [
+            UniqueConstraint(fields=['blob', 'size'], name='unique_preview_size'),
+        ]
+
+    def __str__(self):
+        return f"{self.blob_id} ({self.size}px)"
+
+
 class Folder(models.Model):
     """Represents a folder that can contain files and other folders.
 
@@ -36,10 +147,16 @@ class Folder(models.Model):
         user: Owner of the folder
         parent_folder: Parent folder if this is a subfolder (nullable)
         name: Name of the folder (alphanumeric with some special chars allowed)
+        path: Materialized path of ancestor ids, ending with this folder's id
+        depth: Number of ancestors above this folder (0 for root folders)
         created_at: Timestamp when folder was created
+        deleted_at: When the folder was moved to the trash (null if it was not)
+        total_size, file_count, folder_count: Rollups over the whole subtree,
+            kept up to date by drive.rollups
     """
 
-    objects = FolderQuerySet.as_manager()
+    objects = LiveManager.from_queryset(FolderQuerySet)()
+    all_objects = FolderQuerySet.as_manager()
     id = models.UUIDField(
             primary_key=True, 
             default=uuid.uuid4, 
@@ -70,29 +187,105 @@ class Folder(models.Model):
                 )],
             help_text="Name of the folder. Allowed characters: letters, numbers, _, -, ."
             )
+    path = models.TextField(
+            default="",
+            editable=False,
+            help_text="Materialized path of ancestor ids (e.g. '/<root>/<parent>/<self>/')"
+            )
+    depth = models.PositiveIntegerField(
+            default=0,
+            editable=False,
+            help_text="Number of ancestors above this folder"
+            )
     created_at = models.DateTimeField(
             auto_now_add=True,
             help_text="Date and time when the folder was created"
             )
+    updated_at = models.DateTimeField(
+            auto_now=True,
+            help_text="Date and time when the folder was last modified"
+            )
+    deleted_at = models.DateTimeField(
+            null=True,
+            blank=True,
+            editable=False,
+            help_text="When the folder was moved to the trash, with everything in it"
+            )
+    total_size = models.BigIntegerField(
+            default=0,
+            editable=False,
+            help_text="Size in bytes of all the files in this folder and its subfolders"
+            )
+    file_count = models.IntegerField(
+            default=0,
+            editable=False,
+            help_text="Number of files in this folder and its subfolders"
+            )
+    folder_count = models.IntegerField(
+            default=0,
+            editable=False,
+            help_text="Number of subfolders at any depth below this folder"
+            )
+
+    @property
+    def ancestor_ids(self):
+        """Ids of all ancestors of this folder, ordered from the root down."""
+        return [uuid.UUID(segment) for segment in self.path.strip("/").split("/")[:-1]]
+
+    def get_ancestors(self, include_self=False):
+        """Get all ancestors of this folder, ordered from the root down, in one query."""
+        ids = self.ancestor_ids
+        if include_self:
+            ids.append(self.pk)
+        return Folder.objects.filter(pk__in=ids).order_by("depth")
+
+    def get_descendants(self, include_self=False):
+        """Get every folder below this one, at any depth, in one query."""
+        qs = Folder.objects.filter(path__startswith=self.path)
+        if not include_self:
+            qs = qs.exclude(pk=self.pk)
+        return qs
+
+    def get_descendant_count(self):
+        """Count every folder below this one, at any depth."""
+        return self.get_descendants().count()
+
+    def is_descendant_of(self, other):
+        """Check if this folder lives somewhere below `other`."""
+        return self.pk != other.pk and self.path.startswith(other.path)
+
+    def _build_path(self):
+        """Compute path and depth from the parent folder as stored.
+
+        The parent's row is read and locked rather than trusted from memory,
+        so a folder moved under a parent that has itself moved since it was
+        loaded still gets the right path. Must run inside a transaction.
+
+        Raises:
+            ValidationError: If the parent is this folder or one of its descendants.
+        """
+        if self.parent_folder_id is None:
+            return f"/{self.pk.hex}/", 0
+        parent_path, parent_depth = Folder.all_objects.select_for_update().filter(
+                pk=self.parent_folder_id
+                ).values_list('path', 'depth').get()
+        if f"/{self.pk.hex}/" in parent_path:
+            raise ValidationError({'parent_folder': 'A folder cannot be moved inside itself.'})
+        return f"{parent_path}{self.pk.hex}/", parent_depth + 1
+
+    def _path_is_stale(self):
+        if not self.path:
+            return True
+        segments = self.path.strip("/").split("/")
+        parent_hex = segments[-2] if len(segments) > 1 else None
+        return parent_hex != (self.parent_folder_id.hex if self.parent_folder_id else None)
 
     def has_permission(self, user, required_permission='view'):
         """Check if a user has the required permission on this folder."""
-        if user == self.user:
+        from drive.permissions import get_permission, permission_allows
+        if self.user_id and user.pk == self.user_id:
             return True
-
-        try:
-            share = Share.objects.get(
-                    models.Q(folder=self) | models.Q(folder__in=self.get_ancestors()),
-                    shared_with=user,
-                    is_active=True
-                    )
-            if share.expires_at and share.expires_at < timezone.now():
-                return False
-
-            permission_order = ['view', 'edit', 'manage']
-            return permission_order.index(share.permission) >= permission_order.index(required_permission)
-        except Share.DoesNotExist:
-            return False
+        return permission_allows(get_permission(user, self), required_permission)
 
     def share(self, with_user, permission='view', expires=None):
         """Share this folder with another user."""
@@ -131,10 +324,47 @@ class Folder(models.Model):
                 raise ValidationError({'name': 'A folder with this name already exists in this folder.'})
 
     def save(self, *args, **kwargs):
-        """Override save method to automatically set user if not provided."""
+        """Override save method to set user and keep the materialized path in sync.
+
+        When the parent folder changes, the paths of all descendants are
+        rewritten with a single UPDATE so the tree index never goes stale.
+        The stored parent, path and depth are read under a row lock, so a
+        copy loaded before it or an ancestor moved neither writes back an
+        outdated path nor misses a move. The rollups are only written on
+        creation: they change through UPDATEs that the copy in memory may
+        not have seen.
+        """
         if not self.user:
             self.user = self._state.adding and kwargs.get('user', None)
-        super().save(*args, **kwargs)
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            # The path and depth are only written when recomputed below: a
+            # copy loaded before an ancestor moved holds outdated ones
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in (*ROLLUP_FIELDS, 'path', 'depth')
+            ]
+
+        with transaction.atomic():
+            old_path = stored_parent_id = None
+            if not self._state.adding:
+                # Where the folder is stored, which the copy in memory may
+                # not have seen if it or an ancestor was moved since
+                stored_parent_id, old_path, old_depth = Folder.all_objects.select_for_update().filter(
+                        pk=self.pk
+                        ).values_list('parent_folder_id', 'path', 'depth').get()
+            if self._state.adding or stored_parent_id != self.parent_folder_id or self._path_is_stale():
+                self.path, self.depth = self._build_path()
+                update_fields = kwargs.get('update_fields')
+                if update_fields is not None:
+                    kwargs['update_fields'] = {*update_fields, 'path', 'depth'}
+            else:
+                self.path, self.depth = old_path, old_depth
+            super().save(*args, **kwargs)
+            if old_path and old_path != self.path:
+                Folder.all_objects.filter(path__startswith=old_path).exclude(pk=self.pk).update(
+                        path=Concat(Value(self.path), Substr('path', len(old_path) + 1), output_field=models.TextField()),
+                        depth=F('depth') + (self.depth - old_depth)
+                        )
 
     def __str__(self):
         return str(self.name)
@@ -143,9 +373,23 @@ class Folder(models.Model):
         verbose_name = "Folder"
         verbose_name_plural = "Folders"
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['path'], name='folder_path_idx', opclasses=['text_pattern_ops']),
+            # Listings filter on the parent, or on the owner at the root, and
+            # page newest first; only live folders are listed
+            models.Index(fields=['parent_folder', '-created_at', '-id'], condition=Q(deleted_at__isnull=True), name='folder_listing_idx'),
+            models.Index(fields=['user', '-created_at', '-id'], condition=Q(parent_folder__isnull=True, deleted_at__isnull=True), name='folder_root_listing_idx'),
+            # One per field of drive.sorting.SORTABLE_FIELDS
+            *(models.Index(fields=['user', field, 'id'], condition=Q(deleted_at__isnull=True), name=f'folder_by_{field}_idx')
+              for field in ('created_at', 'updated_at', 'name', 'total_size')),
+            # and per parent, where folder_listing_idx already covers created_at
+            *(models.Index(fields=['parent_folder', field, 'id'], condition=Q(deleted_at__isnull=True), name=f'folder_in_by_{field}_idx')
+              for field in ('updated_at', 'name', 'total_size')),
+        ]
         constraints = [
-            UniqueConstraint(fields=['user', 'parent_folder', 'name'], name='unique_folder_name'),
-            UniqueConstraint(fields=['user', 'name'], condition=Q(parent_folder__isnull=True), name='unique_root_folder_name')
+            # Trashed folders do not hold on to their names
+            UniqueConstraint(fields=['user', 'parent_folder', 'name'], condition=Q(deleted_at__isnull=True), name='unique_folder_name'),
+            UniqueConstraint(fields=['user', 'name'], condition=Q(parent_folder__isnull=True, deleted_at__isnull=True), name='unique_root_folder_name')
         ]
 
 
@@ -157,13 +401,16 @@ class File(models.Model):
         user: Owner of the file
         folder: Folder containing this file (nullable)
         name: Display name of the file
-        file: Actual file data stored in the filesystem
+        file: Actual file data, stored under the path of its blob
+        blob: Content-addressed blob holding the file data (null for legacy uploads)
         mime_type: Detected MIME type of the file
         size: Size of the file in bytes
         created_at: Timestamp when file was uploaded
+        deleted_at: When the file was moved to the trash (null if it was not)
     """
 
-    objects = FileQuerySet.as_manager()
+    objects = LiveManager.from_queryset(FileQuerySet)()
+    all_objects = FileQuerySet.as_manager()
     id = models.UUIDField(
             primary_key=True, 
             default=uuid.uuid4, 
@@ -195,6 +442,15 @@ class File(models.Model):
             upload_to=user_directory_path,
             help_text="The actual file to upload"
             )
+    blob = models.ForeignKey(
+            Blob,
+            on_delete=models.PROTECT,
+            null=True,
+            blank=True,
+            editable=False,
+            related_name="files",
+            help_text="Deduplicated content of the file"
+            )
     mime_type = models.CharField(
             max_length=100, 
             blank=True, 
@@ -209,32 +465,23 @@ class File(models.Model):
             auto_now_add=True,
             help_text="Date and time when the file was uploaded"
             )
+    updated_at = models.DateTimeField(
+            auto_now=True,
+            help_text="Date and time when the file was last modified"
+            )
+    deleted_at = models.DateTimeField(
+            null=True,
+            blank=True,
+            editable=False,
+            help_text="When the file, or the folder it is in, was moved to the trash"
+            )
 
     def has_permission(self, user, required_permission='view'):
         """Check if a user has the required permission on this file."""
-        if user == self.user:
+        from drive.permissions import get_permission, permission_allows
+        if self.user_id and user.pk == self.user_id:
             return True
-
-        # Check direct file shares
-        try:
-            share = Share.objects.get(
-                    file=self,
-                    shared_with=user,
-                    is_active=True
-                    )
-            if share.expires_at and share.expires_at < timezone.now():
-                return False
-
-            permission_order = ['view', 'edit', 'manage']
-            return permission_order.index(share.permission) >= permission_order.index(required_permission)
-        except Share.DoesNotExist:
-            pass
-
-        # Check folder shares that might include this file
-        if self.folder:
-            return self.folder.has_permission(user, required_permission)
-
-        return False
+        return permission_allows(get_permission(user, self), required_permission)
 
     def share(self, with_user, permission='view', expires=None):
         """Share this file with another user."""
@@ -261,22 +508,50 @@ class File(models.Model):
                 shared_with_me__is_active=True
                 ).distinct()
 
-    def clean(self):
-        """Detect MIME type when cleaning the model."""
-        super().clean()
-        if self.file:
-            mime = magic.from_buffer(self.file.read(1024), mime=True)
-            self.mime_type = mime
-            self.file.seek(0)
-
     def save(self, *args, **kwargs):
-        """Override save method to set user, name, and size automatically."""
+        """Override save method to set user, name, and size automatically.
+
+        Newly assigned content is stored in its content-addressed blob instead
+        of a per-user copy, and the previous blob is released when replaced.
+        The owner's storage usage is charged for the new bytes, and the MIME
+        type and previews of new content are computed in the background.
+
+        Raises:
+            QuotaExceeded: If the content does not fit in the owner's quota.
+        """
+        from drive.blobs import store_file, release
+        from drive.quota import charge
+        from drive.processing import schedule_processing
+
         if not self.user:
             self.user = self._state.adding and kwargs.get('user', None)
         if not self.name:
             self.name = self.file.name
-        self.size = self.file.size
-        super().save(*args, **kwargs)
+        # Only ask storage for the size of newly assigned content
+        if self.size is None or not self.file._committed:
+            self.size = self.file.size
+
+        with transaction.atomic():
+            if self._state.adding:
+                charge(self.user_id, self.size)
+            elif not self.file._committed:
+                old_size = File.all_objects.filter(pk=self.pk).values_list('size', flat=True).first() or 0
+                charge(self.user_id, self.size - old_size)
+
+            replaced_blob_id = None
+            new_content = self.file and not self.file._committed
+            if new_content:
+                replaced_blob_id = self.blob_id
+                self.blob = store_file(self.file.file)
+                self.file.name = self.blob.file.name
+                self.file._committed = True
+                if not self._state.adding:
+                    self.mime_type = ''
+            super().save(*args, **kwargs)
+            if replaced_blob_id:
+                release(replaced_blob_id)
+            if new_content:
+                schedule_processing(self)
 
     def __str__(self):
         return str(self.name)
@@ -285,6 +560,16 @@ class File(models.Model):
         verbose_name = "File"
         verbose_name_plural = "Files"
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['folder', '-created_at', '-id'], condition=Q(deleted_at__isnull=True), name='file_listing_idx'),
+            models.Index(fields=['user', '-created_at', '-id'], condition=Q(folder__isnull=True, deleted_at__isnull=True), name='file_root_listing_idx'),
+            # One per field of drive.sorting.SORTABLE_FIELDS
+            *(models.Index(fields=['user', field, 'id'], condition=Q(deleted_at__isnull=True), name=f'file_by_{field}_idx')
+              for field in ('created_at', 'updated_at', 'name', 'size')),
+            # and per folder, where file_listing_idx already covers created_at
+            *(models.Index(fields=['folder', field, 'id'], condition=Q(deleted_at__isnull=True), name=f'file_in_by_{field}_idx')
+              for field in ('updated_at', 'name', 'size')),
+        ]
 
 
 class Share(models.Model):
@@ -363,6 +648,15 @@ class Share(models.Model):
         ordering = ['-shared_at']
         verbose_name = "Share"
         verbose_name_plural = "Shares"
+        indexes = [
+            # Permission checks look up the active shares of one user
+            models.Index(fields=['shared_with', 'expires_at'], condition=Q(is_active=True), name='share_active_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        """Save inside a transaction, so the change journal entry commits with the share."""
+        with transaction.atomic():
+            super().save(*args, **kwargs)
 
     def clean(self):
         """Validate that either file or folder is set, but not both."""
@@ -471,10 +765,294 @@ class ShareLink(models.Model):
         return reverse('share-link', kwargs={'token': self.id})
 
     def increment_download_count(self):
-        """Increment the download counter."""
-        self.download_count = self.download_count + 1
-        self.save(update_fields=['download_count'])
+        """Count a download. Buffered in memory and written in batches."""
+        from drive.counters import download_counter
+        download_counter.add(self.pk)
+
+    async def aincrement_download_count(self):
+        """Async version of `increment_download_count`."""
+        from drive.counters import download_counter
+        await download_counter.aadd(self.pk)
+
+    def get_download_count(self):
+        """Number of downloads, including the ones this process has not written yet."""
+        from drive.counters import download_counter
+        return self.download_count + download_counter.pending(self.pk)
 
     def __str__(self):
         item = self.file if self.file else self.folder
         return f"Public share link for {item} (created by {self.created_by})"
+
+
+class UploadSession(models.Model):
+    """Tracks a resumable upload whose bytes arrive in fixed-size chunks.
+
+    Chunks are appended to a staging file in order; `offset` is the number of
+    bytes acknowledged so far, which is where an interrupted client resumes.
+    """
+
+    DEFAULT_CHUNK_SIZE = 8 * 1024 * 1024
+    MAX_CHUNK_SIZE = 64 * 1024 * 1024
+
+    id = models.UUIDField(
+            primary_key=True,
+            default=uuid.uuid4,
+            editable=False,
+            help_text="Unique identifier for the upload"
+            )
+    user = models.ForeignKey(
+            User,
+            on_delete=models.CASCADE,
+            related_name='upload_sessions',
+            help_text="User who started the upload"
+            )
+    folder = models.ForeignKey(
+            Folder,
+            on_delete=models.CASCADE,
+            null=True,
+            blank=True,
+            related_name='upload_sessions',
+            help_text="Folder the file will be created in"
+            )
+    name = models.CharField(
+            max_length=255,
+            help_text="Name of the file being uploaded"
+            )
+    size = models.BigIntegerField(
+            help_text="Total size of the file in bytes"
+            )
+    chunk_size = models.PositiveIntegerField(
+            default=DEFAULT_CHUNK_SIZE,
+            help_text="Size of every chunk except the last one, in bytes"
+            )
+    offset = models.BigIntegerField(
+            default=0,
+            help_text="Number of bytes received and acknowledged so far"
+            )
+    mime_type = models.CharField(
+            max_length=100,
+            blank=True,
+            help_text="MIME type detected from the first chunk"
+            )
+    file = models.OneToOneField(
+            File,
+            on_delete=models.SET_NULL,
+            null=True,
+            blank=True,
+            related_name='upload_session',
+            help_text="File created when the upload was committed"
+            )
+    created_at = models.DateTimeField(
+            auto_now_add=True,
+            help_text="When the upload was started"
+            )
+    updated_at = models.DateTimeField(
+            auto_now=True,
+            help_text="When the last chunk was acknowledged, or the upload started"
+            )
+
+    class Meta:
+        verbose_name = "Upload Session"
+        verbose_name_plural = "Upload Sessions"
+        ordering = ['-created_at']
+
+    @property
+    def is_complete(self):
+        return self.offset >= self.size
+
+    @property
+    def staging_name(self):
+        """Storage name of the partial file the chunks are written to."""
+        return f"uploads/{self.pk}.part"
+
+    def __str__(self):
+        return f"Upload of {self.name} ({self.offset}/{self.size} bytes)"
+
+
+class UploadChunk(models.Model):
+    """A chunk of an upload session that has been written and acknowledged."""
+
+    session = models.ForeignKey(
+            UploadSession,
+            on_delete=models.CASCADE,
+            related_name='chunks',
+            help_text="Upload this chunk belongs to"
+            )
+    index = models.PositiveIntegerField(
+            help_text="Position of the chunk in the upload, starting at 0"
+            )
+    offset = models.BigIntegerField(
+            help_text="Byte offset of the chunk in the file"
+            )
+    size = models.PositiveIntegerField(
+            help_text="Size of the chunk in bytes"
+            )
+    sha256 = models.CharField(
+            max_length=64,
+            help_text="SHA-256 checksum of the chunk"
+            )
+
+    class Meta:
+        verbose_name = "Upload Chunk"
+        verbose_name_plural = "Upload Chunks"
+        ordering = ['index']
+        constraints = [
+            UniqueConstraint(fields=['session', 'index'], name='unique_upload_chunk'),
+        ]
+
+
+class Change(models.Model):
+    """An entry of the append-only change journal that sync clients replay.
+
+    Every create, update and delete of a File, Folder or Share appends one
+    row per affected user in the same transaction as the change. The rows
+    of a user are committed in `seq` order (see `drive.changes.append`),
+    so a client resumes from the last `seq` it has seen.
+    """
+
+    class Action(models.TextChoices):
+        CREATED = 'created', 'Created'
+        UPDATED = 'updated', 'Updated'
+        DELETED = 'deleted', 'Deleted'
+
+    class Kind(models.TextChoices):
+        FILE = 'file', 'File'
+        FOLDER = 'folder', 'Folder'
+        SHARE = 'share', 'Share'
+
+    seq = models.BigAutoField(
+            primary_key=True,
+            help_text="Position of the change in the journal"
+            )
+    user = models.ForeignKey(
+            User,
+            on_delete=models.CASCADE,
+            related_name='changes',
+            help_text="User whose view of the drive changed"
+            )
+    action = models.CharField(
+            max_length=10,
+            choices=Action.choices,
+            help_text="What happened to the item"
+            )
+    kind = models.CharField(
+            max_length=10,
+            choices=Kind.choices,
+            help_text="Type of the changed item"
+            )
+    item_id = models.UUIDField(
+            help_text="Id of the changed item"
+            )
+    parent_id = models.UUIDField(
+            null=True,
+            blank=True,
+            help_text="Folder containing the item, or the shared item for shares"
+            )
+    name = models.CharField(
+            max_length=255,
+            blank=True,
+            help_text="Name of the item after the change"
+            )
+    size = models.BigIntegerField(
+            null=True,
+            blank=True,
+            help_text="Size of a file after the change"
+            )
+    created_at = models.DateTimeField(
+            auto_now_add=True,
+            help_text="When the change happened"
+            )
+
+    class Meta:
+        verbose_name = "Change"
+        verbose_name_plural = "Changes"
+        ordering = ['seq']
+        indexes = [
+            models.Index(fields=['user', 'seq'], name='change_user_seq_idx'),
+        ]
+
+    def __str__(self):
+        return f"#{self.seq} {self.kind} {self.item_id} {self.action}"
+
+
+class Job(models.Model):
+    """A unit of background work waiting in, or taken from, the task queue.
+
+    Jobs are claimed by `run_worker` processes with a compare-and-set
+    UPDATE on `status`, so any number of workers can share the queue
+    without an external broker. Finished jobs are deleted; failing ones are
+    retried with a backoff and kept once they run out of attempts.
+    """
+
+    class Status(models.TextChoices):
+        QUEUED = 'queued', 'Queued'
+        RUNNING = 'running', 'Running'
+        FAILED = 'failed', 'Failed'
+
+    task = models.CharField(
+            max_length=100,
+            help_text="Registered name of the task to run"
+            )
+    args = models.JSONField(
+            encoder=DjangoJSONEncoder,
+            default=list,
+            blank=True,
+            help_text="Positional arguments of the task"
+            )
+    kwargs = models.JSONField(
+            encoder=DjangoJSONEncoder,
+            default=dict,
+            blank=True,
+            help_text="Keyword arguments of the task"
+            )
+    priority = models.SmallIntegerField(
+            default=0,
+            help_text="Jobs with a higher priority run first"
+            )
+    status = models.CharField(
+            max_length=10,
+            choices=Status.choices,
+            default=Status.QUEUED,
+            help_text="Where the job is in its lifecycle"
+            )
+    attempts = models.PositiveSmallIntegerField(
+            default=0,
+            help_text="Number of times the job was started"
+            )
+    max_attempts = models.PositiveSmallIntegerField(
+            default=3,
+            help_text="Number of starts after which a failing job is given up"
+            )
+    run_at = models.DateTimeField(
+            default=timezone.now,
+            help_text="The job is not started before this time"
+            )
+    locked_at = models.DateTimeField(
+            null=True,
+            blank=True,
+            help_text="When a worker last claimed the job"
+            )
+    locked_by = models.CharField(
+            max_length=100,
+            blank=True,
+            help_text="Worker that last claimed the job"
+            )
+    last_error = models.TextField(
+            blank=True,
+            help_text="Traceback of the last failed attempt"
+            )
+    created_at = models.DateTimeField(
+            auto_now_add=True,
+            help_text="When the job was queued"
+            )
+
+    class Meta:
+        verbose_name = "Job"
+        verbose_name_plural = "Jobs"
+        ordering = ['-priority', 'run_at', 'id']
+        indexes = [
+            models.Index(fields=['status', '-priority', 'run_at'], name='job_ready_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.task} #{self.pk} ({self.status})"
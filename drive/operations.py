@@ -0,0 +1,328 @@
+import os
+import uuid
+from collections import Counter, defaultdict
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .blobs import add_references
+from .changes import append, journal_entries
+from .events import publish, CREATED, UPDATED
+from .listings import bump, folder_scope
+from .models import File, Folder, Share, ShareLink
+from .quota import charge
+from .rollups import ROLLUP_FIELDS, contribution, roll_up, roll_up_folders
+from .search import get_search_backend
+from .sharelinks import invalidate_share_link
+from .trash import trash_many
+
+MAX_BULK_ITEMS = 1000
+
+NOT_FOUND = "Not found or unauthorized"
+
+
+class BulkError(ValueError):
+    """Raised when a bulk operation cannot run at all, e.g. its target is missing."""
+
+
+def _result(pk, error=None, created_id=None):
+    return {"id": pk, "ok": error is None, "error": error, "created_id": created_id}
+
+
+def _unique(ids):
+    return list(dict.fromkeys(ids))
+
+
+def _load(user, file_ids, folder_ids):
+    """Fetch the files and folders of `user` among the given ids, in two queries.
+
+    Returns:
+        tuple: (files by id, folders by id, results for the ids that were not found)
+
+    Raises:
+        BulkError: If more than MAX_BULK_ITEMS ids are given.
+    """
+    if len(file_ids) + len(folder_ids) > MAX_BULK_ITEMS:
+        raise BulkError(f"At most {MAX_BULK_ITEMS} items can be changed at once.")
+    files = user.files.in_bulk(file_ids) if file_ids else {}
+    folders = user.folders.in_bulk(folder_ids) if folder_ids else {}
+    results = {pk: _result(pk, NOT_FOUND) for pk in file_ids if pk not in files}
+    results.update((pk, _result(pk, NOT_FOUND)) for pk in folder_ids if pk not in folders)
+    return files, folders, results
+
+
+def _target(user, folder_id):
+    """The destination folder of a move or copy, None for the user's root.
+
+    Raises:
+        BulkError: If the folder does not exist or belongs to someone else.
+    """
+    if not folder_id:
+        return None
+    target = user.folders.filter(pk=folder_id).first()
+    if target is None:
+        raise BulkError("Target folder not found or unauthorized")
+    return target
+
+
+def _announce(action, items):
+    """Journal and publish changes made without `save()`, so without signals.
+
+    All journal rows are written with one INSERT.
+    """
+    append([entry for item in items for entry in journal_entries(action, item)])
+    for item in items:
+        publish(action, item)
+
+
+def _copy_name(name, taken, is_file):
+    """First of `name`, `name-copy`, `name-copy-2`... not in `taken`, which it is added to."""
+    stem, ext = os.path.splitext(name) if is_file else (name, "")
+    candidate, n = name, 1
+    while candidate in taken:
+        candidate = f"{stem}-copy{ext}" if n == 1 else f"{stem}-copy-{n}{ext}"
+        n += 1
+    taken.add(candidate)
+    return candidate
+
+
+def _ordered(results, file_ids, folder_ids):
+    return [results[pk] for pk in [*file_ids, *folder_ids]]
+
+
+def delete_items(user, file_ids=(), folder_ids=()):
+    """Move many files and folders of `user` to the trash in one transaction.
+
+    Folders take their whole subtree with them, and everything is marked
+    with a few UPDATEs whatever the number of items, see `trash_many`; the
+    rows and their bytes go when the trash is purged.
+
+    Returns:
+        list: One result dict (id, ok, error) per given id
+    """
+    file_ids, folder_ids = _unique(file_ids), _unique(folder_ids)
+    files, folders, results = _load(user, file_ids, folder_ids)
+    trash_many(list(files), list(folders))
+    results.update((pk, _result(pk)) for pk in [*files, *folders])
+    return _ordered(results, file_ids, folder_ids)
+
+
+def move_items(user, file_ids=(), folder_ids=(), target_id=None):
+    """Move many files and folders of `user` into one folder, or to the root.
+
+    Files are moved with a single `bulk_update`. Folders are saved one by
+    one, since each move rewrites the paths of its subtree; the target and
+    the moved folders are locked first, so the check that no folder goes
+    inside itself sees every committed move.
+
+    Returns:
+        list: One result dict (id, ok, error) per given id
+
+    Raises:
+        BulkError: If the target folder is not found.
+    """
+    file_ids, folder_ids = _unique(file_ids), _unique(folder_ids)
+    files, folders, results = _load(user, file_ids, folder_ids)
+    target_pk = uuid.UUID(str(target_id)) if target_id else None
+
+    now = timezone.now()
+    with transaction.atomic():
+        # Lock the target and the moved folders, in a fixed order, and check
+        # their paths as stored: a concurrent move in the other direction
+        # would otherwise pass the cycle check as well
+        locked = user.folders.select_for_update().filter(
+                pk__in=[*folders, *filter(None, [target_pk])]
+                ).order_by("pk").in_bulk()
+        target = locked.get(target_pk) if target_pk else None
+        if target_pk and target is None:
+            raise BulkError("Target folder not found or unauthorized")
+
+        moved = [file for file in files.values() if file.folder_id != target_pk]
+        scopes = {folder_scope(user.pk, target_pk)} | {folder_scope(user.pk, file.folder_id) for file in moved}
+        roll_up_folders([
+            *((file.folder_id, -file.size, -1, 0) for file in moved),
+            (target_pk, sum(file.size for file in moved), len(moved), 0),
+        ])
+        for file in moved:
+            file.folder = target
+            file.updated_at = now
+        File.objects.bulk_update(moved, ["folder", "updated_at"])
+        _announce(UPDATED, moved)
+        for token in ShareLink.objects.filter(file__in=moved).values_list("id", flat=True):
+            invalidate_share_link(token)
+        results.update((pk, _result(pk)) for pk in files)
+
+        taken = set(Folder.objects.filter(
+                user=user, parent_folder=target, name__in=[locked[pk].name for pk in folders if pk in locked]
+                ).values_list("name", flat=True)) if folders else set()
+        for pk in folders:
+            folder = locked.get(pk)
+            if folder is None:
+                results[pk] = _result(pk, NOT_FOUND)
+            elif target and target.path.startswith(folder.path):
+                results[pk] = _result(pk, "A folder cannot be moved inside itself.")
+            elif folder.parent_folder_id == target_pk:
+                results[pk] = _result(pk)
+            elif folder.name in taken:
+                results[pk] = _result(pk, "A folder with this name already exists in this folder.")
+            else:
+                folder.parent_folder = target
+                folder.save()
+                taken.add(folder.name)
+                results[pk] = _result(pk)
+        bump(*scopes)
+    return _ordered(results, file_ids, folder_ids)
+
+
+def move_item(user, file_id=None, folder_id=None, target_id=None):
+    """Move one file or folder of `user`, see `move_items`.
+
+    Returns:
+        File or Folder: The moved item
+
+    Raises:
+        BulkError: If the item or the target folder is not found, if a
+            folder is moved inside itself or if its name is taken there.
+    """
+    (result,) = move_items(user, [file_id] if file_id else [], [folder_id] if folder_id else [], target_id)
+    if not result["ok"]:
+        raise BulkError(result["error"])
+    return (Folder if folder_id else File).objects.get(pk=file_id or folder_id)
+
+
+def copy_items(user, file_ids=(), folder_ids=(), target_id=None):
+    """Copy many files and folders of `user`, with their subtrees, into one folder.
+
+    Copies share the blobs of the originals, so no bytes are written: the
+    new rows are inserted with one `bulk_create` per model and the blobs
+    get their extra references in one UPDATE each. A copy whose name is
+    taken in the target is named `name-copy`, `name-copy-2`...
+
+    Returns:
+        list: One result dict (id, ok, error, created_id) per given id
+
+    Raises:
+        BulkError: If the target folder is not found.
+        QuotaExceeded: If the copies do not fit in the user's quota.
+    """
+    file_ids, folder_ids = _unique(file_ids), _unique(folder_ids)
+    target = _target(user, target_id)
+    files, folders, results = _load(user, file_ids, folder_ids)
+
+    taken_files = set(File.objects.filter(user=user, folder=target).values_list("name", flat=True))
+    taken_folders = set(Folder.objects.filter(user=user, parent_folder=target).values_list("name", flat=True))
+    roots, subtrees, subtree_files = [], Q(), Q()
+    for folder in folders.values():
+        if target and target.path.startswith(folder.path):
+            results[folder.pk] = _result(folder.pk, "A folder cannot be copied inside itself.")
+        else:
+            roots.append(folder)
+            subtrees |= Q(path__startswith=folder.path)
+            subtree_files |= Q(folder__path__startswith=folder.path)
+    subtree_folders = list(Folder.objects.filter(subtrees).order_by("depth")) if roots else []
+    files_by_folder = defaultdict(list)
+    for file in (File.objects.filter(subtree_files) if roots else []):
+        files_by_folder[file.folder_id].append(file)
+
+    def clone_folder(folder, parent, name):
+        pk = uuid.uuid4()
+        path = f"{parent.path if parent else '/'}{pk.hex}/"
+        # The subtree is copied whole, so are its rollups
+        return Folder(id=pk, user=user, parent_folder=parent, name=name, path=path, depth=path.count("/") - 2,
+                      **{field: getattr(folder, field) for field in ROLLUP_FIELDS})
+
+    def clone_file(file, folder, name):
+        clone = File(user=user, folder=folder, name=name, blob_id=file.blob_id, mime_type=file.mime_type, size=file.size)
+        clone.file.name = file.file.name
+        return clone
+
+    new_folders, new_files, copies = [], [], {}
+    for root in roots:
+        clones = {root.pk: clone_folder(root, target, _copy_name(root.name, taken_folders, is_file=False))}
+        # Parents come before their children, ordered by depth
+        for folder in subtree_folders:
+            if folder.parent_folder_id in clones and folder.pk not in clones:
+                clones[folder.pk] = clone_folder(folder, clones[folder.parent_folder_id], folder.name)
+        for pk, clone in clones.items():
+            new_files.extend(clone_file(file, clone, file.name) for file in files_by_folder[pk])
+        new_folders.extend(clones.values())
+        copies[root.pk] = clones[root.pk]
+    for file in files.values():
+        copies[file.pk] = clone_file(file, target, _copy_name(file.name, taken_files, is_file=True))
+        new_files.append(copies[file.pk])
+
+    with transaction.atomic():
+        charge(user.pk, sum(file.size for file in new_files))
+        Folder.objects.bulk_create(new_folders)
+        File.objects.bulk_create(new_files)
+        add_references(Counter(file.blob_id for file in new_files if file.blob_id))
+        roll_up([(target.path if target else None, *amounts) for amounts in [
+            *(contribution(copies[root.pk]) for root in roots),
+            *((file.size, 1, 0) for file in files.values()),
+        ]])
+        get_search_backend().index_many([*new_folders, *new_files])
+        _announce(CREATED, [*new_folders, *new_files])
+        bump(folder_scope(user.pk, target.pk if target else None))
+    results.update((pk, _result(pk, created_id=copy.pk)) for pk, copy in copies.items())
+    return _ordered(results, file_ids, folder_ids)
+
+
+def copy_item(user, file_id=None, folder_id=None, target_id=None):
+    """Copy one file or folder of `user`, see `copy_items`.
+
+    Returns:
+        File or Folder: The copy
+
+    Raises:
+        BulkError: If the item or the target folder is not found, or if a
+            folder is copied inside itself.
+        QuotaExceeded: If the copy does not fit in the user's quota.
+    """
+    (result,) = copy_items(user, [file_id] if file_id else [], [folder_id] if folder_id else [], target_id)
+    if not result["ok"]:
+        raise BulkError(result["error"])
+    return (Folder if folder_id else File).objects.get(pk=result["created_id"])
+
+
+def share_items(user, file_ids=(), folder_ids=(), shared_with=None, permission="view", expires_at=None):
+    """Share many files and folders of `user` with another user.
+
+    Existing shares with that user are updated to the new permission and
+    expiry, the others are created, with one query each.
+
+    Returns:
+        list: One result dict (id, ok, error, created_id) per given id, with
+            the id of the share as `created_id`
+
+    Raises:
+        BulkError: If `shared_with` is missing or is `user`.
+    """
+    if shared_with is None or shared_with.pk == user.pk:
+        raise BulkError("Items must be shared with another user.")
+    file_ids, folder_ids = _unique(file_ids), _unique(folder_ids)
+    files, folders, results = _load(user, file_ids, folder_ids)
+
+    existing = {
+        share.file_id or share.folder_id: share
+        for share in Share.objects.filter(Q(file__in=files) | Q(folder__in=folders), shared_with=shared_with)
+    }
+    for share in existing.values():
+        share.shared_by = user
+        share.permission = permission
+        share.expires_at = expires_at
+        share.is_active = True
+    created = [
+        Share(shared_by=user, shared_with=shared_with, permission=permission, expires_at=expires_at,
+              **({"file": item} if isinstance(item, File) else {"folder": item}))
+        for item in [*files.values(), *folders.values()] if item.pk not in existing
+    ]
+
+    with transaction.atomic():
+        Share.objects.bulk_update(existing.values(), ["shared_by", "permission", "expires_at", "is_active"])
+        Share.objects.bulk_create(created)
+        _announce(UPDATED, list(existing.values()))
+        _announce(CREATED, created)
+    for share in [*existing.values(), *created]:
+        pk = share.file_id or share.folder_id
+        results[pk] = _result(pk, created_id=share.pk)
+    return _ordered(results, file_ids, folder_ids)
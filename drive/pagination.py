@@ -0,0 +1,122 @@
+import base64
+import uuid
+from datetime import datetime
+from django.db.models import Q, Value, CharField
+
+from .models import Folder, File
+from .search import load_ranked
+
+PAGE_SIZE = 50
+MAX_PAGE_SIZE = 100
+
+# Every keyset page is ordered newest first, with the id breaking ties
+ORDERING = ("-created_at", "-id")
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(item):
+    """Encode the sort key of an item into an opaque cursor."""
+    raw = f"{item.created_at.isoformat()}|{item.pk}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor):
+    """Decode a cursor back into its (created_at, id) sort key.
+
+    Raises:
+        InvalidCursor: If the cursor was not produced by `encode_cursor`.
+    """
+    try:
+        created_at, pk = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(created_at), uuid.UUID(pk)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise InvalidCursor("Invalid cursor") from e
+
+
+def encode_offset_cursor(offset):
+    """Encode a position in a ranked result list into an opaque cursor."""
+    return base64.urlsafe_b64encode(f"offset|{offset}".encode()).decode()
+
+
+def decode_offset_cursor(cursor):
+    """Decode a cursor produced by `encode_offset_cursor`.
+
+    Raises:
+        InvalidCursor: If the cursor is not an offset cursor.
+    """
+    try:
+        prefix, offset = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        if prefix != "offset":
+            raise ValueError(prefix)
+        return int(offset)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise InvalidCursor("Invalid cursor") from e
+
+
+def page_size(first):
+    if first is None:
+        return PAGE_SIZE
+    return max(1, min(first, MAX_PAGE_SIZE))
+
+
+def _after(after):
+    """Filter selecting the rows that sort after the cursor."""
+    if not after:
+        return Q()
+    created_at, pk = decode_cursor(after)
+    return Q(created_at__lt=created_at) | Q(created_at=created_at, pk__lt=pk)
+
+
+def paginate(queryset, first=None, after=None):
+    """Fetch one keyset page of a queryset.
+
+    Returns:
+        tuple: (items, has_next_page)
+    """
+    limit = page_size(first)
+    items = list(queryset.filter(_after(after)).order_by(*ORDERING)[:limit + 1])
+    return items[:limit], len(items) > limit
+
+
+def paginate_contents(files, folders, first=None, after=None):
+    """Fetch one keyset page of files and folders merged into a single listing.
+
+    The two querysets are merged and sorted in the database with a UNION, so
+    only the keys of one page are ever read, then the rows are loaded by id.
+
+    Returns:
+        tuple: (items, has_next_page)
+    """
+    limit = page_size(first)
+    keyset = _after(after)
+    file_keys = files.filter(keyset).order_by().values("id", "created_at", kind=Value("file", output_field=CharField()))
+    folder_keys = folders.filter(keyset).order_by().values("id", "created_at", kind=Value("folder", output_field=CharField()))
+    keys = list(file_keys.union(folder_keys, all=True).order_by(*ORDERING)[:limit + 1])
+    has_next = len(keys) > limit
+    keys = keys[:limit]
+
+    loaded = {
+        "file": File.objects.in_bulk([key["id"] for key in keys if key["kind"] == "file"]),
+        "folder": Folder.objects.in_bulk([key["id"] for key in keys if key["kind"] == "folder"]),
+    }
+    return [loaded[key["kind"]][key["id"]] for key in keys if key["id"] in loaded[key["kind"]]], has_next
+
+
+def paginate_ranked(search, first=None, after=None):
+    """Fetch one page of a ranked search.
+
+    Ranked results have no stable keyset, so they are paged by position.
+    `search` is called with (limit, offset) and returns (kind, id) pairs.
+
+    Returns:
+        tuple: (items, has_next_page, cursors)
+    """
+    limit = page_size(first)
+    offset = decode_offset_cursor(after) + 1 if after else 0
+    keys = search(limit + 1, offset)
+    items = load_ranked(keys[:limit])
+    cursors = [encode_offset_cursor(offset + i) for i in range(len(items))]
+    return items, len(keys) > limit, cursors
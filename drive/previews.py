@@ -0,0 +1,128 @@
+import functools
+import io
+import shutil
+import subprocess
+import tempfile
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import IntegrityError, transaction
+from django.urls import reverse
+
+from .models import Preview
+
+try:
+    from PIL import Image, ImageOps
+    Image.init()
+except ImportError:  # Pillow is optional, without it no previews are rendered
+    Image = None
+
+PDF_MIME_TYPE = "application/pdf"
+DEFAULT_SIZE = 256
+QUALITY = 85
+
+
+def preview_sizes():
+    """Sizes previews are rendered in, smallest first."""
+    return sorted(getattr(settings, "DRIVE_PREVIEW_SIZES", (128, 256, 1024)))
+
+
+def snap_size(size=None):
+    """The rendered size serving a request for `size` pixels: the smallest one that is large enough."""
+    sizes = preview_sizes()
+    size = size or DEFAULT_SIZE
+    return next((s for s in sizes if s >= size), sizes[-1])
+
+
+@functools.cache
+def _has_pdftoppm():
+    return shutil.which("pdftoppm") is not None
+
+
+def can_preview(mime_type):
+    """Whether previews can be rendered for content of this MIME type."""
+    if Image is None or not mime_type:
+        return False
+    if mime_type == PDF_MIME_TYPE:
+        return _has_pdftoppm()
+    return mime_type.startswith("image/") and mime_type in Image.MIME.values()
+
+
+def thumbnail_url(file, size=None):
+    """URL of a preview of a File, or None when its content cannot be previewed.
+
+    The URL embeds the content digest, so it changes with the content and
+    the response can be cached forever.
+    """
+    if not file.blob_id or not can_preview(file.mime_type):
+        return None
+    url = reverse("file-thumbnail", kwargs={"pk": file.pk, "size": snap_size(size)})
+    return f"{url}?v={file.blob_id[:16]}"
+
+
+def _open_source(blob, mime_type):
+    """Open the content of a blob as a Pillow image; for PDFs, its first page."""
+    if mime_type != PDF_MIME_TYPE:
+        with blob.file.open("rb") as content:
+            image = Image.open(content)
+            # Lets JPEGs be decoded at a reduced scale, much faster than full size
+            image.draft("RGB", (preview_sizes()[-1],) * 2)
+            image.load()
+            return image
+    with tempfile.TemporaryDirectory() as temp_dir:
+        with blob.file.open("rb") as content, open(f"{temp_dir}/source.pdf", "wb") as source:
+            shutil.copyfileobj(content, source)
+        subprocess.run(
+                ["pdftoppm", "-f", "1", "-l", "1", "-png", "-singlefile",
+                 "-scale-to", str(preview_sizes()[-1]), f"{temp_dir}/source.pdf", f"{temp_dir}/page"],
+                check=True,
+                capture_output=True,
+                timeout=60
+                )
+        image = Image.open(f"{temp_dir}/page.png")
+        image.load()
+        return image
+
+
+def _encode(image, size):
+    preview = image.copy()
+    preview.thumbnail((size, size))
+    if preview.mode in ("RGBA", "LA", "P"):
+        preview = preview.convert("RGBA")
+        background = Image.new("RGB", preview.size, "white")
+        background.paste(preview, mask=preview.getchannel("A"))
+        preview = background
+    buffer = io.BytesIO()
+    preview.convert("RGB").save(buffer, "JPEG", quality=QUALITY, optimize=True)
+    return buffer.getvalue()
+
+
+def render_previews(blob, mime_type, sizes=None):
+    """Render the missing previews of a blob.
+
+    Previews are keyed by content, so a blob shared by many files is only
+    rendered once.
+
+    Returns:
+        dict: The blob's previews by size
+    """
+    sizes = sizes or preview_sizes()
+    previews = {p.size: p for p in Preview.objects.filter(blob=blob, size__in=sizes)}
+    missing = [size for size in sizes if size not in previews]
+    if not missing:
+        return previews
+
+    image = ImageOps.exif_transpose(_open_source(blob, mime_type))
+    for size in missing:
+        preview = Preview(blob=blob, size=size)
+        preview.file.save(f"{size}.jpg", ContentFile(_encode(image, size)), save=False)
+        try:
+            with transaction.atomic():
+                preview.save()
+        except IntegrityError:
+            # Rendered concurrently by another worker, keep theirs
+            existing = Preview.objects.get(blob=blob, size=size)
+            if existing.file.name != preview.file.name:
+                preview.file.delete(save=False)
+            preview = existing
+        previews[size] = preview
+    return previews
@@ -0,0 +1,60 @@
+from datetime import timedelta
+import magic
+from django.db import transaction
+
+from .models import Blob, File, Job
+from .previews import can_preview, render_previews
+from .tasks import task
+from .trash import purge_trash
+
+SNIFF_SIZE = 1024
+
+
+def schedule_processing(file):
+    """Queue the background work for new content of a File."""
+    if not file.mime_type:
+        detect_mime_type.delay(file.pk)
+    elif file.blob_id and can_preview(file.mime_type):
+        generate_previews.delay(file.blob_id, file.mime_type)
+
+
+@task(priority=10)
+def detect_mime_type(file_id):
+    """Detect the MIME type of a file from its first bytes."""
+    with transaction.atomic():
+        file = File.objects.select_for_update().filter(pk=file_id).first()
+        if file is None or file.mime_type:
+            return
+        with file.file.storage.open(file.file.name, "rb") as content:
+            file.mime_type = magic.from_buffer(content.read(SNIFF_SIZE), mime=True)
+        file.save(update_fields=["mime_type", "updated_at"])
+        schedule_processing(file)
+
+
+@task()
+def generate_previews(blob_id, mime_type):
+    """Render the thumbnails of a blob in every preview size."""
+    blob = Blob.objects.filter(pk=blob_id).first()
+    if blob is not None:
+        render_previews(blob, mime_type)
+
+
+def request_previews(file):
+    """Make sure the previews of a file's content are on their way, e.g. when
+    one is asked for before the worker has rendered it.
+
+    Returns:
+        bool: False when rendering them has already failed for good
+    """
+    jobs = Job.objects.filter(task=generate_previews.name, args=[file.blob_id, file.mime_type])
+    if jobs.filter(status=Job.Status.FAILED).exists():
+        return False
+    if not jobs.exists():
+        generate_previews.delay(file.blob_id, file.mime_type)
+    return True
+
+
+@task(priority=-10)
+def purge_user_trash(user_id):
+    """Empty the trash of a user, e.g. when they ask for it."""
+    purge_trash(older_than=timedelta(0), user=user_id)
@@ -0,0 +1,63 @@
+from django.contrib.auth import get_user_model
+from django.core.exceptions import PermissionDenied
+from django.db.models import F, Sum, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+User = get_user_model()
+
+
+class QuotaExceeded(PermissionDenied):
+    """Raised when storing more bytes would take a user over their quota."""
+
+    def __init__(self, message="Storage quota exceeded."):
+        super().__init__(message)
+
+
+def charge(user_id, size):
+    """Add `size` bytes to a user's usage counter, atomically enforcing the quota.
+
+    Negative sizes give space back and always succeed.
+
+    Raises:
+        QuotaExceeded: If the user does not have `size` bytes left.
+    """
+    if not user_id or not size:
+        return
+    users = User.objects.filter(pk=user_id)
+    if size > 0:
+        # The condition and the increment are one UPDATE, so concurrent uploads cannot both squeeze in
+        users = users.filter(used_bytes__lte=F("quota") - size)
+    if not users.update(used_bytes=F("used_bytes") + size) and size > 0:
+        raise QuotaExceeded()
+
+
+def check_quota(user, size):
+    """Reject an upload of `size` bytes up front, before any of it is received.
+
+    Space promised to unfinished resumable uploads counts as used, until
+    they have gone without a chunk for long enough to be expired.
+
+    Raises:
+        QuotaExceeded: If the upload would not fit in the user's quota.
+    """
+    from .models import UploadSession
+    from .uploads import upload_expiry
+
+    used, quota = User.objects.filter(pk=user.pk).values_list("used_bytes", "quota").get()
+    pending = UploadSession.objects.filter(user=user, file=None, updated_at__gt=timezone.now() - upload_expiry())
+    reserved = pending.aggregate(total=Sum("size"))["total"] or 0
+    if used + reserved + size > quota:
+        raise QuotaExceeded()
+
+
+def reconcile_usage():
+    """Recompute every user's usage counter from their files in one UPDATE.
+
+    Returns:
+        int: Number of users updated
+    """
+    from .models import File
+
+    totals = File.all_objects.filter(user=OuterRef("pk")).order_by().values("user").annotate(total=Sum("size")).values("total")
+    return User.objects.update(used_bytes=Coalesce(Subquery(totals), 0))
@@ -0,0 +1,125 @@
+import uuid
+from collections import defaultdict
+from django.db.models import Count, F, OuterRef, Subquery, Sum
+from django.db.models.functions import Substr
+
+from .listings import bump, folder_scope
+from .models import ROLLUP_FIELDS, File, Folder
+
+# Length of the path of a top folder, "/<32 hex digits>/"
+ROOT_PATH_LENGTH = 34
+
+
+def path_ids(path):
+    """Ids of the folders along a materialized path, from the root down."""
+    return [uuid.UUID(segment) for segment in path.strip("/").split("/") if segment] if path else []
+
+
+def contribution(folder):
+    """What a folder adds to the rollups of each of its ancestors: (bytes, files, folders)."""
+    return folder.total_size, folder.file_count, folder.folder_count + 1
+
+
+def roll_up(changes, owners=None):
+    """Add to the rollups of folders and of all their ancestors.
+
+    Folders whose totals change by the same amounts are updated together,
+    so a change under one folder costs a single UPDATE however deep it is.
+    The cached listings showing the changed folders are invalidated,
+    including the root listing of whoever owns the top folder, which may
+    not be the user who made the change.
+
+    Args:
+        changes: (path, bytes, files, folders) tuples, `path` being the one
+            of the folder the items were added to (None for the root); use
+            negative amounts for items taken away
+        owners: Ids of the owners of the top folders of the changed paths,
+            looked up when not given
+    """
+    totals = defaultdict(lambda: [0, 0, 0])
+    for path, size, files, folders in changes:
+        for pk in path_ids(path):
+            total = totals[pk]
+            total[0] += size
+            total[1] += files
+            total[2] += folders
+    by_delta = defaultdict(list)
+    for pk, delta in totals.items():
+        if any(delta):
+            by_delta[tuple(delta)].append(pk)
+    for (size, files, folders), pks in by_delta.items():
+        Folder.all_objects.filter(pk__in=pks).update(
+                total_size=F("total_size") + size,
+                file_count=F("file_count") + files,
+                folder_count=F("folder_count") + folders
+                )
+    if by_delta:
+        # A folder's totals are shown in the listing of its parent, or in
+        # its owner's root for a top folder
+        if owners is None:
+            roots = {ids[0] for ids in (path_ids(path) for path, *_ in changes) if ids}
+            owners = Folder.all_objects.filter(pk__in=roots).values_list("user_id", flat=True).distinct()
+        bump(*(folder_scope(owner, None) for owner in owners), *(folder_scope(None, pk) for pks in by_delta.values() for pk in pks))
+
+
+def parent_path(path):
+    """Path of the parent of the folder at `path`, "/" for a root folder."""
+    return path[:path.rstrip("/").rindex("/") + 1]
+
+
+def roll_up_folders(changes):
+    """Like `roll_up`, with folder ids instead of paths, looked up in one query."""
+    changes = [change for change in changes if change[0] and any(change[1:])]
+    if not changes:
+        return
+    # The owner of the top folder is read along, from the row whose path is the first segment
+    top = Folder.all_objects.filter(path=Substr(OuterRef("path"), 1, ROOT_PATH_LENGTH)).values("user_id")[:1]
+    rows = Folder.all_objects.filter(pk__in={change[0] for change in changes}).values_list("pk", "path", Subquery(top))
+    paths = {pk: path for pk, path, _ in rows}
+    roll_up([(paths.get(pk), *amounts) for pk, *amounts in changes], owners={owner for _, _, owner in rows})
+
+
+def recompute(user=None, batch_size=500):
+    """Rebuild the rollups of every folder, or of one user's folders, from scratch.
+
+    An item counts towards an ancestor when both are live, or when both
+    went to the trash together, i.e. carry the same `deleted_at`. Items
+    count whoever added them, so for one user the whole trees holding
+    their folders are read, guests' items included. Every folder is
+    loaded once and the totals are written with `bulk_update`.
+
+    Returns:
+        int: Number of folders whose rollups were wrong
+    """
+    folders = Folder.all_objects.all()
+    files = File.all_objects.filter(folder__isnull=False)
+    if user is not None:
+        roots = {f"/{path_ids(path)[0].hex}/" for path in folders.filter(user=user).values_list("path", flat=True)}
+        folders = folders.annotate(root=Substr("path", 1, ROOT_PATH_LENGTH)).filter(root__in=roots)
+        files = files.annotate(root=Substr("folder__path", 1, ROOT_PATH_LENGTH)).filter(root__in=roots)
+    tree = {pk: (path, deleted_at) for pk, path, deleted_at in folders.values_list("pk", "path", "deleted_at")}
+    totals = defaultdict(lambda: [0, 0, 0])
+
+    def count(ancestors, deleted_at, size, files, folders):
+        for pk in ancestors:
+            if pk in tree and tree[pk][1] == deleted_at:
+                total = totals[pk]
+                total[0] += size
+                total[1] += files
+                total[2] += folders
+
+    stats = files.values("folder_id", "deleted_at").annotate(size=Sum("size"), files=Count("pk")).order_by()
+    for row in stats:
+        if row["folder_id"] in tree:
+            count(path_ids(tree[row["folder_id"]][0]), row["deleted_at"], row["size"] or 0, row["files"], 0)
+    for path, deleted_at in tree.values():
+        count(path_ids(path)[:-1], deleted_at, 0, 0, 1)
+
+    stale = []
+    for folder in folders.only("pk", *ROLLUP_FIELDS).iterator(chunk_size=batch_size):
+        expected = tuple(totals.get(folder.pk, (0, 0, 0)))
+        if expected != (folder.total_size, folder.file_count, folder.folder_count):
+            folder.total_size, folder.file_count, folder.folder_count = expected
+            stale.append(folder)
+    Folder.all_objects.bulk_update(stale, ROLLUP_FIELDS, batch_size=batch_size)
+    return len(stale)
@@ -0,0 +1,40 @@
+from urllib.parse import parse_qs
+from channels.db import database_sync_to_async
+from channels.middleware import BaseMiddleware
+from django.urls import path
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+from rest_framework.exceptions import AuthenticationFailed
+
+from .consumers import DriveConsumer
+
+
+class JWTAuthMiddleware(BaseMiddleware):
+    """Authenticates WebSocket connections from a `?token=<access token>` query string.
+
+    Browsers cannot set headers on WebSocket requests, so API clients pass
+    their JWT access token in the URL. Sessions are handled by
+    AuthMiddlewareStack, which must wrap this middleware.
+    """
+
+    async def __call__(self, scope, receive, send):
+        user = scope.get("user")
+        token = parse_qs(scope.get("query_string", b"").decode()).get("token")
+        if token and (user is None or not user.is_authenticated):
+            user = await self.get_user(token[0])
+            if user is not None:
+                scope = dict(scope, user=user)
+        return await super().__call__(scope, receive, send)
+
+    @database_sync_to_async
+    def get_user(self, raw_token):
+        authentication = JWTAuthentication()
+        try:
+            return authentication.get_user(authentication.get_validated_token(raw_token))
+        except (InvalidToken, TokenError, AuthenticationFailed):
+            return None
+
+
+websocket_urlpatterns = [
+    path("ws/drive/", DriveConsumer.as_asgi()),
+]
@@ -1,4 +1,3 @@
-from datetime import datetime
 import graphene
 from graphql import GraphQLError
 import graphql_jwt
@@ -9,8 +8,21 @@ from django.contrib.auth import get_user_model
 from django.core.exceptions import ValidationError
 from django.contrib.auth.password_validation import validate_password
 
-from .models import Folder, File, Share, ShareLink
+from .models import Folder, File, Share, ShareLink, Change
 from .forms import RegistrationForm
+from . import loaders
+from .loaders import get_loaders
+from .pagination import (
+    PAGE_SIZE, MAX_PAGE_SIZE, InvalidCursor, encode_cursor, paginate, paginate_contents, paginate_ranked
+)
+from .search import get_search_backend
+from .sharelinks import ShareLinkError, resolve_share_link
+from .changes import changes_since
+from .listings import cached_listing
+from .previews import thumbnail_url
+from .trash import trash, restore, trashed_items
+from .processing import purge_user_trash
+from .operations import BulkError, delete_items, move_item, move_items, copy_item, copy_items, share_items
 
 User = get_user_model()
 
@@ -18,45 +30,98 @@ User = get_user_model()
 class FileType(DjangoObjectType):
     class Meta:
         model = File
-        fields = ("id", "user", "folder", "name", "file", "mime_type", "size", "created_at", "shares", "share_links", "has_shares", "has_share_links")
+        fields = ("id", "user", "folder", "name", "file", "mime_type", "size", "created_at", "updated_at", "deleted_at", "shares", "share_links", "has_shares", "has_share_links")
     
     has_shares = graphene.Boolean();
     has_share_links = graphene.Boolean();
+    permission = graphene.String(description="Permission of the viewer on this file: view, edit or manage")
+    thumbnail_url = graphene.String(
+        size=graphene.Int(required=False, description="Wanted size in pixels, rounded up to a rendered size"),
+        description="URL of a preview image, null when the file cannot be previewed"
+    )
+
+    def resolve_thumbnail_url(self, info, size=None):
+        return thumbnail_url(self, size)
+
+    def resolve_permission(self, info):
+        if self.user_id == info.context.user.pk:
+            return "manage"
+        return get_loaders(info)[loaders.FilePermissionLoader].load_for(self)
 
     def resolve_file(self, info):
         if self.file:
             return self.file.url
         return None
 
+    def resolve_user(self, info):
+        return get_loaders(info)[loaders.FileUserLoader].load_for(self)
+
+    def resolve_folder(self, info):
+        return get_loaders(info)[loaders.FileFolderLoader].load_for(self)
+
+    def resolve_shares(self, info):
+        return get_loaders(info)[loaders.FileSharesLoader].load_for(self)
+
+    def resolve_share_links(self, info):
+        return get_loaders(info)[loaders.FileShareLinksLoader].load_for(self)
+
     def resolve_has_shares(self, info):
         # only for this file owner
-        if self.user != info.context.user:
+        if self.user_id != info.context.user.pk:
             return False
-        return self.shares.exists()
+        return get_loaders(info)[loaders.FileHasSharesLoader].load_for(self)
 
     def resolve_has_share_links(self, info):
         # only for this file owner
-        if self.user != info.context.user:
+        if self.user_id != info.context.user.pk:
             return False
-        return self.share_links.exists()
+        return get_loaders(info)[loaders.FileHasShareLinksLoader].load_for(self)
 
 class FolderType(DjangoObjectType):
     class Meta:
         model = Folder
-        fields = ("id", "name", "user", "parent_folder", "created_at", "shares", "share_links", "has_shares", "has_share_links", "files", "folders")
+        fields = ("id", "name", "user", "parent_folder", "depth", "created_at", "updated_at", "deleted_at", "total_size", "file_count", "folder_count", "shares", "share_links", "has_shares", "has_share_links", "files", "folders", "ancestors")
 
     has_shares = graphene.Boolean();
     has_share_links = graphene.Boolean();
+    ancestors = graphene.List(lambda: FolderType, description="Ancestors of this folder, from the root down")
+    permission = graphene.String(description="Permission of the viewer on this folder: view, edit or manage")
+
+    def resolve_ancestors(self, info):
+        return get_loaders(info)[loaders.FolderAncestorsLoader].load_for(self)
+
+    def resolve_permission(self, info):
+        if self.user_id == info.context.user.pk:
+            return "manage"
+        return get_loaders(info)[loaders.FolderPermissionLoader].load_for(self)
+
+    def resolve_user(self, info):
+        return get_loaders(info)[loaders.FolderUserLoader].load_for(self)
+
+    def resolve_parent_folder(self, info):
+        return get_loaders(info)[loaders.FolderParentLoader].load_for(self)
+
+    def resolve_files(self, info):
+        return get_loaders(info)[loaders.FolderFilesLoader].load_for(self)
+
+    def resolve_folders(self, info):
+        return get_loaders(info)[loaders.FolderChildrenLoader].load_for(self)
+
+    def resolve_shares(self, info):
+        return get_loaders(info)[loaders.FolderSharesLoader].load_for(self)
+
+    def resolve_share_links(self, info):
+        return get_loaders(info)[loaders.FolderShareLinksLoader].load_for(self)
 
     def resolve_has_shares(self, info):
-        if self.user != info.context.user:
+        if self.user_id != info.context.user.pk:
             return False
-        return self.shares.exists()
+        return get_loaders(info)[loaders.FolderHasSharesLoader].load_for(self)
 
     def resolve_has_share_links(self, info):
-        if self.user != info.context.user:
+        if self.user_id != info.context.user.pk:
             return False
-        return self.share_links.exists()
+        return get_loaders(info)[loaders.FolderHasShareLinksLoader].load_for(self)
 
 class ShareType(DjangoObjectType):
     class Meta:
@@ -74,6 +139,9 @@ class ShareLinkType(DjangoObjectType):
             "created_at", "expires_at", "password", "download_count", "is_active"
         )
 
+    def resolve_download_count(self, info):
+        return self.get_download_count()
+
 class ShareLinkUnion(graphene.Union):
     class Meta:
         types = (FileType, FolderType)
@@ -89,13 +157,63 @@ class UserType(DjangoObjectType):
         model = User
         fields = ("id", "email",)
 
+class FileConnection(graphene.relay.Connection):
+    class Meta:
+        node = FileType
+
+class FolderConnection(graphene.relay.Connection):
+    class Meta:
+        node = FolderType
+
+class ChangeType(DjangoObjectType):
+    class Meta:
+        model = Change
+        fields = ("action", "kind", "item_id", "parent_id", "name", "size", "created_at")
+
+class ChangeFeed(graphene.ObjectType):
+    changes = graphene.List(ChangeType)
+    cursor = graphene.String(description="Pass as `since` to get the changes that follow")
+    has_more = graphene.Boolean()
+
+class ContentConnection(graphene.relay.Connection):
+    class Meta:
+        node = ContentUnion
+
+def build_connection(connection_type, info, items, has_next, after=None, cursors=None):
+    """Wrap one page into a Relay connection, priming the loaders with its rows."""
+    get_loaders(info).prime(items)
+    cursors = cursors or [encode_cursor(item) for item in items]
+    edges = [connection_type.Edge(node=item, cursor=cursor) for item, cursor in zip(items, cursors)]
+    return connection_type(
+        edges=edges,
+        page_info=graphene.relay.PageInfo(
+            start_cursor=edges[0].cursor if edges else None,
+            end_cursor=edges[-1].cursor if edges else None,
+            has_next_page=has_next,
+            has_previous_page=bool(after),
+        ),
+    )
+
+def fetch_page(paginator, *args):
+    try:
+        return paginator(*args)
+    except InvalidCursor as e:
+        raise GraphQLError(str(e))
+
+def page_args(**kwargs):
+    return dict(
+        first=graphene.Int(required=False, description=f"Page size (default {PAGE_SIZE}, max {MAX_PAGE_SIZE})"),
+        after=graphene.String(required=False, description="Cursor of the last item of the previous page"),
+        **kwargs
+    )
+
 
 # Query
 class Query(graphene.ObjectType):
     viewer = graphene.Field(UserType)
-    folders = graphene.List(FolderType, parent_folder_id=graphene.UUID(required=False))
+    folders = graphene.Field(FolderConnection, **page_args(parent_folder_id=graphene.UUID(required=False)))
     folder_by_id = graphene.Field(FolderType, id=graphene.UUID())
-    files = graphene.List(FileType, folder_id=graphene.UUID(required=False))
+    files = graphene.Field(FileConnection, **page_args(folder_id=graphene.UUID(required=False)))
     file_by_id = graphene.Field(FileType, id=graphene.UUID())
     shares = graphene.List(ShareType)
     share_links = graphene.List(ShareLinkType)
@@ -104,13 +222,24 @@ class Query(graphene.ObjectType):
         token=graphene.UUID(required=True),
         password=graphene.String(required=False)
     )
-    search = graphene.List(
-        ContentUnion,
-        query=graphene.String(required=True)
+    search = graphene.Field(
+        ContentConnection,
+        **page_args(query=graphene.String(required=True))
     )
-    contents = graphene.List(
-        ContentUnion,
-        folder_id=graphene.UUID(required=False)
+    contents = graphene.Field(
+        ContentConnection,
+        **page_args(folder_id=graphene.UUID(required=False))
+    )
+    trash = graphene.List(ContentUnion, description="Items in the trash, most recently deleted first")
+    largest_folders = graphene.List(
+        FolderType,
+        limit=graphene.Int(default_value=10),
+        description="The user's folders holding the most bytes, at any depth"
+    )
+    changes = graphene.Field(
+        ChangeFeed,
+        since=graphene.String(required=False, description="Cursor of the last sync, omit to read from the beginning"),
+        limit=graphene.Int(required=False)
     )
 
     @login_required
@@ -118,32 +247,40 @@ class Query(graphene.ObjectType):
         return info.context.user
 
     @login_required
-    def resolve_folders(self, info, parent_folder_id=None):
+    def resolve_folders(self, info, parent_folder_id=None, first=None, after=None):
         user = info.context.user
         qs = user.folders.all()
         if parent_folder_id is not None:
             qs = qs.filter(parent_folder_id=parent_folder_id)
         else:
             qs = qs.filter(parent_folder__isnull=True)
-        return qs
+        items, has_next = fetch_page(paginate, qs, first, after)
+        return build_connection(FolderConnection, info, items, has_next, after)
 
     @login_required
     def resolve_folder_by_id(self, info, id):
-        return info.context.user.folders.filter(pk=id).first()
+        folder = Folder.objects.filter(pk=id).first()
+        if folder and folder.has_permission(info.context.user):
+            return folder
+        return None
 
     @login_required
-    def resolve_files(self, info, folder_id=None):
+    def resolve_files(self, info, folder_id=None, first=None, after=None):
         user = info.context.user
         qs = user.files.all()
         if folder_id is not None:
             qs = qs.filter(folder_id=folder_id)
         else:
             qs = qs.filter(folder__isnull=True)
-        return qs
+        items, has_next = fetch_page(paginate, qs, first, after)
+        return build_connection(FileConnection, info, items, has_next, after)
 
     @login_required
     def resolve_file_by_id(self, info, id):
-        return info.context.user.files.filter(pk=id).first()
+        file = File.objects.filter(pk=id).first()
+        if file and file.has_permission(info.context.user):
+            return file
+        return None
 
     @login_required
     def resolve_shares(self, info):
@@ -155,53 +292,55 @@ class Query(graphene.ObjectType):
 
     def resolve_share_link(self, info, token, password=None):
         try:
-            link = ShareLink.objects.select_related("file", "folder").get(id=token, is_active=True)
-        except ShareLink.DoesNotExist:
-            raise GraphQLError("Invalid or inactive share link")
-
-        if link.expires_at and link.expires_at < datetime.now():
-            raise GraphQLError("This share link has expired")
-
-        if link.password and password != link.password:
-            raise GraphQLError("Incorrect or missing password")
+            link = resolve_share_link(token, password)
+        except ShareLinkError as e:
+            raise GraphQLError(str(e))
 
         link.increment_download_count()
         return link.file if link.file else link.folder
 
     @login_required
-    def resolve_search(self, info, query):
+    def resolve_search(self, info, query, first=None, after=None):
         user = info.context.user
-        file_results = File.objects.filter(
-            user=user,
-            name__icontains=query  # Case-insensitive search
-        )
-        folder_results = Folder.objects.filter(
-            user=user,
-            name__icontains=query
+        backend = get_search_backend()
+        items, has_next, cursors = fetch_page(
+            paginate_ranked, lambda limit, offset: backend.search(user, query, limit, offset), first, after
         )
-        return list(file_results) + list(folder_results)
+        return build_connection(ContentConnection, info, items, has_next, after, cursors)
 
     @login_required
-    def resolve_contents(self, info, folder_id=None):
+    def resolve_contents(self, info, folder_id=None, first=None, after=None):
         user = info.context.user
-        items = []
         if folder_id:
-            try:
-                folder = Folder.objects.get(pk=folder_id, user=user)
-                files = File.objects.filter(user=user, folder=folder)
-                folders = Folder.objects.filter(user=user, parent_folder=folder)
-                items.extend(list(files))
-                items.extend(list(folders))
-            except Folder.DoesNotExist:
+            folder = Folder.objects.filter(pk=folder_id).first()
+            if not folder or not folder.has_permission(user):
                 raise GraphQLError("Folder not found or unauthorized")
+            files = File.objects.filter(folder=folder)
+            folders = Folder.objects.filter(parent_folder=folder)
         else:
             # Fetch root level contents (files with no folder and folders with no parent)
             files = File.objects.filter(user=user, folder__isnull=True)
             folders = Folder.objects.filter(user=user, parent_folder__isnull=True)
-            items.extend(list(files))
-            items.extend(list(folders))
 
-        return items
+        items, has_next = cached_listing(
+            user, folder_id, f"contents:{first}:{after}",
+            lambda: fetch_page(paginate_contents, files, folders, first, after)
+        )
+        return build_connection(ContentConnection, info, items, has_next, after)
+
+    @login_required
+    def resolve_largest_folders(self, info, limit):
+        return info.context.user.folders.order_by("-total_size")[:min(limit, 100)]
+
+    @login_required
+    def resolve_trash(self, info):
+        files, folders = trashed_items(info.context.user)
+        return sorted([*folders, *files], key=lambda item: item.deleted_at, reverse=True)
+
+    @login_required
+    def resolve_changes(self, info, since=None, limit=None):
+        changes, cursor, has_more = fetch_page(changes_since, info.context.user, since, limit)
+        return ChangeFeed(changes=changes, cursor=cursor, has_more=has_more)
 
 # Mutations
 class UpdateFileMutation(graphene.Mutation):
@@ -255,7 +394,7 @@ class DeleteFileMutation(graphene.Mutation):
         user = info.context.user
         file = user.files.filter(pk=id).first()
         if file:
-            file.delete()
+            trash(file)
             return DeleteFileMutation(success=True)
         return DeleteFileMutation(success=False)
 
@@ -290,7 +429,7 @@ class DeleteFolderMutation(graphene.Mutation):
         user = info.context.user
         folder = user.folders.filter(pk=id).first()
         if folder:
-            folder.delete()
+            trash(folder)
             return DeleteFolderMutation(success=True)
         return DeleteFolderMutation(success=False)
 
@@ -370,20 +509,22 @@ class CreateShareLink(graphene.Mutation):
 
         if file_id:
             file = File.objects.get(pk=file_id, user=user)
-            link = ShareLink.objects.create(
+            link = ShareLink(
                 created_by=user, file=file,
                 permission=permission,
-                expires_at=expires_at,
-                password=password
+                expires_at=expires_at
             )
+            link.set_password(password)
+            link.save()
         elif folder_id:
             folder = Folder.objects.get(pk=folder_id, user=user)
-            link = ShareLink.objects.create(
+            link = ShareLink(
                 created_by=user, folder=folder,
                 permission=permission,
-                expires_at=expires_at,
-                password=password
+                expires_at=expires_at
             )
+            link.set_password(password)
+            link.save()
         else:
             raise GraphQLError("Must provide file_id or folder_id")
 
@@ -450,10 +591,12 @@ class UpdateShareLinkMutation(graphene.Mutation):
         if 'permission' in kwargs and kwargs['permission'] is not None:
             validate_permission(kwargs['permission'])
 
-        allowed_fields = {'permission', 'expires_at', 'password', 'is_active'}
+        allowed_fields = {'permission', 'expires_at', 'is_active'}
         for key, value in kwargs.items():
             if key in allowed_fields and value is not None:
                 setattr(share_link, key, value)
+        if kwargs.get('password') is not None:
+            share_link.set_password(kwargs['password'])
         share_link.save()
         return UpdateShareLinkMutation(share_link=share_link)
 
@@ -472,6 +615,174 @@ class DeleteShareLinkMutation(graphene.Mutation):
             return DeleteShareLinkMutation(success=True)
         return DeleteShareLinkMutation(success=False)
 
+class RestoreMutation(graphene.Mutation):
+    class Arguments:
+        file_id = graphene.UUID(required=False)
+        folder_id = graphene.UUID(required=False)
+
+    file = graphene.Field(FileType)
+    folder = graphene.Field(FolderType)
+
+    @login_required
+    def mutate(self, info, file_id=None, folder_id=None):
+        user = info.context.user
+        if file_id:
+            item = File.all_objects.trashed().filter(pk=file_id, user=user).first()
+        elif folder_id:
+            item = Folder.all_objects.trashed().filter(pk=folder_id, user=user).first()
+        else:
+            raise GraphQLError("Must provide file_id or folder_id")
+        if not item:
+            raise GraphQLError("Not found in the trash")
+        try:
+            restore(item)
+        except ValidationError as e:
+            raise GraphQLError(e.messages)
+        return RestoreMutation(**{"file" if file_id else "folder": item})
+
+
+class EmptyTrashMutation(graphene.Mutation):
+    success = graphene.Boolean()
+
+    @login_required
+    def mutate(self, info):
+        purge_user_trash.delay(str(info.context.user.pk))
+        return EmptyTrashMutation(success=True)
+
+
+class BulkItemResult(graphene.ObjectType):
+    id = graphene.UUID(description="Id of the file or folder")
+    ok = graphene.Boolean()
+    error = graphene.String(description="Why the item was skipped")
+    created_id = graphene.UUID(description="Id of the copy or share created for the item")
+
+
+def run_bulk(operation, *args, **kwargs):
+    try:
+        return [BulkItemResult(**result) for result in operation(*args, **kwargs)]
+    except BulkError as e:
+        raise GraphQLError(str(e))
+
+
+class MoveFileMutation(graphene.Mutation):
+    class Arguments:
+        id = graphene.UUID(required=True)
+        target_folder_id = graphene.UUID(required=False)
+
+    file = graphene.Field(FileType)
+
+    @login_required
+    def mutate(self, info, id, target_folder_id=None):
+        try:
+            return MoveFileMutation(file=move_item(info.context.user, file_id=id, target_id=target_folder_id))
+        except BulkError as e:
+            raise GraphQLError(str(e))
+
+
+class MoveFolderMutation(graphene.Mutation):
+    class Arguments:
+        id = graphene.UUID(required=True)
+        target_folder_id = graphene.UUID(required=False)
+
+    folder = graphene.Field(FolderType)
+
+    @login_required
+    def mutate(self, info, id, target_folder_id=None):
+        try:
+            return MoveFolderMutation(folder=move_item(info.context.user, folder_id=id, target_id=target_folder_id))
+        except BulkError as e:
+            raise GraphQLError(str(e))
+
+
+class CopyFileMutation(graphene.Mutation):
+    class Arguments:
+        id = graphene.UUID(required=True)
+        target_folder_id = graphene.UUID(required=False)
+
+    file = graphene.Field(FileType)
+
+    @login_required
+    def mutate(self, info, id, target_folder_id=None):
+        try:
+            return CopyFileMutation(file=copy_item(info.context.user, file_id=id, target_id=target_folder_id))
+        except BulkError as e:
+            raise GraphQLError(str(e))
+
+
+class CopyFolderMutation(graphene.Mutation):
+    class Arguments:
+        id = graphene.UUID(required=True)
+        target_folder_id = graphene.UUID(required=False)
+
+    folder = graphene.Field(FolderType)
+
+    @login_required
+    def mutate(self, info, id, target_folder_id=None):
+        try:
+            return CopyFolderMutation(folder=copy_item(info.context.user, folder_id=id, target_id=target_folder_id))
+        except BulkError as e:
+            raise GraphQLError(str(e))
+
+
+class BulkDeleteMutation(graphene.Mutation):
+    class Arguments:
+        file_ids = graphene.List(graphene.NonNull(graphene.UUID), default_value=[])
+        folder_ids = graphene.List(graphene.NonNull(graphene.UUID), default_value=[])
+
+    results = graphene.List(BulkItemResult)
+
+    @login_required
+    def mutate(self, info, file_ids, folder_ids):
+        return BulkDeleteMutation(results=run_bulk(delete_items, info.context.user, file_ids, folder_ids))
+
+
+class BulkMoveMutation(graphene.Mutation):
+    class Arguments:
+        file_ids = graphene.List(graphene.NonNull(graphene.UUID), default_value=[])
+        folder_ids = graphene.List(graphene.NonNull(graphene.UUID), default_value=[])
+        target_folder_id = graphene.UUID(required=False)
+
+    results = graphene.List(BulkItemResult)
+
+    @login_required
+    def mutate(self, info, file_ids, folder_ids, target_folder_id=None):
+        return BulkMoveMutation(results=run_bulk(move_items, info.context.user, file_ids, folder_ids, target_folder_id))
+
+
+class BulkCopyMutation(graphene.Mutation):
+    class Arguments:
+        file_ids = graphene.List(graphene.NonNull(graphene.UUID), default_value=[])
+        folder_ids = graphene.List(graphene.NonNull(graphene.UUID), default_value=[])
+        target_folder_id = graphene.UUID(required=False)
+
+    results = graphene.List(BulkItemResult)
+
+    @login_required
+    def mutate(self, info, file_ids, folder_ids, target_folder_id=None):
+        return BulkCopyMutation(results=run_bulk(copy_items, info.context.user, file_ids, folder_ids, target_folder_id))
+
+
+class BulkShareMutation(graphene.Mutation):
+    class Arguments:
+        file_ids = graphene.List(graphene.NonNull(graphene.UUID), default_value=[])
+        folder_ids = graphene.List(graphene.NonNull(graphene.UUID), default_value=[])
+        shared_with_id = graphene.UUID(required=True)
+        permission = graphene.String(default_value="VIEW")
+        expires_at = graphene.DateTime(required=False)
+
+    results = graphene.List(BulkItemResult)
+
+    @login_required
+    def mutate(self, info, file_ids, folder_ids, shared_with_id, permission, expires_at=None):
+        validate_permission(permission)
+        return BulkShareMutation(results=run_bulk(
+            share_items, info.context.user, file_ids, folder_ids,
+            shared_with=User.objects.filter(pk=shared_with_id).first(),
+            permission=permission.lower(),
+            expires_at=expires_at
+        ))
+
+
 class RegisterMutation(graphene.Mutation):
     class Arguments:
         email = graphene.String(required=True)
@@ -505,6 +816,16 @@ class Mutation(graphene.ObjectType):
     delete_share = DeleteShareMutation.Field()
     update_share_link = UpdateShareLinkMutation.Field()
     delete_share_link = DeleteShareLinkMutation.Field()
+    move_file = MoveFileMutation.Field()
+    move_folder = MoveFolderMutation.Field()
+    copy_file = CopyFileMutation.Field()
+    copy_folder = CopyFolderMutation.Field()
+    restore = RestoreMutation.Field()
+    empty_trash = EmptyTrashMutation.Field()
+    bulk_delete = BulkDeleteMutation.Field()
+    bulk_move = BulkMoveMutation.Field()
+    bulk_copy = BulkCopyMutation.Field()
+    bulk_share = BulkShareMutation.Field()
     register = RegisterMutation.Field() # Add the new mutation
     # JWT auth
     token_auth = graphql_jwt.ObtainJSONWebToken.Field()
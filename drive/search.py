@@ -0,0 +1,225 @@
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q, F, Value, Case, When, FloatField, CharField, Lookup
+from django.utils.module_loading import import_string
+
+from .models import Folder, File
+
+SQLITE_INDEX_TABLE = "drive_search_index"
+
+
+def item_kind(item):
+    return "file" if isinstance(item, File) else "folder"
+
+
+def load_ranked(keys):
+    """Load (kind, id) pairs into File/Folder objects, keeping their order."""
+    loaded = {
+        "file": File.objects.in_bulk([pk for kind, pk in keys if kind == "file"]),
+        "folder": Folder.objects.in_bulk([pk for kind, pk in keys if kind == "folder"]),
+    }
+    return [loaded[kind][pk] for kind, pk in keys if pk in loaded[kind]]
+
+
+class ILike(Lookup):
+    """`lhs ILIKE rhs`, which pg_trgm's gin_trgm_ops indexes can serve.
+
+    Django's `icontains` compiles to `UPPER(lhs) LIKE UPPER(rhs)` instead,
+    which no index on the bare column can answer.
+    """
+
+    lookup_name = "ilike"
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f"{lhs} ILIKE {rhs}", [*lhs_params, *rhs_params]
+
+
+class SearchBackend:
+    """Searches file and folder names with a case-insensitive substring match.
+
+    Works on every database but scans the tables; the database specific
+    backends below replace it whenever an index can be used instead.
+    """
+
+    def index(self, item):
+        """Add or refresh a File or Folder in the search index."""
+
+    def index_many(self, items):
+        """Add many new Files or Folders to the search index, e.g. after a bulk insert."""
+        for item in items:
+            self.index(item)
+
+    def remove(self, item):
+        """Drop a File or Folder from the search index."""
+
+    def remove_many(self, items):
+        """Drop many Files or Folders from the search index."""
+        for item in items:
+            self.remove(item)
+
+    def unindex(self, *querysets):
+        """Drop the Files and Folders of querysets from the search index, e.g. a trashed subtree.
+
+        Only backends keeping an index apart from the tables evaluate them.
+        """
+
+    def reindex(self, *querysets):
+        """Add the Files and Folders of querysets back to the search index, e.g. a restored subtree."""
+
+    def search(self, user, query, limit, offset=0):
+        """Find the items of `user` whose name matches `query`, best match first.
+
+        Returns:
+            list: (kind, id) pairs where kind is 'file' or 'folder'
+        """
+        files = File.objects.filter(user=user, name__icontains=query).order_by().values_list(
+            Value("file", output_field=CharField()), "id", "name")
+        folders = Folder.objects.filter(user=user, name__icontains=query).order_by().values_list(
+            Value("folder", output_field=CharField()), "id", "name")
+        rows = files.union(folders, all=True).order_by("name", "id")[offset:offset + limit]
+        return [(kind, pk) for kind, pk, name in rows]
+
+    @staticmethod
+    def escape_like(value):
+        return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+class SQLiteSearchBackend(SearchBackend):
+    """Searches an FTS5 shadow table using the trigram tokenizer.
+
+    Names are indexed as trigrams, so a query matches any name containing
+    one of its trigrams. Names containing the whole query rank first, names
+    starting with it before those, and the rest by BM25 relevance, which
+    also catches typos that keep most trigrams intact.
+    """
+
+    @staticmethod
+    def rowid(item):
+        # FTS5 rows need an integer id, derive a stable one from the UUID
+        return SQLiteSearchBackend.pk_rowid(item.pk)
+
+    @staticmethod
+    def pk_rowid(pk):
+        return pk.int & (2 ** 63 - 1)
+
+    def index(self, item):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {SQLITE_INDEX_TABLE} WHERE rowid = %s", [self.rowid(item)])
+            cursor.execute(
+                f"INSERT INTO {SQLITE_INDEX_TABLE} (rowid, name, kind, item_id, user_id) VALUES (%s, %s, %s, %s, %s)",
+                [self.rowid(item), item.name, item_kind(item), item.pk.hex, item.user_id.hex if item.user_id else None]
+            )
+
+    def index_many(self, items):
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f"INSERT INTO {SQLITE_INDEX_TABLE} (rowid, name, kind, item_id, user_id) VALUES (%s, %s, %s, %s, %s)",
+                [[self.rowid(item), item.name, item_kind(item), item.pk.hex, item.user_id.hex if item.user_id else None]
+                 for item in items]
+            )
+
+    def remove(self, item):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {SQLITE_INDEX_TABLE} WHERE rowid = %s", [self.rowid(item)])
+
+    def remove_many(self, items):
+        with connection.cursor() as cursor:
+            cursor.executemany(f"DELETE FROM {SQLITE_INDEX_TABLE} WHERE rowid = %s", [[self.rowid(item)] for item in items])
+
+    def unindex(self, *querysets):
+        first, *others = [queryset.order_by().values_list("pk", flat=True) for queryset in querysets]
+        keys = list(first.union(*others, all=True)) if others else list(first)
+        with connection.cursor() as cursor:
+            cursor.executemany(f"DELETE FROM {SQLITE_INDEX_TABLE} WHERE rowid = %s", [[self.pk_rowid(pk)] for pk in keys])
+
+    def reindex(self, *querysets):
+        items = [item for queryset in querysets for item in queryset.only("pk", "name", "user_id")]
+        self.remove_many(items)
+        self.index_many(items)
+
+    @staticmethod
+    def match_expression(query):
+        query = query.lower()
+        trigrams = {query[i:i + 3] for i in range(len(query) - 2)}
+        return "name : (" + " OR ".join('"{}"'.format(t.replace('"', '""')) for t in sorted(trigrams)) + ")"
+
+    def search(self, user, query, limit, offset=0):
+        if len(query) < 3:
+            # Trigrams need at least three characters, fall back to a prefix match
+            sql = (
+                f"SELECT kind, item_id FROM {SQLITE_INDEX_TABLE} "
+                f"WHERE user_id = %s AND name LIKE %s ESCAPE '\\' ORDER BY name LIMIT %s OFFSET %s"
+            )
+            params = [user.pk.hex, self.escape_like(query) + "%", limit, offset]
+        else:
+            pattern = self.escape_like(query)
+            sql = (
+                f"SELECT kind, item_id FROM {SQLITE_INDEX_TABLE} "
+                f"WHERE {SQLITE_INDEX_TABLE} MATCH %s AND user_id = %s "
+                f"ORDER BY name LIKE %s ESCAPE '\\' DESC, name LIKE %s ESCAPE '\\' DESC, "
+                f"bm25({SQLITE_INDEX_TABLE}) LIMIT %s OFFSET %s"
+            )
+            params = [self.match_expression(query), user.pk.hex, f"%{pattern}%", f"{pattern}%", limit, offset]
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return [(kind, File._meta.pk.to_python(item_id)) for kind, item_id in cursor.fetchall()]
+
+
+class PostgresSearchBackend(SearchBackend):
+    """Searches names with pg_trgm, using the GIN trigram indexes on File and Folder.
+
+    Matches names containing the query or sharing most of its trigrams with
+    one of their words, ranked with prefix matches first then by similarity.
+    Both conditions use operators of gin_trgm_ops (ILIKE and %>), so each
+    is a bitmap scan of the index and the OR combines them.
+    """
+
+    def _ranked(self, queryset, kind, query):
+        from django.contrib.postgres.lookups import TrigramWordSimilar
+        from django.contrib.postgres.search import TrigramWordSimilarity
+
+        pattern = self.escape_like(query)
+        return queryset.filter(
+            Q(ILike(F("name"), Value(f"%{pattern}%"))) | TrigramWordSimilar(F("name"), Value(query))
+        ).annotate(
+            rank=TrigramWordSimilarity(query, "name") + Case(
+                When(ILike(F("name"), Value(f"{pattern}%")), then=Value(1.0)), default=Value(0.0), output_field=FloatField()
+            )
+        ).order_by().values_list(Value(kind, output_field=CharField()), "id", "rank")
+
+    def search(self, user, query, limit, offset=0):
+        files = self._ranked(File.objects.filter(user=user), "file", query)
+        folders = self._ranked(Folder.objects.filter(user=user), "folder", query)
+        rows = files.union(folders, all=True).order_by("-rank", "id")[offset:offset + limit]
+        return [(kind, pk) for kind, pk, rank in rows]
+
+
+def sqlite_has_fts5(using=connection):
+    with using.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pragma_module_list WHERE name = 'fts5'")
+        return cursor.fetchone() is not None
+
+
+_backend = None
+
+
+def get_search_backend():
+    """Get the configured search backend.
+
+    Uses the DRIVE_SEARCH_BACKEND setting when present, otherwise picks the
+    best backend for the default database.
+    """
+    global _backend
+    if _backend is None:
+        path = getattr(settings, "DRIVE_SEARCH_BACKEND", None)
+        if path:
+            _backend = import_string(path)()
+        elif connection.vendor == "postgresql":
+            _backend = PostgresSearchBackend()
+        elif connection.vendor == "sqlite" and sqlite_has_fts5():
+            _backend = SQLiteSearchBackend()
+        else:
+            _backend = SearchBackend()
+    return _backend
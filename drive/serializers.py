@@ -1,16 +1,126 @@
+from django.contrib.auth import get_user_model
+from django.db import models
 from rest_framework import serializers
-from .models import Folder, File
+from .models import Folder, File, Share, UploadSession, Change
+from .operations import MAX_BULK_ITEMS
+from .permissions import item_permissions, request_permissions
+from .previews import preview_sizes, thumbnail_url
+
+User = get_user_model()
+
+class ItemListSerializer(serializers.ListSerializer):
+    """Serializes a page of files or folders, resolving the user's permissions on all of them at once."""
+
+    def to_representation(self, data):
+        items = list(data.all() if isinstance(data, models.manager.BaseManager) else data)
+        request = self.context.get("request")
+        if request is not None and request.user.is_authenticated:
+            item_permissions(request.user, items, request_permissions(request))
+        return super().to_representation(items)
+
+def item_permission(serializer, obj):
+    """Permission of the requesting user on `obj`, None without an authenticated request."""
+    request = serializer.context.get("request")
+    if request is None or not request.user.is_authenticated:
+        return None
+    return item_permissions(request.user, [obj], request_permissions(request))[obj.pk]
 
 class FolderSerializer(serializers.ModelSerializer):
     id = serializers.UUIDField(read_only=True)
+    permission = serializers.SerializerMethodField()
 
     class Meta:
         model = Folder
-        fields = ["id", "parent_folder", "name", "created_at"]
+        fields = ["id", "parent_folder", "name", "created_at", "updated_at", "total_size", "file_count", "folder_count", "permission"]
+        read_only_fields = ["total_size", "file_count", "folder_count"]
+        list_serializer_class = ItemListSerializer
+
+    def get_permission(self, obj):
+        return item_permission(self, obj)
+
+    def validate_parent_folder(self, value):
+        if value and not value.has_permission(self.context["request"].user, "edit"):
+            raise serializers.ValidationError("Folder not found or unauthorized.")
+        # The path of a folder starts with the paths of all its ancestors
+        if value and self.instance and value.path.startswith(self.instance.path):
+            raise serializers.ValidationError("A folder cannot be moved inside itself.")
+        return value
+
+    def validate(self, attrs):
+        """Check the name is free in the destination before the constraint fails."""
+        instance = self.instance
+        name = attrs.get("name", instance.name if instance else None)
+        parent = attrs["parent_folder"] if "parent_folder" in attrs else (instance.parent_folder if instance else None)
+        user = instance.user if instance else self.context["request"].user
+        taken = Folder.objects.filter(user=user, parent_folder=parent, name=name)
+        if instance:
+            taken = taken.exclude(pk=instance.pk)
+        if taken.exists():
+            raise serializers.ValidationError({"name": "A folder with this name already exists in this folder."})
+        return attrs
 
 class FileSerializer(serializers.ModelSerializer):
     id = serializers.UUIDField(read_only=True)
+    thumbnail_urls = serializers.SerializerMethodField()
+    permission = serializers.SerializerMethodField()
 
     class Meta:
         model = File
-        fields = ["id", "folder", "name", "file", "size","mime_type", "created_at"]
+        fields = ["id", "folder", "name", "file", "size","mime_type", "created_at", "updated_at", "thumbnail_urls", "permission"]
+        list_serializer_class = ItemListSerializer
+
+    def validate_folder(self, value):
+        if value and not value.has_permission(self.context["request"].user, "edit"):
+            raise serializers.ValidationError("Folder not found or unauthorized.")
+        return value
+
+    def get_thumbnail_urls(self, obj):
+        """Preview URLs by size, or None when the file cannot be previewed."""
+        if thumbnail_url(obj) is None:
+            return None
+        return {str(size): thumbnail_url(obj, size) for size in preview_sizes()}
+
+    def get_permission(self, obj):
+        return item_permission(self, obj)
+
+class UploadSessionSerializer(serializers.ModelSerializer):
+    id = serializers.UUIDField(read_only=True)
+
+    class Meta:
+        model = UploadSession
+        fields = ["id", "folder", "name", "size", "chunk_size", "offset", "mime_type", "file", "created_at"]
+        read_only_fields = ["offset", "mime_type", "file", "created_at"]
+
+    def validate_size(self, value):
+        if value < 0:
+            raise serializers.ValidationError("Size cannot be negative.")
+        return value
+
+    def validate_chunk_size(self, value):
+        if value < 1024 * 1024:
+            raise serializers.ValidationError("Chunks must be at least 1 MB.")
+        if value > UploadSession.MAX_CHUNK_SIZE:
+            raise serializers.ValidationError(f"Chunks must be at most {UploadSession.MAX_CHUNK_SIZE // (1024 * 1024)} MB.")
+        return value
+
+    def validate_folder(self, value):
+        if value and not value.has_permission(self.context["request"].user, "edit"):
+            raise serializers.ValidationError("Folder not found or unauthorized.")
+        return value
+
+
+class ChangeSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Change
+        fields = ["action", "kind", "item_id", "parent_id", "name", "size", "created_at"]
+
+
+class BulkSerializer(serializers.Serializer):
+    """Items a bulk operation applies to, and the options of the operation."""
+
+    files = serializers.ListField(child=serializers.UUIDField(), required=False, default=list, max_length=MAX_BULK_ITEMS)
+    folders = serializers.ListField(child=serializers.UUIDField(), required=False, default=list, max_length=MAX_BULK_ITEMS)
+    target = serializers.UUIDField(required=False, allow_null=True, help_text="Destination folder of a move or copy, none for the root")
+    shared_with = serializers.PrimaryKeyRelatedField(queryset=User.objects.all(), required=False, help_text="User to share with")
+    permission = serializers.ChoiceField(choices=Share.PermissionChoices.choices, default=Share.PermissionChoices.VIEW)
+    expires_at = serializers.DateTimeField(required=False, allow_null=True)
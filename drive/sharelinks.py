@@ -0,0 +1,144 @@
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from rest_framework.throttling import SimpleRateThrottle
+
+from .caching import TieredCache
+from .models import ShareLink
+
+
+class ShareLinkError(Exception):
+    """Raised when a share link cannot be used.
+
+    Attributes:
+        status: HTTP status code matching the failure
+        retry_after: Seconds until the link may be requested again, if throttled
+    """
+
+    def __init__(self, message, status=403, retry_after=None):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+
+# Resolved links, with their file or folder, keyed by token
+share_link_cache = TieredCache(
+        "drive:sharelink",
+        ttl=getattr(settings, "DRIVE_SHARE_LINK_CACHE_TTL", 300),
+        local_ttl=getattr(settings, "DRIVE_SHARE_LINK_LOCAL_TTL", 5)
+        )
+
+
+def live_links():
+    """Share links with their target selected, unless the target is in the trash."""
+    return ShareLink.objects.select_related("file", "folder").filter(
+            file__deleted_at__isnull=True, folder__deleted_at__isnull=True)
+
+
+def get_share_link(token):
+    """Get an active share link with its target, from the cache when possible.
+
+    Raises:
+        ShareLinkError: If there is no active link for `token`.
+    """
+    link = share_link_cache.get(str(token))
+    if link is None:
+        try:
+            link = live_links().get(id=token, is_active=True)
+        except (ShareLink.DoesNotExist, ValueError):
+            raise ShareLinkError("Invalid or inactive share link", status=404)
+        share_link_cache.set(str(token), link)
+    return link
+
+
+async def aget_share_link(token):
+    """Async version of `get_share_link`."""
+    link = await share_link_cache.aget(str(token))
+    if link is None:
+        try:
+            link = await live_links().aget(id=token, is_active=True)
+        except (ShareLink.DoesNotExist, ValueError):
+            raise ShareLinkError("Invalid or inactive share link", status=404)
+        await share_link_cache.aset(str(token), link)
+    return link
+
+
+def invalidate_share_link(token):
+    """Drop a share link from the cache, now and again once the transaction commits."""
+    share_link_cache.delete(str(token))
+    transaction.on_commit(lambda: share_link_cache.delete(str(token)))
+
+
+class ShareLinkRateThrottle(SimpleRateThrottle):
+    """Limits the requests one client makes to one share link.
+
+    Share links are public, so this is what stands between a visitor and
+    guessing a link's password. Requests are counted per client IP and
+    token in the default cache, at the "share_link" rate of
+    DEFAULT_THROTTLE_RATES.
+
+    Args:
+        token: The id of the share link being requested
+    """
+
+    scope = "share_link"
+
+    def __init__(self, token):
+        self.token = token
+        super().__init__()
+
+    def get_cache_key(self, request, view):
+        return self.cache_format % {"scope": self.scope, "ident": f"{self.get_ident(request)}:{self.token}"}
+
+
+async def athrottle_share_link(request, token):
+    """Count a request to a share link.
+
+    Raises:
+        ShareLinkError: With status 429 once the client made too many requests.
+    """
+    throttle = ShareLinkRateThrottle(token)
+    if not await sync_to_async(throttle.allow_request)(request, None):
+        wait = throttle.wait()
+        raise ShareLinkError(
+            "Too many requests for this share link, try again later",
+            status=429,
+            retry_after=int(wait) + 1 if wait is not None else None,
+        )
+
+
+def check_expiry(link):
+    if link.expires_at and link.expires_at < timezone.now():
+        raise ShareLinkError("This share link has expired")
+
+
+def resolve_share_link(token, password=None):
+    """Get the active share link for `token`, checking expiry and password.
+
+    Args:
+        token: The id of the share link
+        password: Password supplied by the visitor, if any
+
+    Returns:
+        ShareLink: The link, with its file and folder selected
+
+    Raises:
+        ShareLinkError: If the link does not exist, is inactive or expired,
+            or the password is missing or wrong.
+    """
+    link = get_share_link(token)
+    check_expiry(link)
+    if link.password and not link.check_password(password or ""):
+        raise ShareLinkError("Incorrect or missing password")
+    return link
+
+
+async def aresolve_share_link(token, password=None):
+    """Async version of `resolve_share_link`."""
+    link = await aget_share_link(token)
+    check_expiry(link)
+    # Password hashing is deliberately slow, keep it off the event loop
+    if link.password and not await sync_to_async(link.check_password, thread_sensitive=False)(password or ""):
+        raise ShareLinkError("Incorrect or missing password")
+    return link
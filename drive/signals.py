@@ -0,0 +1,181 @@
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete
+from django.dispatch import receiver
+
+from .models import Folder, File, Share, ShareLink
+from .rollups import ROLLUP_FIELDS, parent_path, roll_up, roll_up_folders
+from .search import get_search_backend
+from .blobs import release, release_content
+from .quota import charge
+from .sharelinks import invalidate_share_link
+from .events import publish, CREATED, UPDATED, DELETED
+from .changes import record
+from .listings import bump, folder_scope
+from .trash import purging
+
+
+@receiver(post_save, sender=File)
+@receiver(post_save, sender=Folder)
+def index_item(sender, instance, **kwargs):
+    """Keep the search index in sync with file and folder names."""
+    get_search_backend().index(instance)
+
+
+@receiver(post_delete, sender=File)
+@receiver(post_delete, sender=Folder)
+def unindex_item(sender, instance, **kwargs):
+    if purging.get():
+        return
+    get_search_backend().remove(instance)
+
+
+@receiver(post_delete, sender=File)
+def release_blob(sender, instance, **kwargs):
+    """Drop the file's reference on its blob, deleting the bytes once unused."""
+    if purging.get():
+        return
+    if instance.blob_id:
+        release(instance.blob_id)
+    elif instance.file:
+        release_content(instance.file.storage, instance.file.name)
+
+
+@receiver(post_delete, sender=File)
+def release_storage(sender, instance, **kwargs):
+    """Give the file's bytes back to its owner's quota."""
+    if instance.size and not purging.get():
+        charge(instance.user_id, -instance.size)
+
+
+@receiver(post_save, sender=ShareLink)
+@receiver(post_delete, sender=ShareLink)
+def uncache_share_link(sender, instance, **kwargs):
+    invalidate_share_link(instance.pk)
+
+
+@receiver(post_save, sender=File)
+@receiver(post_save, sender=Folder)
+def uncache_target_share_links(sender, instance, created, **kwargs):
+    """Cached share links embed their target, drop them when it changes."""
+    if created:
+        return
+    field = "file" if sender is File else "folder"
+    for token in ShareLink.objects.filter(**{field: instance}).values_list("id", flat=True):
+        invalidate_share_link(token)
+
+
+@receiver(post_save, sender=File)
+@receiver(post_save, sender=Folder)
+@receiver(post_save, sender=Share)
+def publish_save(sender, instance, created, **kwargs):
+    """Push changes to WebSocket subscribers."""
+    publish(CREATED if created else UPDATED, instance)
+
+
+@receiver(post_delete, sender=File)
+@receiver(post_delete, sender=Folder)
+@receiver(post_delete, sender=Share)
+def publish_delete(sender, instance, **kwargs):
+    if not _purged(instance):
+        publish(DELETED, instance)
+
+
+@receiver(post_save, sender=File)
+@receiver(post_save, sender=Folder)
+@receiver(post_save, sender=Share)
+def journal_save(sender, instance, created, **kwargs):
+    """Append to the change journal, inside the transaction of the save."""
+    record(CREATED if created else UPDATED, instance)
+
+
+@receiver(post_delete, sender=File)
+@receiver(post_delete, sender=Folder)
+@receiver(post_delete, sender=Share)
+def journal_delete(sender, instance, **kwargs):
+    if not _purged(instance):
+        record(DELETED, instance)
+
+
+def _purged(instance):
+    # Trashing already announced the delete of purged files and folders
+    return purging.get() and isinstance(instance, (File, Folder))
+
+
+def _parent_id(instance):
+    return instance.folder_id if isinstance(instance, File) else instance.parent_folder_id
+
+
+@receiver(pre_save, sender=File)
+@receiver(pre_save, sender=Folder)
+def remember_parent(sender, instance, **kwargs):
+    """Note where an item was, so a move invalidates the listing it left and
+    moves its weight out of the rollups of the folders above it."""
+    instance._old_state = None
+    if not instance._state.adding:
+        parent_field = "folder_id" if sender is File else "parent_folder_id"
+        fields = ("size",) if sender is File else ("path", *ROLLUP_FIELDS)
+        instance._old_state = sender.all_objects.filter(pk=instance.pk).values(parent_field, "deleted_at", *fields).first()
+        instance._old_parent_id = instance._old_state[parent_field] if instance._old_state else None
+
+
+@receiver(post_save, sender=File)
+@receiver(post_save, sender=Folder)
+@receiver(post_delete, sender=File)
+@receiver(post_delete, sender=Folder)
+def invalidate_listings(sender, instance, **kwargs):
+    """Bump the listings of the folder holding the item, and of the one it moved out of."""
+    if purging.get():
+        # Trashed items are not listed
+        return
+    scopes = {folder_scope(instance.user_id, _parent_id(instance))}
+    if hasattr(instance, "_old_parent_id") and instance._old_parent_id != _parent_id(instance):
+        scopes.add(folder_scope(instance.user_id, instance._old_parent_id))
+    if instance.user_id:
+        bump(*scopes)
+
+
+@receiver(post_save, sender=File)
+def update_file_rollups(sender, instance, **kwargs):
+    """Keep the rollups of the folders above a file in sync with its size and place."""
+    old = getattr(instance, "_old_state", None)
+    changes = []
+    if old and old["deleted_at"] is None:
+        changes.append((old["folder_id"], -old["size"], -1, 0))
+    if instance.deleted_at is None:
+        changes.append((instance.folder_id, instance.size, 1, 0))
+    if len(changes) == 2 and changes[0][0] == changes[1][0]:
+        changes = [(instance.folder_id, instance.size - old["size"], 0, 0)]
+    roll_up_folders(changes)
+
+
+@receiver(post_save, sender=Folder)
+def update_folder_rollups(sender, instance, created, **kwargs):
+    """Move a folder's subtree totals between ancestors when it moves or is restored."""
+    old = getattr(instance, "_old_state", None)
+    if old and old["path"] == instance.path and old["deleted_at"] == instance.deleted_at:
+        return
+    totals = (old["total_size"], old["file_count"], old["folder_count"] + 1) if old else (0, 0, 1)
+    changes = []
+    if old and old["deleted_at"] is None:
+        changes.append((parent_path(old["path"]), *(-n for n in totals)))
+    if instance.deleted_at is None:
+        changes.append((parent_path(instance.path), *totals))
+    roll_up(changes)
+
+
+@receiver(pre_delete, sender=File)
+def release_file_rollups(sender, instance, **kwargs):
+    """Take a deleted file out of the rollups; trashed files already were."""
+    if instance.deleted_at is None:
+        roll_up_folders([(instance.folder_id, -instance.size, -1, 0)])
+
+
+@receiver(pre_delete, sender=Folder)
+def release_folder_rollups(sender, instance, **kwargs):
+    """Take a deleted folder out of the rollups.
+
+    Its files and subfolders are deleted along with it and take themselves
+    out, so only the folder itself is counted here. This runs before any
+    row of the cascade is gone, so every path can still be looked up.
+    """
+    if instance.deleted_at is None:
+        roll_up([(parent_path(instance.path), 0, 0, -1)])
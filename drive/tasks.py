@@ -0,0 +1,179 @@
+import logging
+import os
+import socket
+import time
+import traceback
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+registry = {}
+
+
+class Task:
+    """A function that can be queued to run in a background worker.
+
+    Args:
+        func: The function to run; its arguments must be JSON serializable
+        name: Name the task is registered and queued under
+        priority: Jobs with a higher priority are claimed first
+        max_attempts: Number of starts after which a failing job is given up
+        retry_delay: Seconds before the first retry, doubled on each attempt
+    """
+
+    def __init__(self, func, name, priority=0, max_attempts=3, retry_delay=30):
+        self.func = func
+        self.name = name
+        self.priority = priority
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+
+    def __call__(self, *args, **kwargs):
+        return self.func(*args, **kwargs)
+
+    def delay(self, *args, **kwargs):
+        """Queue the task.
+
+        The job is inserted in the current transaction, so it is queued if
+        and only if the transaction commits, and workers only see it then.
+        With DRIVE_TASKS_EAGER the job is also run right after the commit,
+        in the current process; a failure is logged and the job retried
+        like any other instead of being raised into the caller.
+
+        Returns:
+            Job: The queued job
+        """
+        job = Job.objects.create(
+                task=self.name,
+                args=list(args),
+                kwargs=kwargs,
+                priority=self.priority,
+                max_attempts=self.max_attempts
+                )
+        if getattr(settings, "DRIVE_TASKS_EAGER", False):
+            transaction.on_commit(lambda: _run_now(job.pk))
+        return job
+
+
+def task(name=None, **options):
+    """Register a function as a background task.
+
+    Usage:
+        @task(priority=10)
+        def detect_mime_type(file_id): ...
+
+        detect_mime_type.delay(file.pk)
+    """
+    def register(func):
+        registered = Task(func, name or f"{func.__module__}.{func.__qualname__}", **options)
+        registry[registered.name] = registered
+        return registered
+    return register
+
+
+def _claimable(now):
+    """Jobs that are due, or whose worker stopped without finishing them."""
+    timeout = getattr(settings, "DRIVE_TASKS_TIMEOUT", 600)
+    return (
+        Q(status=Job.Status.QUEUED, run_at__lte=now)
+        | Q(status=Job.Status.RUNNING, locked_at__lt=now - timedelta(seconds=timeout))
+    )
+
+
+def claim(worker, candidates=10):
+    """Take the next job off the queue for `worker`.
+
+    The candidates are read without locks and taken with a compare-and-set
+    UPDATE, so workers racing for the same job never both get it.
+
+    Returns:
+        Job: The claimed job, or None when nothing is due
+    """
+    now = timezone.now()
+    ready = Job.objects.filter(_claimable(now)).order_by('-priority', 'run_at', 'id')
+    for job_id in ready.values_list('pk', flat=True)[:candidates]:
+        job = _take(job_id, worker, now)
+        if job is not None:
+            return job
+    return None
+
+
+def _take(job_id, worker, now):
+    taken = Job.objects.filter(_claimable(now), pk=job_id).update(
+            status=Job.Status.RUNNING,
+            locked_at=now,
+            locked_by=worker,
+            attempts=F('attempts') + 1
+            )
+    return Job.objects.get(pk=job_id) if taken else None
+
+
+def _run_now(job_id):
+    """Run a job just queued by an eager task, unless a worker got it first."""
+    job = _take(job_id, "eager", timezone.now())
+    if job is not None:
+        run_job(job)
+
+
+def run_job(job):
+    """Run a claimed job and record its outcome.
+
+    Finished jobs are deleted. A failing job goes back to the queue with
+    an exponential backoff until it has used `max_attempts` starts, then it
+    is kept as failed.
+    """
+    registered = registry.get(job.task)
+    try:
+        if registered is None:
+            raise LookupError(f"Unknown task {job.task!r}")
+        registered.func(*job.args, **job.kwargs)
+    except Exception:
+        logger.exception("Job %s failed", job)
+        job.last_error = traceback.format_exc()
+        if registered is not None and job.attempts < job.max_attempts:
+            job.status = Job.Status.QUEUED
+            job.run_at = timezone.now() + timedelta(seconds=registered.retry_delay * 2 ** (job.attempts - 1))
+        else:
+            job.status = Job.Status.FAILED
+        job.save(update_fields=['status', 'run_at', 'last_error'])
+    else:
+        job.delete()
+
+
+def run_pending(worker="inline"):
+    """Run every due job in the current process, e.g. from tests or cron.
+
+    Returns:
+        int: The number of jobs run
+    """
+    count = 0
+    while (job := claim(worker)) is not None:
+        run_job(job)
+        count += 1
+    return count
+
+
+def work(burst=False, poll_interval=1.0, should_stop=lambda: False):
+    """Worker loop: claim and run jobs until stopped.
+
+    Args:
+        burst: Return as soon as the queue has no due job
+        poll_interval: Seconds to wait when the queue is empty
+        should_stop: Checked between jobs, to stop gracefully
+    """
+    worker = f"{socket.gethostname()}:{os.getpid()}"
+    while not should_stop():
+        job = claim(worker)
+        if job is None:
+            if burst:
+                return
+            time.sleep(poll_interval)
+            continue
+        run_job(job)
+
@@ -0,0 +1,242 @@
+from collections import Counter
+from contextvars import ContextVar
+from datetime import timedelta
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .blobs import release_content, release_many
+from .changes import append, journal_entries, record
+from .events import publish, CREATED, DELETED
+from .listings import bump, folder_scope
+from .models import File, Folder, ShareLink
+from .quota import charge
+from .rollups import ROLLUP_FIELDS, contribution, parent_path, roll_up, roll_up_folders
+from .search import get_search_backend
+from .sharelinks import invalidate_share_link
+
+PURGE_BATCH_SIZE = 500
+# Folders whose subtrees are trashed by one UPDATE in `trash_many`
+TRASH_BATCH_SIZE = 100
+
+# Set while `purge_trash` deletes rows, to mute the per-item delete signals
+purging = ContextVar("purging", default=False)
+
+
+def retention():
+    """How long trashed items are kept before they are purged."""
+    return timedelta(days=getattr(settings, "DRIVE_TRASH_RETENTION_DAYS", 30))
+
+
+def _parent_id(item):
+    return item.folder_id if isinstance(item, File) else item.parent_folder_id
+
+
+def _share_links(item):
+    if isinstance(item, File):
+        return ShareLink.objects.filter(file=item)
+    return ShareLink.objects.filter(Q(folder__path__startswith=item.path) | Q(file__folder__path__startswith=item.path))
+
+
+def trash(item):
+    """Move a File or Folder, with everything inside it, to the trash.
+
+    The whole subtree is marked with the same `deleted_at` in one UPDATE
+    per model, so it disappears from every listing at once whatever its
+    size, and can be restored as a unit. Rows and bytes are only removed
+    later by `purge_trash`. The journal records a single delete for the
+    item, which stands for its subtree.
+    """
+    if item.deleted_at:
+        return item
+    now = timezone.now()
+    with transaction.atomic():
+        if isinstance(item, File):
+            roll_up_folders([(item.folder_id, -item.size, -1, 0)])
+            get_search_backend().remove(item)
+            File.objects.filter(pk=item.pk).update(deleted_at=now)
+        else:
+            # The subtree keeps its own rollups, to be given back on restore
+            item.refresh_from_db(fields=("path", "parent_folder", *ROLLUP_FIELDS))
+            roll_up([(parent_path(item.path), *(-n for n in contribution(item)))])
+            get_search_backend().unindex(
+                    Folder.objects.filter(path__startswith=item.path),
+                    File.objects.filter(folder__path__startswith=item.path))
+            Folder.objects.filter(path__startswith=item.path).update(deleted_at=now)
+            File.objects.filter(folder__path__startswith=item.path).update(deleted_at=now)
+        for token in _share_links(item).values_list("id", flat=True):
+            invalidate_share_link(token)
+        item.deleted_at = now
+        record(DELETED, item)
+        publish(DELETED, item)
+        bump(folder_scope(item.user_id, _parent_id(item)))
+    return item
+
+
+def trash_many(file_ids=(), folder_ids=()):
+    """Move many files and folders to the trash at once, like `trash`.
+
+    Selected items inside a selected folder go with it. The files are
+    marked with one UPDATE, the subtrees of the folders with one UPDATE
+    per model for every TRASH_BATCH_SIZE folders, and the rollups,
+    journal and listings are updated in bulk, so the number of queries
+    does not grow with the number of items.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        folders = []
+        for folder in Folder.objects.filter(pk__in=folder_ids).order_by("path"):
+            if not folders or not folder.path.startswith(folders[-1].path):
+                folders.append(folder)
+        paths = tuple(folder.path for folder in folders)
+        files = [file for file in File.objects.select_related("folder").filter(pk__in=file_ids)
+                 if not (file.folder and file.folder.path.startswith(paths))]
+
+        roll_up([
+            *((file.folder.path if file.folder else None, -file.size, -1, 0) for file in files),
+            # The subtrees keep their own rollups, to be given back on restore
+            *((parent_path(folder.path), *(-n for n in contribution(folder))) for folder in folders),
+        ])
+        backend = get_search_backend()
+        backend.remove_many(files)
+        File.objects.filter(pk__in=[file.pk for file in files]).update(deleted_at=now)
+        links = Q(file__in=[file.pk for file in files])
+        for i in range(0, len(paths), TRASH_BATCH_SIZE):
+            batch = paths[i:i + TRASH_BATCH_SIZE]
+            backend.unindex(Folder.objects.filter(_subtrees(batch)), File.objects.filter(_subtrees(batch, "folder__")))
+            Folder.objects.filter(_subtrees(batch)).update(deleted_at=now)
+            File.objects.filter(_subtrees(batch, "folder__")).update(deleted_at=now)
+            links |= _subtrees(batch, "folder__") | _subtrees(batch, "file__folder__")
+        for token in ShareLink.objects.filter(links).values_list("id", flat=True):
+            invalidate_share_link(token)
+
+        items = [*files, *folders]
+        for item in items:
+            item.deleted_at = now
+        append([entry for item in items for entry in journal_entries(DELETED, item)])
+        for item in items:
+            publish(DELETED, item)
+        if items:
+            bump(*{folder_scope(item.user_id, _parent_id(item)) for item in items})
+
+
+def _subtrees(paths, prefix=""):
+    """Condition on the folders at or below any of `paths`, through `prefix` for related models."""
+    condition = Q()
+    for path in paths:
+        condition |= Q(**{f"{prefix}path__startswith": path})
+    return condition
+
+
+def restore(item):
+    """Take a File or Folder out of the trash, with what was trashed along with it.
+
+    Items whose folder is still in the trash are restored to the root.
+
+    Raises:
+        ValidationError: If a folder with the same name took its place meanwhile.
+    """
+    stamp = item.deleted_at
+    if not stamp:
+        return item
+    with transaction.atomic():
+        model = File if isinstance(item, File) else Folder
+        parent_field = "folder" if model is File else "parent_folder"
+        if _parent_id(item) and not Folder.objects.filter(pk=_parent_id(item)).exists():
+            setattr(item, parent_field, None)
+        if model is Folder and Folder.objects.filter(user=item.user_id, parent_folder=item.parent_folder_id, name=item.name).exists():
+            raise ValidationError({"name": "A folder with this name already exists in this folder."})
+        item.deleted_at = None
+        # Saving rewrites the paths below a folder restored to the root
+        item.save()
+        if model is Folder:
+            Folder.all_objects.filter(path__startswith=item.path, deleted_at=stamp).update(deleted_at=None)
+            File.all_objects.filter(folder__path__startswith=item.path, deleted_at=stamp).update(deleted_at=None)
+            get_search_backend().reindex(
+                    Folder.objects.filter(path__startswith=item.path),
+                    File.objects.filter(folder__path__startswith=item.path))
+        record(CREATED, item)
+        publish(CREATED, item)
+        bump(folder_scope(item.user_id, _parent_id(item)))
+    return item
+
+
+def trashed_items(user):
+    """The items a user moved to the trash, without what was trashed inside them.
+
+    Returns:
+        tuple: (files, folders) querysets, most recently trashed first
+    """
+    # An item trashed with its folder carries the same timestamp as the folder
+    files = File.all_objects.trashed().filter(user=user).exclude(
+            folder__deleted_at=F("deleted_at")).order_by("-deleted_at")
+    folders = Folder.all_objects.trashed().filter(user=user).exclude(
+            parent_folder__deleted_at=F("deleted_at")).order_by("-deleted_at")
+    return files, folders
+
+
+def purge_trash(older_than=None, user=None, batch_size=PURGE_BATCH_SIZE):
+    """Delete trashed items for good, in batches.
+
+    Files go first, so each folder batch only cascades to shares and
+    links; folders go deepest first. Every batch is its own transaction.
+    Trashing already journaled and published the delete of every item,
+    so the item signals are muted: blobs are released per digest and
+    quotas given back per user instead of once per row.
+
+    Args:
+        older_than: Only purge items trashed longer ago than this, defaults to the retention period
+        user: Only purge the trash of this user
+        batch_size: Number of rows deleted per transaction
+
+    Returns:
+        int: Number of files and folders deleted
+    """
+    cutoff = timezone.now() - (retention() if older_than is None else older_than)
+    purged = 0
+    for manager in (File.all_objects, Folder.all_objects):
+        rows = manager.trashed().filter(deleted_at__lte=cutoff)
+        if user is not None:
+            rows = rows.filter(user=user)
+        if manager.model is Folder:
+            rows = rows.order_by("-depth")
+        while batch := list(rows.values_list("pk", flat=True)[:batch_size]):
+            with transaction.atomic():
+                if manager.model is File:
+                    purged += _purge_files(batch)
+                else:
+                    # Files are normally purged already, unless trashed on their own later
+                    purged += _purge_files(File.all_objects.filter(folder__in=batch).values_list("pk", flat=True))
+                    _purge(Folder, Folder.all_objects.filter(pk__in=batch).only("pk", "user_id"))
+                    purged += len(batch)
+    return purged
+
+
+def _purge_files(pks):
+    files = list(File.all_objects.filter(pk__in=pks).only("pk", "user_id", "size", "blob_id", "file"))
+    if not files:
+        return 0
+    _purge(File, files)
+    release_many(Counter(file.blob_id for file in files if file.blob_id))
+    for file in files:
+        if not file.blob_id and file.file:
+            release_content(file.file.storage, file.file.name)
+    used = Counter()
+    for file in files:
+        used[file.user_id] += file.size
+    for user_id, size in used.items():
+        if size:
+            charge(user_id, -size)
+    return len(files)
+
+
+def _purge(model, items):
+    items = list(items)
+    token = purging.set(True)
+    try:
+        model.all_objects.filter(pk__in=[item.pk for item in items]).delete()
+    finally:
+        purging.reset(token)
+    get_search_backend().remove_many(items)
@@ -0,0 +1,66 @@
+import hashlib
+from django.core.files.uploadhandler import FileUploadHandler, MemoryFileUploadHandler, TemporaryFileUploadHandler
+from graphql_jwt.exceptions import JSONWebTokenError
+from graphql_jwt.shortcuts import get_user_by_token
+from graphql_jwt.utils import get_credentials
+
+from .quota import check_quota
+
+
+class QuotaUploadHandler(FileUploadHandler):
+    """Rejects an upload from its Content-Length before any byte is read.
+
+    It must come first in FILE_UPLOAD_HANDLERS. The length of the whole
+    request body is an upper bound of the size of the files it carries.
+    """
+
+    def handle_raw_input(self, input_data, META, content_length, boundary, encoding=None):
+        user = getattr(self.request, "user", None)
+        if user is None or not user.is_authenticated:
+            # GraphQL requests are only authenticated by the JWT middleware once executing
+            token = get_credentials(self.request)
+            try:
+                user = get_user_by_token(token, self.request) if token else None
+            except JSONWebTokenError:
+                user = None
+        if user is not None and user.is_authenticated and content_length:
+            check_quota(user, content_length)
+
+    def receive_data_chunk(self, raw_data, start):
+        return raw_data
+
+    def file_complete(self, file_size):
+        return None
+
+
+class HashingUploadHandlerMixin:
+    """Computes the SHA-256 digest of an upload while it is being received.
+
+    The digest is attached to the uploaded file as `sha256`, so storing it
+    in the blob store does not need a second pass over the bytes.
+    """
+
+    def new_file(self, *args, **kwargs):
+        self.sha256 = hashlib.sha256()
+        super().new_file(*args, **kwargs)
+
+    def receive_data_chunk(self, raw_data, start):
+        remaining = super().receive_data_chunk(raw_data, start)
+        # Only hash chunks this handler kept, not ones passed on to the next handler
+        if remaining is None:
+            self.sha256.update(raw_data)
+        return remaining
+
+    def file_complete(self, file_size):
+        file = super().file_complete(file_size)
+        if file is not None:
+            file.sha256 = self.sha256.hexdigest()
+        return file
+
+
+class HashingMemoryFileUploadHandler(HashingUploadHandlerMixin, MemoryFileUploadHandler):
+    pass
+
+
+class HashingTemporaryFileUploadHandler(HashingUploadHandlerMixin, TemporaryFileUploadHandler):
+    pass
@@ -0,0 +1,222 @@
+import fcntl
+import hashlib
+import os
+import tempfile
+import magic
+from datetime import timedelta
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.utils import timezone
+
+from .models import File, UploadSession, UploadChunk
+from .blobs import release, store_path
+from .quota import check_quota
+from .processing import schedule_processing
+
+BLOCK_SIZE = 64 * 1024
+
+
+class UploadError(Exception):
+    """Raised when a chunk or commit does not fit the state of the upload."""
+
+    def __init__(self, message, offset=None):
+        super().__init__(message)
+        self.offset = offset
+
+
+def upload_expiry():
+    """How long an upload may go without receiving a chunk before it is aborted."""
+    return timedelta(hours=getattr(settings, "DRIVE_UPLOAD_EXPIRY_HOURS", 24))
+
+
+def staging_path(session):
+    """Local path of the staging file of an upload.
+
+    Chunks are written in place when the default storage is on the local
+    filesystem, so committing is a rename into the blob store. Remote
+    storages stage in the upload temp dir and receive the file on commit.
+    """
+    try:
+        return default_storage.path(session.staging_name)
+    except NotImplementedError:
+        temp_dir = settings.FILE_UPLOAD_TEMP_DIR or tempfile.gettempdir()
+        return os.path.join(temp_dir, os.path.basename(session.staging_name))
+
+
+def start_upload(user, name, size, folder=None, chunk_size=None):
+    """Start a resumable upload and return its session.
+
+    Raises:
+        QuotaExceeded: If the upload would not fit in the user's quota.
+    """
+    check_quota(user, size)
+    return UploadSession.objects.create(
+            user=user,
+            folder=folder,
+            name=name,
+            size=size,
+            chunk_size=chunk_size or UploadSession.DEFAULT_CHUNK_SIZE
+            )
+
+
+def write_chunk(session, offset, stream, length, sha256=None):
+    """Stream one chunk from `stream` into the staging file of an upload.
+
+    Chunks must arrive in order: `offset` has to be the number of bytes
+    acknowledged so far. The chunk is hashed while it is copied and only
+    acknowledged once it is flushed to disk and its checksum matches.
+
+    The body is received without holding a transaction or a row lock, a
+    slow client only keeps a lock on its staging file, which turns away
+    a concurrent retry of the same upload. The session row is locked
+    afterwards, just to check the offset again and move it forward.
+
+    Args:
+        session: The UploadSession being written
+        offset: Byte offset of the chunk in the file
+        stream: File-like object to read the chunk from (e.g. the request)
+        length: Number of bytes in the chunk
+        sha256: Optional hex SHA-256 checksum sent by the client
+
+    Returns:
+        UploadChunk: The acknowledged chunk
+
+    Raises:
+        UploadError: If the chunk is out of order, has the wrong size, is
+            truncated, does not match its checksum, or another chunk of
+            the upload is being written.
+    """
+    path = staging_path(session)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "ab") as lock:
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            raise UploadError("Another chunk of this upload is being written.", session.offset)
+        session = UploadSession.objects.get(pk=session.pk)
+        _check_chunk(session, offset, length)
+
+        digest = hashlib.sha256()
+        received = 0
+        head = b""
+        with open(path, "r+b") as staging:
+            staging.seek(offset)
+            staging.truncate()
+            while received < length:
+                block = stream.read(min(BLOCK_SIZE, length - received))
+                if not block:
+                    break
+                if offset == 0 and len(head) < 1024:
+                    head += block[:1024 - len(head)]
+                digest.update(block)
+                staging.write(block)
+                received += len(block)
+            if received != length or (sha256 and digest.hexdigest() != sha256.lower()):
+                staging.truncate(offset)
+                raise UploadError("Chunk was truncated or does not match its checksum.", session.offset)
+            staging.flush()
+            os.fsync(staging.fileno())
+
+        with transaction.atomic():
+            session = UploadSession.objects.select_for_update().get(pk=session.pk)
+            _check_chunk(session, offset, length)
+            session.offset += length
+            if head:
+                session.mime_type = magic.from_buffer(head, mime=True)
+            session.save(update_fields=["offset", "mime_type", "updated_at"])
+            return UploadChunk.objects.create(
+                    session=session,
+                    index=offset // session.chunk_size,
+                    offset=offset,
+                    size=length,
+                    sha256=digest.hexdigest()
+                    )
+
+
+def _check_chunk(session, offset, length):
+    if session.file_id:
+        raise UploadError("Upload was already committed.", session.offset)
+    if offset != session.offset:
+        raise UploadError(f"Expected a chunk at offset {session.offset}.", session.offset)
+    expected = min(session.chunk_size, session.size - offset)
+    if length != expected:
+        raise UploadError(f"Expected a chunk of {expected} bytes.", session.offset)
+
+
+def commit_upload(session):
+    """Turn a fully received upload into a File.
+
+    The staged bytes are hashed and moved into the blob store without a
+    transaction, under the lock of the staging file, which keeps chunks
+    and other commits of the upload away. The session row is only locked
+    to create the File and mark the upload as committed.
+
+    Raises:
+        UploadError: If some bytes have not been received yet.
+    """
+    path = staging_path(session)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "ab") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        session = UploadSession.objects.select_related("file").get(pk=session.pk)
+        if session.file_id:
+            return session.file
+        if not session.is_complete:
+            raise UploadError("Upload is missing chunks.", session.offset)
+        blob = store_path(path, _hash_staging(path), session.size)
+
+        try:
+            with transaction.atomic():
+                session = UploadSession.objects.select_for_update().get(pk=session.pk)
+                instance = File(
+                        user=session.user,
+                        folder=session.folder,
+                        name=session.name,
+                        mime_type=session.mime_type,
+                        size=session.size,
+                        blob=blob
+                        )
+                instance.file.name = blob.file.name
+                instance.save()
+                session.file = instance
+                session.save(update_fields=["file"])
+                schedule_processing(instance)
+        except BaseException:
+            release(blob.pk)
+            raise
+        return instance
+
+
+def _hash_staging(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as staging:
+        for block in iter(lambda: staging.read(BLOCK_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def abort_upload(session):
+    """Cancel an upload and drop its staged bytes."""
+    path = staging_path(session)
+    if os.path.exists(path):
+        os.remove(path)
+    session.delete()
+
+
+def expire_uploads(batch_size=500):
+    """Abort the uploads that received nothing for DRIVE_UPLOAD_EXPIRY_HOURS.
+
+    Their staged bytes are removed, and the space they reserved stops
+    counting towards their owner's quota.
+
+    Returns:
+        int: Number of uploads aborted
+    """
+    stale = UploadSession.objects.filter(file=None, updated_at__lte=timezone.now() - upload_expiry())
+    expired = 0
+    while batch := list(stale[:batch_size]):
+        for session in batch:
+            abort_upload(session)
+        expired += len(batch)
+    return expired
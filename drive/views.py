@@ -1,48 +1,82 @@
-from datetime import datetime
+from asgiref.sync import sync_to_async
 from django.contrib.auth.decorators import login_required
-from django.http import HttpRequest
-from rest_framework import status, viewsets
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from django.http import Http404, HttpRequest, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.utils.http import content_disposition_header
+from django.views.decorators.http import require_GET
+from graphene_django.views import HttpError
+from graphene_file_upload.django import FileUploadGraphQLView
+from rest_framework import status, viewsets, mixins
 from rest_framework.generics import get_object_or_404
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAuthenticated, AllowAny
 from rest_framework.response import Response
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.pagination import BasePagination
+from rest_framework.utils.urls import replace_query_param
 from rest_framework.decorators import action
+from rest_framework.exceptions import AuthenticationFailed, ValidationError as DRFValidationError
+from rest_framework.negotiation import DefaultContentNegotiation
 from rest_framework.views import APIView
+from rest_framework_simplejwt.authentication import JWTAuthentication
 from django.views.generic import TemplateView
 from django.shortcuts import render
 
-from .models import Folder, File, ShareLink
-from .serializers import FolderSerializer, FileSerializer
+from .models import Folder, File, Preview, ShareLink, UploadSession
+from .serializers import FolderSerializer, FileSerializer, UploadSessionSerializer, ChangeSerializer, BulkSerializer
+from .uploads import UploadError, start_upload, write_chunk, commit_upload, abort_upload
+from .permissions import HasItemPermission, shared_with
+from .downloads import serve_file, aserve_preview, is_full_download, is_asgi, aiterate
+from .previews import can_preview, preview_sizes
+from .archives import stream_folder
+from .quota import QuotaExceeded
+from .sharelinks import ShareLinkError, aresolve_share_link, athrottle_share_link
+from .changes import changes_since
+from .operations import BulkError, NOT_FOUND, delete_items, move_item, move_items, copy_item, copy_items, share_items
+from .pagination import InvalidCursor
+from .sorting import InvalidSort, Sort
+from .listings import acached_listing
+from .trash import trash, restore, trashed_items
+from .processing import purge_user_trash, request_previews
 from .utils import gravatar_url
 
 @login_required(login_url="/signin")
-def index(request: HttpRequest):
+async def index(request: HttpRequest):
     if request.method == "GET":
-        folders = FolderSerializer(Folder.objects.filter(user=request.user, parent_folder=None), many=True).data
-        files =  FileSerializer(File.objects.filter(user=request.user, folder=None), many=True).data
+        user = await request.auser()
+
+        async def build():
+            folders = FolderSerializer([f async for f in Folder.objects.filter(user=user, parent_folder=None)], many=True).data
+            files =  FileSerializer([f async for f in File.objects.filter(user=user, folder=None)], many=True).data
+            return {"folders": folders, "files": files}
 
         return render(
                 request,
                 "index.html",
                 {
-                    "user": request.user,
-                    "avatar": gravatar_url(request.user.email),
-                    "contents": {
-                        "folders":folders,
-                        "files":files,
-                    },
+                    "user": user,
+                    "avatar": gravatar_url(user.email),
+                    "contents": await acached_listing(user, None, "page", build),
                 }
         )
 
 @login_required(login_url="/signin")
-def folder(request: HttpRequest, pk=None):
+async def folder(request: HttpRequest, pk=None):
     if request.method == "GET":
-        current_folder = Folder.objects.get(id=pk);
-        if current_folder is None:
-            return render(request, "folder_404.html")
+        user = await request.auser()
+        try:
+            current_folder = await Folder.objects.aget(id=pk)
+        except (Folder.DoesNotExist, ValidationError):
+            raise Http404("Folder not found")
+        if not await sync_to_async(current_folder.has_permission)(user, "view"):
+            raise Http404("Folder not found")
+
+        async def build():
+            folders = FolderSerializer([f async for f in Folder.objects.filter(parent_folder_id=pk)], many=True).data
+            files =  FileSerializer([f async for f in File.objects.filter(folder_id=pk)], many=True).data
+            return {"folders": folders, "files": files}
 
-        folders = FolderSerializer(Folder.objects.filter(user=request.user, parent_folder_id=pk), many=True).data
-        files =  FileSerializer(File.objects.filter(user=request.user, folder_id=pk), many=True).data
+        contents = await acached_listing(user, current_folder.pk, "page", build)
+        ancestors = [a async for a in current_folder.get_ancestors()]
 
         return render(
                 request,
@@ -50,40 +84,78 @@ def folder(request: HttpRequest, pk=None):
 
                 {
                     "folder": FolderSerializer(current_folder).data,
-                    "user": request.user,
-                    "contents": {
-                        "folders":folders,
-                        "files":files,
-                    },
+                    "ancestors": FolderSerializer(ancestors, many=True).data,
+                    "user": user,
+                    "contents": contents,
                 }
         )
 
-class FolderPagination(PageNumberPagination):
+class GraphQLView(FileUploadGraphQLView):
+    """GraphQL endpoint answering uploads over quota with an error before reading them."""
+
+    def parse_body(self, request):
+        try:
+            return super().parse_body(request)
+        except QuotaExceeded as e:
+            raise HttpError(HttpResponse(status=403), str(e))
+
+
+class DownloadContentNegotiation(DefaultContentNegotiation):
+    """Never answer 406 to a download, whatever media types the client accepts."""
+
+    def select_renderer(self, request, renderers, format_suffix=None):
+        return renderers[0], renderers[0].media_type
+
+
+class SortedPagination(BasePagination):
+    """Keyset pages of a listing sorted with `?s=<field>&o=<asc|desc>`.
+
+    Only the fields of the sort registry are accepted, anything else is a
+    400. Each page is read with a keyset condition on (field, id) instead
+    of an offset, so deep pages cost the same as the first one. The next
+    page is reached by following `next`.
+    """
+
     page_size = 10
     page_size_query_param = "page_size"
     max_page_size = 100
 
+    def paginate_queryset(self, queryset, request, view=None):
+        params = request.query_params
+        try:
+            self.sort = Sort.from_params(queryset.model, params)
+            size = min(int(params.get(self.page_size_query_param, self.page_size)), self.max_page_size)
+            if size < 1:
+                raise ValueError(size)
+            self.items, self.has_next = self.sort.page(queryset, size, params.get("cursor"))
+        except InvalidSort as e:
+            raise DRFValidationError({"s": str(e)})
+        except (InvalidCursor, ValueError) as e:
+            raise DRFValidationError({"detail": str(e)})
+        self.request = request
+        return self.items
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        return replace_query_param(self.request.build_absolute_uri(), "cursor", self.sort.encode_cursor(self.items[-1]))
+
+    def get_paginated_response(self, data):
+        return Response({"next": self.get_next_link(), "results": data})
+
 
 class FolderViewSet(viewsets.ModelViewSet):
     queryset = Folder.objects.all()
     serializer_class = FolderSerializer
-    permission_classes = [IsAuthenticated]
-    pagination_class = FolderPagination
+    permission_classes = [IsAuthenticated, HasItemPermission]
+    pagination_class = SortedPagination
 
     def get_queryset(self):
-        sort_field = self.request.query_params.get(
-                "s", "created_at"
-                )  # Default to 'created_at'
-        order = self.request.query_params.get(
-                "o", "desc"
-                )  # Default to descending order
-        queryset = self.queryset.filter(user=self.request.user)
-
-        if order == "asc":
-            queryset = queryset.order_by(sort_field)
-        elif order == "desc":
-            queryset = queryset.order_by(f"-{sort_field}")
-        return queryset
+        # Lists are sorted by the paginator, see SortedPagination
+        user = self.request.user
+        if self.action == "list":
+            return self.queryset.filter(user=user)
+        return self.queryset.filter(Q(user=user) | shared_with(user, Folder))
 
     @action(detail=True, methods=["get"], url_path="subfolders")
     def subfolders(self, request, pk=None):
@@ -91,71 +163,357 @@ class FolderViewSet(viewsets.ModelViewSet):
         subfolders = folder.folders.all()
         page = self.paginate_queryset(subfolders)
         if page is not None:
-            serializer = FolderSerializer(page, many=True)
+            serializer = FolderSerializer(page, many=True, context=self.get_serializer_context())
             return self.get_paginated_response(serializer.data)
-        serializer = FolderSerializer(subfolders, many=True)
+        serializer = FolderSerializer(subfolders, many=True, context=self.get_serializer_context())
         return Response(serializer.data)
 
     @action(detail=True, methods=["get"], url_path="files")
     def files(self, request, pk=None):
         folder = self.get_object()
-        files = folder.file_set.all()
+        files = folder.files.all()
         page = self.paginate_queryset(files)
         if page is not None:
-            serializer = FileSerializer(page, many=True)
+            serializer = FileSerializer(page, many=True, context=self.get_serializer_context())
             return self.get_paginated_response(serializer.data)
-        serializer = FileSerializer(files, many=True)
+        serializer = FileSerializer(files, many=True, context=self.get_serializer_context())
         return Response(serializer.data)
 
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
 
+    def perform_destroy(self, instance):
+        trash(instance)
+
+    @action(detail=True, methods=["post"], url_path="move")
+    def move(self, request, pk=None):
+        return item_operation_response(request, move_item, FolderSerializer, folder_id=self.get_object().pk)
+
+    @action(detail=True, methods=["post"], url_path="copy")
+    def copy(self, request, pk=None):
+        return item_operation_response(request, copy_item, FolderSerializer, folder_id=self.get_object().pk)
+
+    @action(detail=True, methods=["get"], url_path="download", content_negotiation_class=DownloadContentNegotiation)
+    def download(self, request, pk=None):
+        return zip_response(request, self.get_object())
+
 
 class FileViewSet(viewsets.ModelViewSet):
     queryset = File.objects.all()
     serializer_class = FileSerializer
-    permission_classes = [IsAuthenticated]
+    permission_classes = [IsAuthenticated, HasItemPermission]
+    pagination_class = SortedPagination
 
     def get_queryset(self):
-        sort_field = self.request.query_params.get(
-                "s", "created_at"
-                )  # Default to 'created_at'
-        order = self.request.query_params.get(
-                "o", "desc"
-                )  # Default to descending order
-        queryset = self.queryset.filter(user=self.request.user)
-
-        if order == "asc":
-            queryset = queryset.order_by(sort_field)
-        elif order == "desc":
-            queryset = queryset.order_by(f"-{sort_field}")
-        return queryset
+        # Lists are sorted by the paginator, see SortedPagination
+        user = self.request.user
+        if self.action == "list":
+            return self.queryset.filter(user=user)
+        return self.queryset.filter(Q(user=user) | shared_with(user, File))
 
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
 
+    def perform_destroy(self, instance):
+        trash(instance)
+
+    @action(detail=True, methods=["post"], url_path="move")
+    def move(self, request, pk=None):
+        return item_operation_response(request, move_item, FileSerializer, file_id=self.get_object().pk)
+
+    @action(detail=True, methods=["post"], url_path="copy")
+    def copy(self, request, pk=None):
+        return item_operation_response(request, copy_item, FileSerializer, file_id=self.get_object().pk)
+
+
+class UploadViewSet(mixins.CreateModelMixin, mixins.RetrieveModelMixin, viewsets.GenericViewSet):
+    """Resumable chunked uploads.
+
+    POST /uploads/ starts an upload, PUT /uploads/<id>/ sends the next chunk
+    as the raw request body with a `Content-Range: bytes start-end/total`
+    header (and optionally `X-Chunk-SHA256`), GET /uploads/<id>/ tells where
+    to resume, POST /uploads/<id>/commit/ creates the file and DELETE
+    /uploads/<id>/ aborts the upload.
+    """
+
+    serializer_class = UploadSessionSerializer
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        return UploadSession.objects.filter(user=self.request.user)
+
+    def perform_create(self, serializer):
+        data = serializer.validated_data
+        serializer.instance = start_upload(
+                self.request.user,
+                data["name"],
+                data["size"],
+                folder=data.get("folder"),
+                chunk_size=data.get("chunk_size")
+                )
+
+    def update(self, request, pk=None):
+        session = self.get_object()
+        try:
+            start, end, total = parse_content_range(request.headers.get("Content-Range", ""))
+        except ValueError:
+            return Response({"detail": "A valid Content-Range header is required."}, status=status.HTTP_400_BAD_REQUEST)
+        if total != session.size:
+            return Response({"detail": "Content-Range total does not match the upload size."}, status=status.HTTP_400_BAD_REQUEST)
+        if request.stream is None:
+            return Response({"detail": "The request has no body."}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            # Read the raw body so DRF never buffers the chunk through a parser
+            write_chunk(session, start, request.stream, end - start + 1, request.headers.get("X-Chunk-SHA256"))
+        except UploadError as e:
+            return Response({"detail": str(e), "offset": e.offset}, status=status.HTTP_409_CONFLICT)
+        session.refresh_from_db()
+        return Response(self.get_serializer(session).data)
+
+    def destroy(self, request, pk=None):
+        abort_upload(self.get_object())
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+    @action(detail=True, methods=["post"], url_path="commit")
+    def commit(self, request, pk=None):
+        try:
+            file = commit_upload(self.get_object())
+        except UploadError as e:
+            return Response({"detail": str(e), "offset": e.offset}, status=status.HTTP_409_CONFLICT)
+        return Response(FileSerializer(file).data, status=status.HTTP_201_CREATED)
+
+
+class ChangeFeedView(APIView):
+    """Changes of the user's drive since a cursor, for delta sync.
+
+    GET /changes/?since=<cursor>&limit=<n> returns the changes, the cursor to
+    pass next time and whether more changes are waiting.
+    """
+
+    def get(self, request):
+        try:
+            limit = int(request.query_params["limit"]) if "limit" in request.query_params else None
+            changes, cursor, has_more = changes_since(request.user, request.query_params.get("since"), limit)
+        except (InvalidCursor, ValueError) as e:
+            return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({"changes": ChangeSerializer(changes, many=True).data, "cursor": cursor, "has_more": has_more})
+
+
+class BulkOperationView(APIView):
+    """Delete, move, copy or share many files and folders in one request.
+
+    POST /bulk/<delete|move|copy|share>/ with the ids in `files` and
+    `folders`, plus `target` for move and copy, and `shared_with`,
+    `permission` and `expires_at` for share. Answers with one result per
+    item, in the order given.
+    """
+
+    operations = {
+        "delete": lambda user, data: delete_items(user, data["files"], data["folders"]),
+        "move": lambda user, data: move_items(user, data["files"], data["folders"], data.get("target")),
+        "copy": lambda user, data: copy_items(user, data["files"], data["folders"], data.get("target")),
+        "share": lambda user, data: share_items(
+            user, data["files"], data["folders"],
+            shared_with=data.get("shared_with"),
+            permission=data["permission"],
+            expires_at=data.get("expires_at")
+            ),
+    }
+
+    def post(self, request, operation):
+        if operation not in self.operations:
+            return Response({"detail": f"Unknown operation {operation!r}."}, status=status.HTTP_404_NOT_FOUND)
+        serializer = BulkSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        try:
+            results = self.operations[operation](request.user, serializer.validated_data)
+        except BulkError as e:
+            return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({"results": results})
+
+
+class TrashView(APIView):
+    """The files and folders a user deleted, until they are purged.
+
+    GET /trash/ lists them, POST /trash/ restores the ids given in `files`
+    and `folders`, DELETE /trash/ empties the trash in the background.
+    """
+
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        files, folders = trashed_items(request.user)
+        return Response({
+            "files": FileSerializer(files, many=True, context={"request": request}).data,
+            "folders": FolderSerializer(folders, many=True, context={"request": request}).data,
+        })
+
+    def post(self, request):
+        serializer = BulkSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        user, data = request.user, serializer.validated_data
+        results = []
+        for model, ids in ((File, data["files"]), (Folder, data["folders"])):
+            found = model.all_objects.trashed().filter(user=user).in_bulk(ids)
+            for pk in ids:
+                if pk not in found:
+                    results.append({"id": pk, "ok": False, "error": "Not found in the trash"})
+                    continue
+                try:
+                    restore(found[pk])
+                except ValidationError as e:
+                    results.append({"id": pk, "ok": False, "error": " ".join(e.messages)})
+                else:
+                    results.append({"id": pk, "ok": True, "error": None})
+        return Response({"results": results})
+
+    def delete(self, request):
+        purge_user_trash.delay(str(request.user.pk))
+        return Response(status=status.HTTP_202_ACCEPTED)
+
+
+def parse_content_range(header):
+    """Parse a `bytes start-end/total` Content-Range header.
+
+    Raises:
+        ValueError: If the header is missing or malformed.
+    """
+    unit, _, spec = header.partition(" ")
+    byte_range, _, total = spec.partition("/")
+    start, _, end = byte_range.partition("-")
+    start, end, total = int(start), int(end), int(total)
+    if unit != "bytes" or start < 0 or end < start:
+        raise ValueError(header)
+    return start, end, total
+
+
+async def authenticate(request):
+    """Get the user of a plain async view from the session or a JWT access token."""
+    user = await request.auser()
+    if not user.is_authenticated:
+        try:
+            result = await sync_to_async(JWTAuthentication().authenticate)(request)
+        except AuthenticationFailed:
+            result = None
+        if result is not None:
+            user = result[0]
+    return user
+
+
+@require_GET
+async def download_file(request, pk):
+    """Download a file, with Range and conditional request support."""
+    user = await authenticate(request)
+    if not user.is_authenticated:
+        return JsonResponse({"detail": "Authentication credentials were not provided."}, status=401)
+    try:
+        file = await File.objects.aget(pk=pk)
+    except File.DoesNotExist:
+        file = None
+    if file is None or not await sync_to_async(file.has_permission)(user, "view"):
+        return JsonResponse({"detail": "No File matches the given query."}, status=404)
+    return serve_file(request, file, as_attachment=request.GET.get("inline") is None)
+
+
+@require_GET
+async def file_thumbnail(request, pk, size):
+    """Send a preview of a file.
+
+    Previews are only rendered by the worker: when it has not caught up
+    yet, the rendering is queued and 202 is answered so the client retries,
+    and once it has failed (content that cannot be decoded) 404.
+    """
+    user = await authenticate(request)
+    if not user.is_authenticated:
+        return JsonResponse({"detail": "Authentication credentials were not provided."}, status=401)
+    try:
+        file = await File.objects.select_related("blob").aget(pk=pk)
+    except File.DoesNotExist:
+        file = None
+    if file is None or not await sync_to_async(file.has_permission)(user, "view"):
+        return JsonResponse({"detail": "No File matches the given query."}, status=404)
+    if size not in preview_sizes() or not file.blob_id or not can_preview(file.mime_type):
+        return JsonResponse({"detail": "No preview is available for this file."}, status=404)
+
+    preview = await Preview.objects.filter(blob_id=file.blob_id, size=size).afirst()
+    if preview is None:
+        if not await sync_to_async(request_previews)(file):
+            return JsonResponse({"detail": "No preview is available for this file."}, status=404)
+        response = JsonResponse({"detail": "The preview is being rendered."}, status=202)
+        response["Retry-After"] = "2"
+        return response
+    version = request.GET.get("v")
+    return await aserve_preview(request, preview, immutable=bool(version) and file.blob_id.startswith(version))
+
+
+@require_GET
+async def share_link(request, token):
+    """Resolve a public share link to its file or folder."""
+    try:
+        await athrottle_share_link(request, token)
+        share_link = await aresolve_share_link(token, request.GET.get("password"))
+    except ShareLinkError as e:
+        return share_link_error(e)
+
+    # Serialize file or folder
+    if share_link.file:
+        data = FileSerializer(share_link.file).data
+        return JsonResponse({"type": "file", "data": data})
+    else:
+        data = FolderSerializer(share_link.folder).data
+        return JsonResponse({"type": "folder", "data": data})
+
+
+@require_GET
+async def share_link_download(request, token):
+    """Download the file behind a public share link, or a ZIP of its folder."""
+    try:
+        await athrottle_share_link(request, token)
+        share_link = await aresolve_share_link(token, request.GET.get("password"))
+    except ShareLinkError as e:
+        return share_link_error(e)
+    if share_link.folder:
+        await share_link.aincrement_download_count()
+        return zip_response(request, share_link.folder)
+
+    response = serve_file(request, share_link.file, as_attachment=request.GET.get("inline") is None)
+    # Count each download once, not every range request of a seeking player
+    if response.status_code == 200 or (response.status_code == 206 and is_full_download(request)):
+        await share_link.aincrement_download_count()
+    return response
 
-class ShareLinkAPIView(APIView):
-    def get(self, request, token):
-        share_link = get_object_or_404(ShareLink, id=token, is_active=True)
 
-        # Check expiration
-        if share_link.expires_at and share_link.expires_at < datetime.now():
-            return Response({"detail": "Link has expired."}, status=status.HTTP_403_FORBIDDEN)
+def share_link_error(error):
+    response = JsonResponse({"detail": str(error)}, status=error.status)
+    if error.retry_after:
+        response["Retry-After"] = str(error.retry_after)
+    return response
 
-        # Check password (optional)
-        if share_link.password:
-            provided = request.GET.get("password")
-            if not provided or provided != share_link.password:
-                return Response({"detail": "Password required or incorrect."}, status=status.HTTP_403_FORBIDDEN)
 
-        # Serialize file or folder
-        if share_link.file:
-            data = FileSerializer(share_link.file).data
-            return Response({"type": "file", "data": data})
-        else:
-            data = FolderSerializer(share_link.folder).data
-            return Response({"type": "folder", "data": data})
+def zip_response(request, folder):
+    """Stream a folder and its whole subtree as a ZIP archive."""
+    content = stream_folder(folder)
+    if is_asgi(request):
+        content = aiterate(content)
+    response = StreamingHttpResponse(content, content_type="application/zip")
+    response["Content-Disposition"] = content_disposition_header(True, f"{folder.name}.zip")
+    # Let nginx pass the archive through as it is produced
+    response["X-Accel-Buffering"] = "no"
+    return response
 
 
+def item_operation_response(request, operation, serializer_class, **item):
+    """Move or copy a file or folder of the user into the folder given as `target`.
 
+    Answers with the moved item, or with the copy and a 201.
+    """
+    target = BulkSerializer(data=request.data)
+    target.is_valid(raise_exception=True)
+    try:
+        result = operation(request.user, target_id=target.validated_data.get("target"), **item)
+    except BulkError as e:
+        code = status.HTTP_404_NOT_FOUND if str(e) == NOT_FOUND else status.HTTP_400_BAD_REQUEST
+        return Response({"detail": str(e)}, status=code)
+    code = status.HTTP_201_CREATED if operation is copy_item else status.HTTP_200_OK
+    return Response(serializer_class(result, context={"request": request}).data, status=code)
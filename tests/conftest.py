@@ -0,0 +1,20 @@
+import pytest
+from django.contrib.auth import get_user_model
+
+User = get_user_model()
+
+@pytest.fixture(autouse=True)
+def media_root(settings, tmp_path):
+    settings.MEDIA_ROOT = tmp_path
+
+@pytest.fixture
+def user(db):
+    return User.objects.create_user(email='test@example.com', password='testpassword')
+
+@pytest.fixture
+def users(db):
+    return [User.objects.create_user(email=f'user{i}@example.com', password='testpassword') for i in range(2)]
+
+@pytest.fixture
+def guest(db):
+    return User.objects.create_user(email='guest@example.com', password='testpassword')
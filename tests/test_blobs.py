@@ -0,0 +1,62 @@
+import hashlib
+import pytest
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from rest_framework.test import APIClient
+from drive.models import Blob, File
+
+@pytest.mark.django_db
+def test_identical_uploads_share_one_blob(users, django_capture_on_commit_callbacks):
+    content = b'the same iso image'
+    first = File.objects.create(user=users[0], name='a.iso', file=SimpleUploadedFile('a.iso', content))
+    second = File.objects.create(user=users[1], name='b.iso', file=SimpleUploadedFile('b.iso', content))
+
+    blob = Blob.objects.get()
+    assert blob.sha256 == hashlib.sha256(content).hexdigest()
+    assert blob.ref_count == 2
+    assert first.file.name == second.file.name == blob.file.name
+
+    with django_capture_on_commit_callbacks(execute=True):
+        first.delete()
+    assert Blob.objects.get().ref_count == 1
+    assert default_storage.exists(blob.file.name)
+
+    with django_capture_on_commit_callbacks(execute=True):
+        second.delete()
+    assert not Blob.objects.exists()
+    assert not default_storage.exists(blob.file.name)
+
+@pytest.mark.django_db
+def test_replacing_content_releases_previous_blob(users, django_capture_on_commit_callbacks):
+    file = File.objects.create(user=users[0], name='notes.txt', file=ContentFile(b'v1', name='notes.txt'))
+    old = file.blob
+    with django_capture_on_commit_callbacks(execute=True):
+        file.file = ContentFile(b'v2', name='notes.txt')
+        file.save()
+    assert file.blob.sha256 == hashlib.sha256(b'v2').hexdigest()
+    assert not Blob.objects.filter(pk=old.pk).exists()
+
+@pytest.mark.django_db
+def test_multipart_upload_is_hashed_while_streaming(users):
+    client = APIClient()
+    client.force_authenticate(user=users[0])
+    response = client.post('/api/files/', {'name': 'upload.txt', 'file': SimpleUploadedFile('upload.txt', b'payload')}, format='multipart')
+    assert response.status_code == 201
+    assert File.objects.get(pk=response.data['id']).blob_id == hashlib.sha256(b'payload').hexdigest()
+
+@pytest.mark.django_db
+def test_content_uploaded_again_before_commit_keeps_its_bytes(users, django_capture_on_commit_callbacks):
+    content = b'uploaded twice'
+    first = File.objects.create(user=users[0], name='a.txt', file=SimpleUploadedFile('a.txt', content))
+    name = first.blob.file.name
+
+    with django_capture_on_commit_callbacks(execute=True) as callbacks:
+        first.delete()
+        # The unused blob is only deleted after the commit, under a row lock
+        assert Blob.objects.get().ref_count == 0
+        second = File.objects.create(user=users[1], name='b.txt', file=SimpleUploadedFile('b.txt', content))
+    assert callbacks
+    assert Blob.objects.get().ref_count == 1
+    assert second.file.name == name
+    assert default_storage.open(name).read() == content
@@ -0,0 +1,82 @@
+import pytest
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from rest_framework.test import APIClient
+from drive.changes import changes_since
+from drive.models import Change, File, Folder, Share
+
+@pytest.mark.django_db
+def test_changes_are_journaled_and_compacted(users):
+    owner, guest = users
+    folder = Folder.objects.create(user=owner, name='docs')
+    file = File.objects.create(user=owner, folder=folder, name='a.txt', file=SimpleUploadedFile('a.txt', b'hello'))
+
+    changes, cursor, has_more = changes_since(owner)
+    assert [(c.kind, c.action, c.item_id) for c in changes] == [('folder', 'created', folder.pk), ('file', 'created', file.pk)]
+    assert not has_more
+
+    for name in ['b.txt', 'c.txt', 'd.txt']:
+        file.name = name
+        file.save()
+    share = Share.objects.create(shared_by=owner, shared_with=guest, file=file)
+    deleted = {('folder', folder.pk), ('file', file.pk), ('share', share.pk)}
+    folder.delete()
+
+    changes, cursor, has_more = changes_since(owner, cursor)
+    # Renames and the share are superseded by the deletes of the folder's subtree
+    assert len(changes) == 3
+    assert {(c.kind, c.item_id) for c in changes} == deleted
+    assert {c.action for c in changes} == {'deleted'}
+    assert changes_since(owner, cursor)[0] == []
+    assert [(c.kind, c.action) for c in changes_since(guest)[0]] == [('share', 'deleted')]
+
+@pytest.mark.django_db
+def test_compacted_changes_replay_parents_first(users):
+    owner = users[0]
+    folder = Folder.objects.create(user=owner, name='docs')
+    file = File.objects.create(user=owner, folder=folder, name='a.txt', file=SimpleUploadedFile('a.txt', b'hello'))
+    folder.name = 'papers'
+    folder.save()
+    file.name = 'b.txt'
+    file.save()
+
+    changes, _, _ = changes_since(owner)
+    assert [(c.kind, c.action, c.name) for c in changes] == [('folder', 'created', 'papers'), ('file', 'created', 'b.txt')]
+
+@pytest.mark.django_db
+def test_change_feed_endpoint_pages_with_cursors(users):
+    owner = users[0]
+    for i in range(5):
+        Folder.objects.create(user=owner, name=f'folder{i}')
+    client = APIClient()
+    client.force_authenticate(owner)
+
+    response = client.get('/api/changes/', {'limit': 3}).json()
+    assert [c['name'] for c in response['changes']] == ['folder0', 'folder1', 'folder2']
+    assert response['has_more']
+
+    response = client.get('/api/changes/', {'since': response['cursor'], 'limit': 3}).json()
+    assert [c['name'] for c in response['changes']] == ['folder3', 'folder4']
+    assert not response['has_more']
+
+    assert client.get('/api/changes/', {'since': 'garbage'}).status_code == 400
+    assert Change.objects.filter(user=users[1]).count() == 0
+
+@pytest.mark.django_db
+def test_journal_rows_are_appended_under_a_user_lock(users, monkeypatch):
+    owner, guest = users
+    folder = Folder.objects.create(user=owner, name='docs')
+    # SQLite has no row locks: run the locking query without its FOR UPDATE
+    monkeypatch.setattr(connection.features, 'has_select_for_update', True)
+    statements = []
+
+    def capture(execute, sql, params, many, context):
+        statements.append(sql)
+        return execute(sql.replace(' FOR UPDATE', ''), params, many, context)
+
+    with connection.execute_wrapper(capture):
+        Share.objects.create(shared_by=owner, shared_with=guest, folder=folder, permission='view')
+
+    locks = [i for i, sql in enumerate(statements) if sql.endswith(' FOR UPDATE') and 'accounts_' in sql]
+    inserts = [i for i, sql in enumerate(statements) if sql.startswith('INSERT INTO "drive_change"')]
+    assert locks and inserts and locks[0] < inserts[0]
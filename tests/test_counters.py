@@ -0,0 +1,63 @@
+import threading
+import time
+import pytest
+from django.contrib.auth import get_user_model
+from drive.counters import BufferedCounter
+from drive.models import Folder, ShareLink
+
+User = get_user_model()
+
+@pytest.fixture
+def links(db):
+    user = User.objects.create_user(email='owner@example.com', password='testpassword')
+    folder = Folder.objects.create(user=user, name='public')
+    return [ShareLink.objects.create(created_by=user, folder=folder) for i in range(2)]
+
+@pytest.mark.django_db
+def test_increments_are_buffered_then_flushed_atomically(links):
+    counter = BufferedCounter("drive.ShareLink", "download_count", interval=3600)
+    threads = [threading.Thread(target=lambda: [counter.add(links[0].pk) for i in range(50)]) for t in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    counter.add(links[1].pk)
+
+    assert ShareLink.objects.get(pk=links[0].pk).download_count == 0
+    assert counter.pending(links[0].pk) == 200
+
+    # Rows changed by another worker in the meantime keep their increments
+    ShareLink.objects.filter(pk=links[0].pk).update(download_count=7)
+    counter.flush()
+    assert ShareLink.objects.get(pk=links[0].pk).download_count == 207
+    assert ShareLink.objects.get(pk=links[1].pk).download_count == 1
+    assert counter.pending(links[0].pk) == 0
+
+@pytest.mark.django_db
+def test_counter_flushes_when_the_buffer_is_full(links):
+    counter = BufferedCounter("drive.ShareLink", "download_count", interval=3600, max_pending=10)
+    for i in range(10):
+        counter.add(links[0].pk)
+    assert ShareLink.objects.get(pk=links[0].pk).download_count == 10
+
+@pytest.mark.django_db
+def test_failed_flushes_keep_their_increments(links, caplog):
+    counter = BufferedCounter("drive.ShareLink", "no_such_column", interval=3600)
+    counter.add(links[0].pk)
+    counter.flush()
+    assert counter.pending(links[0].pk) == 1
+    assert 'Could not flush' in caplog.text
+
+    counter.field = "download_count"
+    counter.flush()
+    assert ShareLink.objects.get(pk=links[0].pk).download_count == 1
+
+@pytest.mark.django_db(transaction=True)
+def test_idle_counters_flush_in_the_background(links):
+    counter = BufferedCounter("drive.ShareLink", "download_count", interval=0.1)
+    counter.add(links[0].pk)
+    deadline = time.monotonic() + 5
+    while not ShareLink.objects.get(pk=links[0].pk).download_count and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert ShareLink.objects.get(pk=links[0].pk).download_count == 1
+    assert counter.pending(links[0].pk) == 0
@@ -0,0 +1,148 @@
+import io
+import zipfile
+import pytest
+from asgiref.sync import async_to_sync
+from django.contrib.auth import get_user_model
+from django.test import AsyncClient
+from rest_framework_simplejwt.tokens import AccessToken
+from django.core.files.uploadedfile import SimpleUploadedFile
+from rest_framework.test import APIClient
+from drive.models import File, Folder, ShareLink
+from drive.trash import trash
+
+User = get_user_model()
+
+CONTENT = b'0123456789' * 100
+
+@pytest.fixture
+def file(user):
+    return File.objects.create(user=user, name='movie.mp4', file=SimpleUploadedFile('movie.mp4', CONTENT))
+
+def read(response):
+    return b''.join(response.streaming_content)
+
+@pytest.mark.django_db
+def test_download_serves_ranges_and_conditional_requests(user, file):
+    client = APIClient()
+    client.force_login(user)
+    url = f'/api/files/{file.pk}/download/'
+
+    response = client.get(url)
+    assert response.status_code == 200
+    assert read(response) == CONTENT
+    assert response['ETag'] == f'"{file.blob_id}"'
+    assert response['Accept-Ranges'] == 'bytes'
+
+    response = client.get(url, HTTP_RANGE='bytes=100-199')
+    assert response.status_code == 206
+    assert response['Content-Range'] == f'bytes 100-199/{len(CONTENT)}'
+    assert response['Content-Length'] == '100'
+    assert read(response) == CONTENT[100:200]
+
+    response = client.get(url, HTTP_RANGE='bytes=-10')
+    assert read(response) == CONTENT[-10:]
+
+    response = client.get(url, HTTP_RANGE=f'bytes={len(CONTENT)}-')
+    assert response.status_code == 416
+
+    # A stale If-Range sends the whole file again
+    response = client.get(url, HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE='"stale"')
+    assert response.status_code == 200
+
+    response = client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+    assert response.status_code == 304
+
+    other = User.objects.create_user(email='other@example.com', password='testpassword')
+    client.force_login(other)
+    assert client.get(url).status_code == 404
+
+@pytest.mark.django_db(transaction=True)
+def test_async_download_streams_asynchronously(user, file):
+    @async_to_sync
+    async def download():
+        headers = {'Authorization': f'Bearer {AccessToken.for_user(user)}', 'Range': 'bytes=10-29'}
+        response = await AsyncClient().get(f'/api/files/{file.pk}/download/', headers=headers)
+        assert response.is_async
+        return response.status_code, b''.join([chunk async for chunk in response.streaming_content])
+
+    assert download() == (206, CONTENT[10:30])
+
+@pytest.mark.django_db
+def test_download_can_be_offloaded_to_the_proxy(settings, user, file):
+    settings.DRIVE_SENDFILE = 'x-accel-redirect'
+    client = APIClient()
+    client.force_login(user)
+
+    response = client.get(f'/api/files/{file.pk}/download/')
+    assert response.status_code == 200
+    assert response['X-Accel-Redirect'] == '/protected/' + file.file.name
+    assert response.content == b''
+
+@pytest.mark.django_db
+def test_share_link_download_checks_password(user, file):
+    link = ShareLink(created_by=user, file=file)
+    link.set_password('secret')
+    link.save()
+    client = APIClient()
+    url = f'/api/share/{link.pk}/download/'
+
+    assert client.get(url).status_code == 403
+    response = client.get(url, {'password': 'secret'})
+    assert response.status_code == 200
+    assert read(response) == CONTENT
+
+    client.get(url, {'password': 'secret'}, HTTP_RANGE='bytes=500-')
+    link.refresh_from_db()
+    assert link.get_download_count() == 1
+
+@pytest.mark.django_db
+def test_folder_download_streams_the_subtree_as_zip(user):
+    root = Folder.objects.create(user=user, name='photos')
+    trip = Folder.objects.create(user=user, name='trip', parent_folder=root)
+    Folder.objects.create(user=user, name='empty', parent_folder=trip)
+    File.objects.create(user=user, folder=root, name='notes.txt', mime_type='text/plain', file=SimpleUploadedFile('notes.txt', CONTENT))
+    File.objects.create(user=user, folder=trip, name='beach.jpg', mime_type='image/jpeg', file=SimpleUploadedFile('beach.jpg', b'\xff\xd8jpeg'))
+    File.objects.create(user=user, name='outside.txt', file=SimpleUploadedFile('outside.txt', b'not in the archive'))
+    client = APIClient()
+    client.force_authenticate(user)
+
+    response = client.get(f'/api/folders/{root.pk}/download/')
+    assert response.status_code == 200
+    assert response['Content-Type'] == 'application/zip'
+    archive = zipfile.ZipFile(io.BytesIO(read(response)))
+    assert sorted(archive.namelist()) == [
+        'photos/', 'photos/notes.txt', 'photos/trip/', 'photos/trip/beach.jpg', 'photos/trip/empty/'
+    ]
+    assert archive.read('photos/notes.txt') == CONTENT
+    assert archive.getinfo('photos/notes.txt').compress_type == zipfile.ZIP_DEFLATED
+    assert archive.getinfo('photos/trip/beach.jpg').compress_type == zipfile.ZIP_STORED
+    assert archive.testzip() is None
+
+@pytest.mark.django_db
+def test_folder_download_keeps_members_inside_the_archive(user):
+    root = Folder.objects.create(user=user, name='..')
+    nested = Folder.objects.create(user=user, name='a/../b', parent_folder=root)
+    File.objects.create(user=user, folder=root, name='../../x', file=SimpleUploadedFile('x', b'x'))
+    File.objects.create(user=user, folder=nested, name='/etc/passwd', file=SimpleUploadedFile('passwd', b'p'))
+    File.objects.create(user=user, folder=nested, name='..\\..\\boot.ini', file=SimpleUploadedFile('boot.ini', b'b'))
+    client = APIClient()
+    client.force_authenticate(user)
+
+    archive = zipfile.ZipFile(io.BytesIO(read(client.get(f'/api/folders/{root.pk}/download/'))))
+    assert sorted(archive.namelist()) == [
+        'unnamed/', 'unnamed/a_b/', 'unnamed/a_b/boot.ini', 'unnamed/a_b/etc_passwd', 'unnamed/x'
+    ]
+
+@pytest.mark.django_db
+def test_folder_download_skips_files_of_trashed_folders(user):
+    root = Folder.objects.create(user=user, name='photos')
+    trip = Folder.objects.create(user=user, name='trip', parent_folder=root)
+    File.objects.create(user=user, folder=root, name='notes.txt', file=SimpleUploadedFile('notes.txt', CONTENT))
+    trash(trip)
+    # Uploaded into the folder while it was being trashed
+    File.objects.create(user=user, folder=Folder.all_objects.get(pk=trip.pk), name='late.jpg', file=SimpleUploadedFile('late.jpg', b'jpeg'))
+    client = APIClient()
+    client.force_authenticate(user)
+
+    archive = zipfile.ZipFile(io.BytesIO(read(client.get(f'/api/folders/{root.pk}/download/'))))
+    assert sorted(archive.namelist()) == ['photos/', 'photos/notes.txt']
@@ -0,0 +1,91 @@
+import pytest
+from asgiref.sync import async_to_sync
+from channels.db import database_sync_to_async
+from channels.testing import WebsocketCommunicator
+from django.core.files.uploadedfile import SimpleUploadedFile
+from drive.consumers import DriveConsumer
+from drive.models import File, Folder, Share
+
+def connect(user):
+    communicator = WebsocketCommunicator(DriveConsumer.as_asgi(), '/ws/drive/')
+    communicator.scope['user'] = user
+    return communicator
+
+@pytest.mark.django_db(transaction=True)
+def test_changes_reach_the_owner_and_folder_subscribers(users):
+    owner, guest = users
+
+    @async_to_sync
+    async def scenario():
+        owner_feed, guest_feed = connect(owner), connect(guest)
+        assert (await owner_feed.connect())[0]
+        assert (await guest_feed.connect())[0]
+
+        folder = await database_sync_to_async(Folder.objects.create)(user=owner, name='shared')
+        assert (await owner_feed.receive_json_from()) | {'at': None} == {
+            'action': 'created', 'kind': 'folder', 'id': str(folder.pk), 'name': 'shared',
+            'parent_folder': None, 'at': None,
+        }
+
+        # Guests cannot follow folders that are not shared with them
+        await guest_feed.send_json_to({'subscribe': str(folder.pk)})
+        assert 'error' in await guest_feed.receive_json_from()
+
+        share = await database_sync_to_async(Share.objects.create)(shared_by=owner, shared_with=guest, folder=folder)
+        assert (await guest_feed.receive_json_from())['kind'] == 'share'
+        assert (await owner_feed.receive_json_from())['id'] == str(share.pk)
+        await guest_feed.send_json_to({'subscribe': str(folder.pk)})
+        assert await guest_feed.receive_json_from() == {'subscribed': str(folder.pk)}
+
+        sub = await database_sync_to_async(Folder.objects.create)(user=owner, name='deep', parent_folder=folder)
+        await owner_feed.receive_json_from()
+        assert (await guest_feed.receive_json_from())['id'] == str(sub.pk)
+
+        file = await database_sync_to_async(File.objects.create)(
+            user=owner, folder=sub, name='a.txt', file=SimpleUploadedFile('a.txt', b'hello'))
+        await owner_feed.receive_json_from()
+        event = await guest_feed.receive_json_from()
+        assert (event['action'], event['kind'], event['id']) == ('created', 'file', str(file.pk))
+
+        await database_sync_to_async(file.delete)()
+        await owner_feed.receive_json_from()
+        assert (await guest_feed.receive_json_from())['action'] == 'deleted'
+
+        await owner_feed.disconnect()
+        await guest_feed.disconnect()
+
+    scenario()
+
+@pytest.mark.django_db(transaction=True)
+def test_revoked_shares_stop_folder_events(users):
+    owner, guest = users
+
+    @async_to_sync
+    async def scenario():
+        folder = await database_sync_to_async(Folder.objects.create)(user=owner, name='shared')
+        share = await database_sync_to_async(Share.objects.create)(shared_by=owner, shared_with=guest, folder=folder)
+        guest_feed = connect(guest)
+        assert (await guest_feed.connect())[0]
+        await guest_feed.send_json_to({'subscribe': str(folder.pk)})
+        assert await guest_feed.receive_json_from() == {'subscribed': str(folder.pk)}
+
+        await database_sync_to_async(share.delete)()
+        assert (await guest_feed.receive_json_from())['kind'] == 'share'
+        await database_sync_to_async(Folder.objects.create)(user=owner, name='secret', parent_folder=folder)
+        assert await guest_feed.receive_json_from() == {'unsubscribed': str(folder.pk), 'revoked': True}
+        await database_sync_to_async(Folder.objects.create)(user=owner, name='later', parent_folder=folder)
+        assert await guest_feed.receive_nothing()
+
+        await guest_feed.disconnect()
+
+    scenario()
+
+def test_anonymous_connections_are_refused():
+    from django.contrib.auth.models import AnonymousUser
+
+    @async_to_sync
+    async def scenario():
+        connected, code = await connect(AnonymousUser()).connect()
+        return connected, code
+
+    assert scenario() == (False, 4401)
@@ -0,0 +1,68 @@
+import pytest
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import Client
+from drive import listings
+from drive.caching import TieredCache
+from drive.listings import LISTING_TTL, cached_listing, listing_cache
+from drive.models import File, Folder
+
+@pytest.fixture(autouse=True)
+def clear_listings():
+    listing_cache.backend.clear()
+    listing_cache.local.clear()
+
+def listed(response):
+    contents = response.context['contents']
+    return sorted(f['name'] for f in contents['folders']), sorted(f['name'] for f in contents['files'])
+
+@pytest.mark.django_db
+def test_folder_listing_is_cached_until_its_contents_change(users, django_assert_num_queries):
+    owner = users[0]
+    docs = Folder.objects.create(user=owner, name='docs')
+    archive = Folder.objects.create(user=owner, name='archive')
+    file = File.objects.create(user=owner, folder=docs, name='a.txt', file=SimpleUploadedFile('a.txt', b'hello'))
+    client = Client()
+    client.force_login(owner)
+
+    assert listed(client.get(f'/folder/{docs.pk}/')) == ([], ['a.txt'])
+    # Session, user and folder; the listing itself comes from the cache
+    with django_assert_num_queries(3):
+        assert listed(client.get(f'/folder/{docs.pk}/')) == ([], ['a.txt'])
+
+    file.name = 'b.txt'
+    file.save()
+    assert listed(client.get(f'/folder/{docs.pk}/')) == ([], ['b.txt'])
+
+    Folder.objects.create(user=owner, name='drafts', parent_folder=docs)
+    assert listed(client.get(f'/folder/{docs.pk}/')) == (['drafts'], ['b.txt'])
+
+    assert listed(client.get(f'/folder/{archive.pk}/')) == ([], [])
+    file.folder = archive
+    file.save()
+    assert listed(client.get(f'/folder/{docs.pk}/')) == (['drafts'], [])
+    assert listed(client.get(f'/folder/{archive.pk}/')) == ([], ['b.txt'])
+
+    assert listed(client.get('/')) == (['archive', 'docs'], [])
+    archive.delete()
+    assert listed(client.get('/')) == (['docs'], [])
+
+@pytest.mark.django_db
+def test_bumps_reach_listings_cached_by_other_workers(user, monkeypatch):
+    # Two workers, each with its own memory tier over the shared backend
+    worker = TieredCache('drive:listing', ttl=LISTING_TTL, local_ttl=LISTING_TTL)
+    other = TieredCache('drive:listing', ttl=LISTING_TTL, local_ttl=LISTING_TTL)
+    builds = []
+
+    def build():
+        builds.append(1)
+        return len(builds)
+
+    monkeypatch.setattr(listings, 'listing_cache', worker)
+    assert cached_listing(user, None, 'page', build) == 1
+    assert cached_listing(user, None, 'page', build) == 1
+
+    monkeypatch.setattr(listings, 'listing_cache', other)
+    Folder.objects.create(user=user, name='docs')
+
+    monkeypatch.setattr(listings, 'listing_cache', worker)
+    assert cached_listing(user, None, 'page', build) == 2
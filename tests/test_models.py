@@ -1,14 +1,7 @@
 import pytest
-from django.contrib.auth import get_user_model
 from django.core.exceptions import ValidationError
 from drive.models import Folder, File, Share, ShareLink
 
-User = get_user_model()
-
-@pytest.fixture
-def user(db):
-    return User.objects.create_user(email='test@example.com', password='testpassword')
-
 @pytest.mark.django_db
 def test_create_folder_with_valid_data(user):
     folder = Folder.objects.create(user=user, name='My Folder')
@@ -43,3 +36,58 @@ def test_share_folder(user):
     share = ShareLink.objects.create(folder=folder, created_by=user,)
     assert share.folder == folder
     assert share.created_by == user
+
+@pytest.mark.django_db
+def test_folder_path_tracks_ancestors(user):
+    root = Folder.objects.create(user=user, name='root')
+    child = Folder.objects.create(user=user, name='child', parent_folder=root)
+    grandchild = Folder.objects.create(user=user, name='grandchild', parent_folder=child)
+    assert grandchild.depth == 2
+    assert list(grandchild.get_ancestors()) == [root, child]
+    assert set(root.get_descendants()) == {child, grandchild}
+    assert grandchild.is_descendant_of(root)
+    assert not root.is_descendant_of(grandchild)
+
+@pytest.mark.django_db
+def test_folder_move_rewrites_descendant_paths(user):
+    a = Folder.objects.create(user=user, name='a')
+    b = Folder.objects.create(user=user, name='b')
+    child = Folder.objects.create(user=user, name='child', parent_folder=a)
+    leaf = Folder.objects.create(user=user, name='leaf', parent_folder=child)
+    child.parent_folder = b
+    child.save()
+    leaf.refresh_from_db()
+    assert leaf.path == f"/{b.id.hex}/{child.id.hex}/{leaf.id.hex}/"
+    assert leaf.depth == 2
+    assert list(a.get_descendants()) == []
+
+@pytest.mark.django_db
+def test_stale_folders_do_not_write_back_their_paths(user):
+    a = Folder.objects.create(user=user, name='a')
+    b = Folder.objects.create(user=user, name='b')
+    child = Folder.objects.create(user=user, name='child', parent_folder=a)
+    leaf = Folder.objects.create(user=user, name='leaf', parent_folder=child)
+    stale_child, stale_leaf = Folder.objects.get(pk=child.pk), Folder.objects.get(pk=leaf.pk)
+    a.parent_folder = b
+    a.save()
+
+    # Loaded before `a` moved: a rename keeps the new path
+    stale_leaf.name = 'renamed'
+    stale_leaf.save()
+    assert stale_leaf.path == f"/{b.id.hex}/{a.id.hex}/{child.id.hex}/{leaf.id.hex}/"
+    # and a move reads where the new parent is now
+    other = Folder.objects.create(user=user, name='other', parent_folder=stale_child)
+    stale_child.parent_folder = None
+    stale_child.save()
+    leaf.refresh_from_db()
+    other.refresh_from_db()
+    assert leaf.path == f"/{child.id.hex}/{leaf.id.hex}/" and leaf.depth == 1
+    assert other.path == f"/{child.id.hex}/{other.id.hex}/"
+
+@pytest.mark.django_db
+def test_folder_cannot_move_inside_itself(user):
+    parent = Folder.objects.create(user=user, name='parent')
+    child = Folder.objects.create(user=user, name='child', parent_folder=parent)
+    parent.parent_folder = child
+    with pytest.raises(ValidationError):
+        parent.save()
@@ -0,0 +1,183 @@
+import pytest
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from rest_framework.test import APIClient
+from drive.models import Blob, File, Folder, Share
+from drive import operations
+from drive.operations import copy_items, delete_items, move_items
+from drive.rollups import recompute
+from drive.search import get_search_backend
+from drive.trash import restore, trashed_items
+
+User = get_user_model()
+
+def make_files(user, folder, count):
+    prefix = folder.name if folder else 'root'
+    return [File.objects.create(user=user, folder=folder, name=f'file{i}.txt', file=SimpleUploadedFile('a.txt', f'{prefix}{i}'.encode()))
+            for i in range(count)]
+
+@pytest.mark.django_db
+def test_bulk_move_uses_a_constant_number_of_queries(users, django_assert_max_num_queries):
+    owner, other = users
+    source = Folder.objects.create(user=owner, name='source')
+    target = Folder.objects.create(user=owner, name='target')
+    files = make_files(owner, source, 50)
+    foreign = make_files(other, None, 1)[0]
+
+    with django_assert_max_num_queries(10):
+        results = move_items(owner, [f.pk for f in files] + [foreign.pk], target_id=target.pk)
+
+    assert [r['ok'] for r in results] == [True] * 50 + [False]
+    assert results[-1]['error'] == 'Not found or unauthorized'
+    assert File.objects.filter(folder=target).count() == 50
+
+    child = Folder.objects.create(user=owner, name='child', parent_folder=target)
+    results = move_items(owner, folder_ids=[target.pk, source.pk], target_id=child.pk)
+    assert [r['error'] for r in results] == ['A folder cannot be moved inside itself.', None]
+    source.refresh_from_db()
+    assert source.path == f'{child.path}{source.pk.hex}/'
+
+@pytest.mark.django_db
+def test_folder_moves_check_cycles_on_the_stored_paths(users, monkeypatch):
+    owner = users[0]
+    a = Folder.objects.create(user=owner, name='a')
+    b = Folder.objects.create(user=owner, name='b')
+    load = operations._load
+
+    def load_then_race(*args):
+        # Another request moves `b` into `a` after this one read its folders
+        loaded = load(*args)
+        stored = Folder.objects.get(pk=b.pk)
+        stored.parent_folder = a
+        stored.save()
+        return loaded
+
+    monkeypatch.setattr(operations, '_load', load_then_race)
+    results = move_items(owner, folder_ids=[a.pk], target_id=b.pk)
+    assert results[0]['error'] == 'A folder cannot be moved inside itself.'
+    a.refresh_from_db()
+    assert a.parent_folder_id is None
+
+@pytest.mark.django_db
+def test_bulk_copy_shares_blobs_and_renames_clashes(users):
+    owner = users[0]
+    folder = Folder.objects.create(user=owner, name='docs')
+    sub = Folder.objects.create(user=owner, name='sub', parent_folder=folder)
+    nested = make_files(owner, sub, 2)
+    loose = make_files(owner, None, 1)[0]
+    used = User.objects.get(pk=owner.pk).used_bytes
+
+    results = copy_items(owner, [loose.pk], [folder.pk])
+    assert all(r['ok'] for r in results)
+    file_copy = File.objects.get(pk=results[0]['created_id'])
+    folder_copy = Folder.objects.get(pk=results[1]['created_id'])
+    assert (file_copy.name, folder_copy.name) == ('file0-copy.txt', 'docs-copy')
+    assert file_copy.blob_id == loose.blob_id
+    assert Blob.objects.get(pk=loose.blob_id).ref_count == 2
+
+    sub_copy = folder_copy.folders.get()
+    assert sub_copy.path == f'{folder_copy.path}{sub_copy.pk.hex}/' and sub_copy.depth == 1
+    assert sorted(sub_copy.files.values_list('name', flat=True)) == ['file0.txt', 'file1.txt']
+    assert User.objects.get(pk=owner.pk).used_bytes == used + loose.size + sum(f.size for f in nested)
+    assert get_search_backend().search(owner, 'docs-copy', 10)[0] == ('folder', folder_copy.pk)
+
+    assert copy_items(owner, folder_ids=[folder.pk], target_id=sub.pk)[0]['error'] == 'A folder cannot be copied inside itself.'
+
+@pytest.mark.django_db
+def test_bulk_endpoints_delete_and_share(users):
+    owner, guest = users
+    folder = Folder.objects.create(user=owner, name='docs')
+    files = make_files(owner, folder, 3)
+    client = APIClient()
+    client.force_authenticate(owner)
+
+    response = client.post('/api/bulk/share/', {
+        'files': [str(f.pk) for f in files[:2]], 'folders': [str(folder.pk)],
+        'shared_with': str(guest.pk), 'permission': 'edit',
+    }, format='json')
+    assert response.status_code == 200
+    assert [r['ok'] for r in response.json()['results']] == [True, True, True]
+    assert Share.objects.filter(shared_with=guest, permission='edit').count() == 3
+
+    response = client.post('/api/bulk/delete/', {'files': [str(files[2].pk)], 'folders': [str(folder.pk)]}, format='json')
+    assert [r['ok'] for r in response.json()['results']] == [True, True]
+    assert not File.objects.filter(pk__in=[f.pk for f in files]).exists()
+    assert not delete_items(guest, [files[0].pk])[0]['ok']
+
+    assert client.post('/api/bulk/move/', {'target': str(folder.pk)}, format='json').status_code == 400
+    assert client.post('/api/bulk/rename/', {}, format='json').status_code == 404
+
+@pytest.mark.django_db
+def test_bulk_delete_trashes_in_a_constant_number_of_queries(users, django_assert_max_num_queries):
+    owner = users[0]
+    keep = Folder.objects.create(user=owner, name='keep')
+    loose = make_files(owner, keep, 30)
+    folders = [Folder.objects.create(user=owner, name=f'folder{i}') for i in range(30)]
+    nested = Folder.objects.create(user=owner, name='nested', parent_folder=folders[0])
+    inside = make_files(owner, nested, 2)
+
+    with django_assert_max_num_queries(16):
+        results = delete_items(owner, [f.pk for f in loose + inside], [nested.pk, *(f.pk for f in folders)])
+    assert all(r['ok'] for r in results)
+    assert not File.objects.filter(user=owner).exists() and list(Folder.objects.filter(user=owner)) == [keep]
+    assert recompute() == 0
+
+    # Items deleted along with a selected folder are listed, and restored, with it
+    files, trashed = trashed_items(owner)
+    assert files.count() == 30 and trashed.count() == 30
+    restore(Folder.all_objects.get(pk=folders[0].pk))
+    assert File.objects.filter(folder=nested).count() == 2
+    assert recompute() == 0
+
+@pytest.mark.django_db
+def test_copy_endpoints_clone_a_subtree_without_writing_bytes(users, django_assert_max_num_queries):
+    owner, other = users
+    folder = Folder.objects.create(user=owner, name='project')
+    sub = Folder.objects.create(user=owner, name='src', parent_folder=folder)
+    files = make_files(owner, folder, 20) + make_files(owner, sub, 20)
+    client = APIClient()
+    client.force_authenticate(owner)
+
+    with django_assert_max_num_queries(25):
+        response = client.post(f'/api/folders/{folder.pk}/copy/', {}, format='json')
+    assert response.status_code == 201 and response.json()['name'] == 'project-copy'
+    copy = Folder.objects.get(pk=response.json()['id'])
+    assert File.objects.filter(folder__path__startswith=copy.path).count() == 40
+    assert set(Blob.objects.values_list('ref_count', flat=True)) == {2}
+
+    response = client.post(f'/api/files/{files[0].pk}/copy/', {'target': str(sub.pk)}, format='json')
+    assert response.status_code == 201
+    assert File.objects.get(pk=response.json()['id']).file.name == files[0].file.name
+
+    assert client.post(f'/api/folders/{folder.pk}/copy/', {'target': str(sub.pk)}, format='json').status_code == 400
+    client.force_authenticate(other)
+    assert client.post(f'/api/files/{files[0].pk}/copy/', {}, format='json').status_code == 404
+
+@pytest.mark.django_db
+def test_folder_moves_reject_cycles_and_name_clashes(users, django_assert_max_num_queries):
+    owner, other = users
+    docs = Folder.objects.create(user=owner, name='docs')
+    deep = parent = Folder.objects.create(user=owner, name='a', parent_folder=docs)
+    for i in range(20):
+        deep = Folder.objects.create(user=owner, name=f'level{i}', parent_folder=deep)
+    Folder.objects.create(user=owner, name='a')
+    foreign = Folder.objects.create(user=other, name='foreign')
+    client = APIClient()
+    client.force_authenticate(owner)
+
+    assert client.patch(f'/api/folders/{docs.pk}/', {'parent_folder': str(deep.pk)}, format='json').status_code == 400
+    assert client.patch(f'/api/folders/{docs.pk}/', {'parent_folder': str(foreign.pk)}, format='json').status_code == 400
+    assert client.patch(f'/api/folders/{parent.pk}/', {'parent_folder': None}, format='json').status_code == 400
+    assert client.post(f'/api/folders/{docs.pk}/move/', {'target': str(deep.pk)}, format='json').status_code == 400
+    assert client.post(f'/api/folders/{parent.pk}/move/', {}, format='json').status_code == 400
+
+    # The subtree is re-parented with one UPDATE, whatever its size
+    with django_assert_max_num_queries(20):
+        response = client.post(f'/api/folders/{deep.parent_folder_id}/move/', {}, format='json')
+    assert response.status_code == 200 and response.json()['parent_folder'] is None
+    deep.refresh_from_db()
+    assert deep.depth == 1 and deep.path.startswith(f'/{deep.parent_folder_id.hex}/')
+
+    file = make_files(owner, None, 1)[0]
+    response = client.post(f'/api/files/{file.pk}/move/', {'target': str(docs.pk)}, format='json')
+    assert response.json()['folder'] == str(docs.pk)
@@ -0,0 +1,99 @@
+import pytest
+from datetime import timedelta
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+from drive import permissions
+from drive.models import Folder, File, Share
+from drive.permissions import resolve_permissions
+from drive.schema import schema
+
+User = get_user_model()
+
+@pytest.fixture
+def owner(db):
+    return User.objects.create_user(email='owner@example.com', password='testpassword')
+
+def make_file(user, folder, name):
+    return File.objects.create(user=user, folder=folder, name=name, file=SimpleUploadedFile(name, b'data'))
+
+@pytest.mark.django_db
+def test_folder_share_is_inherited_by_nested_items(owner, guest):
+    root = Folder.objects.create(user=owner, name='root')
+    child = Folder.objects.create(user=owner, name='child', parent_folder=root)
+    nested = make_file(owner, child, 'nested.txt')
+    other = make_file(owner, None, 'other.txt')
+    Share.objects.create(shared_by=owner, shared_with=guest, folder=root, permission='edit')
+    Share.objects.create(shared_by=owner, shared_with=guest, file=nested, permission='manage')
+
+    permissions = resolve_permissions(guest, file_ids=[nested.pk, other.pk], folder_ids=[root.pk, child.pk])
+    assert permissions == {nested.pk: 'manage', other.pk: None, root.pk: 'edit', child.pk: 'edit'}
+    assert resolve_permissions(owner, file_ids=[other.pk])[other.pk] == 'manage'
+    assert nested.has_permission(guest, 'manage')
+    assert not other.has_permission(guest)
+
+@pytest.mark.django_db
+def test_expired_and_inactive_shares_are_ignored(owner, guest):
+    expired = Folder.objects.create(user=owner, name='expired')
+    inactive = Folder.objects.create(user=owner, name='inactive')
+    Share.objects.create(shared_by=owner, shared_with=guest, folder=expired, expires_at=timezone.now() - timedelta(days=1))
+    Share.objects.create(shared_by=owner, shared_with=guest, folder=inactive, is_active=False)
+    assert resolve_permissions(guest, folder_ids=[expired.pk, inactive.pk]) == {expired.pk: None, inactive.pk: None}
+
+@pytest.mark.django_db
+def test_resolve_permissions_query_count_is_constant(owner, guest, django_assert_num_queries):
+    root = Folder.objects.create(user=owner, name='root')
+    Share.objects.create(shared_by=owner, shared_with=guest, folder=root)
+    folders = [Folder.objects.create(user=owner, name=f'f{i}', parent_folder=root) for i in range(5)]
+    files = [make_file(owner, folder, f'{folder.name}.txt') for folder in folders]
+    with django_assert_num_queries(3):
+        permissions = resolve_permissions(guest, file_ids=[f.pk for f in files], folder_ids=[f.pk for f in folders])
+    assert set(permissions.values()) == {'view'}
+
+@pytest.mark.django_db
+def test_for_user_includes_items_below_shared_folders(owner, guest):
+    root = Folder.objects.create(user=owner, name='root')
+    child = Folder.objects.create(user=owner, name='child', parent_folder=root)
+    nested = make_file(owner, child, 'nested.txt')
+    make_file(owner, None, 'private.txt')
+    Share.objects.create(shared_by=owner, shared_with=guest, folder=root, permission='view')
+    assert list(File.objects.for_user(guest)) == [nested]
+    assert set(Folder.objects.for_user(guest)) == {root, child}
+    assert not File.objects.editable_by(guest).exists()
+
+CONTENTS_PERMISSIONS = 'query($id: UUID) { contents(folderId: $id, first: 50) { edges { node { ... on FileType { permission } } } } }'
+
+@pytest.mark.django_db
+def test_pages_of_shared_items_resolve_permissions_once(owner, guest, monkeypatch):
+    client = APIClient()
+    client.force_authenticate(guest)
+    counts = []
+    for size in (2, 10):
+        folder = Folder.objects.create(user=owner, name=f'shared{size}')
+        Share.objects.create(shared_by=owner, shared_with=guest, folder=folder, permission='edit')
+        for i in range(size):
+            make_file(owner, folder, f'{i}.txt')
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(f'/api/folders/{folder.pk}/files/')
+        assert [item['permission'] for item in response.data['results']] == ['edit'] * size
+        counts.append(len(queries))
+
+        request = RequestFactory().post('/graphql/')
+        request.user = guest
+        with CaptureQueriesContext(connection) as queries:
+            result = schema.execute(CONTENTS_PERMISSIONS, context_value=request, variable_values={'id': str(folder.pk)})
+        assert [edge['node']['permission'] for edge in result.data['contents']['edges']] == ['edit'] * size
+        counts.append(len(queries))
+    assert counts[:2] == counts[2:]
+
+    # Checking access to an item and serializing it resolve its permission once
+    calls = []
+    resolve = permissions.resolve_permissions
+    monkeypatch.setattr(permissions, 'resolve_permissions', lambda *args, **kwargs: calls.append(1) or resolve(*args, **kwargs))
+    file = File.objects.filter(folder=folder).first()
+    assert client.get(f'/api/files/{file.pk}/').data['permission'] == 'edit'
+    assert len(calls) == 1
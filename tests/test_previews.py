@@ -0,0 +1,85 @@
+import io
+import pytest
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import Client
+from drive.models import File, Job, Preview
+from drive.serializers import FileSerializer
+from drive.tasks import run_pending
+
+Image = pytest.importorskip('PIL.Image')
+
+User = get_user_model()
+
+def png(width, height):
+    buffer = io.BytesIO()
+    Image.new('RGBA', (width, height), (200, 30, 30, 128)).save(buffer, 'PNG')
+    return buffer.getvalue()
+
+@pytest.mark.django_db
+def test_previews_are_rendered_once_per_content(user, settings, django_capture_on_commit_callbacks):
+    settings.DRIVE_PREVIEW_SIZES = (64, 256)
+    content = png(800, 400)
+    with django_capture_on_commit_callbacks(execute=True):
+        first = File.objects.create(user=user, name='a.png', file=SimpleUploadedFile('a.png', content))
+    with django_capture_on_commit_callbacks(execute=True):
+        run_pending()
+    with django_capture_on_commit_callbacks(execute=True):
+        second = File.objects.create(user=user, name='b.png', file=SimpleUploadedFile('b.png', content))
+    with django_capture_on_commit_callbacks(execute=True):
+        run_pending()
+
+    assert second.blob_id == first.blob_id
+    previews = {p.size: p for p in Preview.objects.all()}
+    assert sorted(previews) == [64, 256]
+    with previews[256].file.open('rb') as rendered:
+        assert Image.open(rendered).size == (256, 128)
+
+    second.refresh_from_db()
+    urls = FileSerializer(second).data['thumbnail_urls']
+    assert set(urls) == {'64', '256'}
+    assert urls['256'] == f'/api/files/{second.pk}/thumbnail/256/?v={second.blob_id[:16]}'
+
+@pytest.mark.django_db
+def test_thumbnail_view_queues_missing_previews_and_caches_forever(user, settings, django_capture_on_commit_callbacks):
+    settings.DRIVE_PREVIEW_SIZES = (64, 256)
+    file = File.objects.create(user=user, name='a.png', mime_type='image/png', file=SimpleUploadedFile('a.png', png(100, 100)))
+    Job.objects.all().delete()
+    client = Client()
+    client.force_login(user)
+
+    # Nothing is rendered in the request, the worker is asked to
+    response = client.get(f'/api/files/{file.pk}/thumbnail/64/')
+    assert response.status_code == 202
+    assert client.get(f'/api/files/{file.pk}/thumbnail/64/').status_code == 202
+    assert Job.objects.get().task == 'drive.processing.generate_previews'
+    with django_capture_on_commit_callbacks(execute=True):
+        run_pending()
+
+    response = client.get(f'/api/files/{file.pk}/thumbnail/64/', {'v': file.blob_id[:16]})
+    assert response.status_code == 200
+    assert response['Content-Type'] == 'image/jpeg'
+    assert 'immutable' in response['Cache-Control']
+    assert Image.open(io.BytesIO(response.content)).size == (64, 64)
+    assert Preview.objects.filter(blob=file.blob, size=64).exists()
+
+    assert client.get(f'/api/files/{file.pk}/thumbnail/64/', HTTP_IF_NONE_MATCH=response['ETag']).status_code == 304
+    assert client.get(f'/api/files/{file.pk}/thumbnail/100/').status_code == 404
+
+    other = User.objects.create_user(email='other@example.com', password='testpassword')
+    client.force_login(other)
+    assert client.get(f'/api/files/{file.pk}/thumbnail/64/').status_code == 404
+
+@pytest.mark.django_db
+def test_undecodable_content_has_no_preview(user, settings, django_capture_on_commit_callbacks):
+    file = File.objects.create(user=user, name='a.png', mime_type='image/png', file=SimpleUploadedFile('a.png', b'not a png'))
+    Job.objects.all().delete()
+    client = Client()
+    client.force_login(user)
+
+    assert client.get(f'/api/files/{file.pk}/thumbnail/256/').status_code == 202
+    Job.objects.update(max_attempts=1)
+    with django_capture_on_commit_callbacks(execute=True):
+        run_pending()
+    assert Job.objects.get().status == Job.Status.FAILED
+    assert client.get(f'/api/files/{file.pk}/thumbnail/256/').status_code == 404
@@ -0,0 +1,68 @@
+import pytest
+import uuid
+from django.db import connection
+from django.utils import timezone
+from drive.models import File, Folder
+from drive.pagination import paginate
+from drive.permissions import active_shares
+from drive.sorting import SORTABLE_FIELDS, Sort
+
+pytestmark = pytest.mark.skipif(connection.vendor != 'sqlite', reason='Plans are checked with SQLite EXPLAIN QUERY PLAN')
+
+def plan(queryset):
+    sql, params = queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+        return [row[-1] for row in cursor.fetchall()]
+
+def assert_indexed(queryset):
+    """Fail if the query reads a whole table or sorts its rows itself."""
+    steps = plan(queryset)
+    assert not [step for step in steps if step.startswith('SCAN') or 'TEMP B-TREE' in step], steps
+
+def page(queryset):
+    # The query `paginate` runs for a page after a cursor
+    return queryset.filter(created_at__lt='2030-01-01').order_by('-created_at', '-id')[:21]
+
+@pytest.mark.django_db
+def test_listings_use_their_indexes(user):
+    folder = Folder.objects.create(user=user, name='docs')
+    listings = [
+        # views.index and resolve_contents at the root
+        Folder.objects.filter(user=user, parent_folder=None),
+        File.objects.filter(user=user, folder=None),
+        # views.folder and resolve_contents in a folder
+        Folder.objects.filter(parent_folder=folder),
+        File.objects.filter(folder=folder),
+        # resolve_folders and resolve_files
+        user.folders.filter(parent_folder_id=folder.pk),
+        user.files.filter(folder_id=folder.pk),
+        user.folders.filter(parent_folder__isnull=True),
+        user.files.filter(folder__isnull=True),
+    ]
+    for queryset in listings:
+        assert_indexed(queryset)
+        assert_indexed(page(queryset))
+
+@pytest.mark.django_db
+def test_share_probes_use_their_index(user):
+    assert_indexed(active_shares(user))
+    assert paginate(Folder.objects.filter(user=user), 5) == ([], False)
+
+@pytest.mark.django_db
+def test_every_registered_sort_uses_an_index(user):
+    folder = Folder.objects.create(user=user, name='docs')
+    # The list endpoints, then the subfolders and files actions of a folder
+    listings = {
+        Folder: [Folder.objects.filter(user=user), folder.folders.all()],
+        File: [File.objects.filter(user=user), folder.files.all()],
+    }
+    for model, fields in SORTABLE_FIELDS.items():
+        item = model(user=user, pk=uuid.uuid4(), name='x', created_at=timezone.now(), updated_at=timezone.now())
+        item.size = item.total_size = 1
+        for field in fields:
+            for descending in (True, False):
+                sort = Sort(model, field, descending)
+                for listing in listings[model]:
+                    assert_indexed(listing.order_by(*sort.ordering)[:11])
+                    assert_indexed(listing.filter(sort.after(sort.encode_cursor(item))).order_by(*sort.ordering)[:11])
@@ -0,0 +1,55 @@
+import pytest
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from rest_framework.test import APIClient
+from drive.models import File
+from drive.quota import QuotaExceeded, reconcile_usage
+
+User = get_user_model()
+
+def used_bytes(user):
+    user.refresh_from_db()
+    return user.used_bytes
+
+@pytest.mark.django_db
+def test_usage_follows_create_replace_and_delete(user):
+    file = File.objects.create(user=user, name='a.txt', file=SimpleUploadedFile('a.txt', b'x' * 100))
+    assert used_bytes(user) == 100
+
+    file.file = SimpleUploadedFile('a.txt', b'x' * 40)
+    file.save()
+    assert used_bytes(user) == 40
+
+    file.delete()
+    assert used_bytes(user) == 0
+
+@pytest.mark.django_db
+def test_files_over_quota_are_rejected(user):
+    User.objects.filter(pk=user.pk).update(quota=150)
+    File.objects.create(user=user, name='a.txt', file=SimpleUploadedFile('a.txt', b'x' * 100))
+
+    with pytest.raises(QuotaExceeded):
+        File.objects.create(user=user, name='b.txt', file=SimpleUploadedFile('b.txt', b'y' * 100))
+    assert File.objects.count() == 1
+    assert used_bytes(user) == 100
+
+@pytest.mark.django_db
+def test_upload_over_quota_is_rejected_before_reading_the_body(user):
+    User.objects.filter(pk=user.pk).update(quota=1000)
+    client = APIClient()
+    client.force_authenticate(user)
+
+    response = client.post('/api/files/', {'name': 'big.bin', 'file': SimpleUploadedFile('big.bin', b'z' * 2000)}, format='multipart')
+    assert response.status_code == 403
+    assert not File.objects.exists()
+
+    response = client.post('/api/uploads/', {'name': 'big.bin', 'size': 2000}, format='json')
+    assert response.status_code == 403
+
+@pytest.mark.django_db
+def test_reconcile_repairs_drifted_counters(user):
+    File.objects.create(user=user, name='a.txt', file=SimpleUploadedFile('a.txt', b'x' * 100))
+    User.objects.filter(pk=user.pk).update(used_bytes=12345)
+
+    reconcile_usage()
+    assert used_bytes(user) == 100
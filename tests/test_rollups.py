@@ -0,0 +1,106 @@
+import importlib
+import pytest
+from django.apps import apps
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from drive.listings import folder_scope, generation
+from drive.models import File, Folder
+from drive.operations import copy_items, move_items
+from drive.rollups import recompute
+from drive.trash import restore, trash
+
+User = get_user_model()
+
+def upload(user, folder, name, size):
+    return File.objects.create(user=user, folder=folder, name=name, file=SimpleUploadedFile(name, name[0].encode() * size))
+
+def rollups(folder):
+    folder = Folder.all_objects.get(pk=folder.pk)
+    return folder.total_size, folder.file_count, folder.folder_count
+
+@pytest.mark.django_db
+def test_rollups_follow_files_through_their_life(user):
+    root = Folder.objects.create(user=user, name='root')
+    a = Folder.objects.create(user=user, name='a', parent_folder=root)
+    b = Folder.objects.create(user=user, name='b', parent_folder=a)
+    other = Folder.objects.create(user=user, name='other')
+    file = upload(user, b, 'x.txt', 100)
+    upload(user, a, 'y.txt', 10)
+    assert rollups(root) == (110, 2, 2)
+    assert rollups(b) == (100, 1, 0)
+
+    file.file = ContentFile(b'z' * 40, name='x.txt')
+    file.save()
+    assert rollups(root) == (50, 2, 2)
+
+    move_items(user, [file.pk], target_id=other.pk)
+    assert rollups(root) == (10, 1, 2) and rollups(other) == (40, 1, 0)
+
+    # A stale copy of the folder in memory does not overwrite its rollups
+    b.name = 'renamed'
+    b.save()
+    move_items(user, folder_ids=[a.pk], target_id=other.pk)
+    assert rollups(root) == (0, 0, 0) and rollups(other) == (50, 2, 2)
+
+    trash(a)
+    assert rollups(other) == (40, 1, 0)
+    restore(Folder.all_objects.get(pk=a.pk))
+    assert rollups(other) == (50, 2, 2)
+
+    file.delete()
+    Folder.objects.get(pk=a.pk).delete()
+    assert rollups(other) == (0, 0, 0)
+    assert recompute() == 0
+
+@pytest.mark.django_db
+def test_copies_carry_their_rollups(user):
+    project = Folder.objects.create(user=user, name='project')
+    src = Folder.objects.create(user=user, name='src', parent_folder=project)
+    upload(user, src, 'main.py', 30)
+    loose = upload(user, None, 'notes.txt', 5)
+    target = Folder.objects.create(user=user, name='archive')
+
+    results = copy_items(user, [loose.pk], [project.pk], target_id=target.pk)
+    assert rollups(Folder.objects.get(pk=results[1]['created_id'])) == (30, 1, 1)
+    assert rollups(target) == (35, 2, 2)
+    assert recompute() == 0
+
+@pytest.mark.django_db
+def test_repair_recomputes_in_one_pass(user, django_assert_max_num_queries):
+    parent = None
+    for depth in range(10):
+        parent = Folder.objects.create(user=user, name=f'level{depth}', parent_folder=parent)
+        upload(user, parent, f'f{depth}.txt', 10)
+    Folder.objects.update(total_size=0, file_count=0, folder_count=0)
+
+    with django_assert_max_num_queries(6):
+        assert recompute() == 10
+    top = Folder.objects.get(name='level0')
+    assert rollups(top) == (100, 10, 9)
+
+    Folder.objects.filter(pk=top.pk).update(total_size=1)
+    call_command('repair_rollups', user=user.email)
+    assert rollups(top) == (100, 10, 9)
+    assert list(user.folders.order_by('-total_size').values_list('name', flat=True)[:2]) == ['level0', 'level1']
+
+@pytest.mark.django_db
+def test_items_added_by_guests_count_towards_the_owners_folders(user):
+    guest = User.objects.create_user(email='guest@example.com', password='testpassword')
+    shared = Folder.objects.create(user=user, name='shared')
+    before = generation(folder_scope(user.pk, None))
+    upload(guest, shared, 'a.txt', 10)
+    # The folder's new totals show in its owner's root listing
+    assert generation(folder_scope(user.pk, None)) != before
+    inbox = Folder.objects.create(user=guest, name='inbox', parent_folder=shared)
+    upload(guest, inbox, 'b.txt', 5)
+    assert rollups(shared) == (15, 2, 1)
+
+    assert recompute(user=user) == 0
+    assert recompute(user=guest) == 0
+    assert rollups(shared) == (15, 2, 1)
+
+    Folder.objects.update(total_size=0, file_count=0, folder_count=0)
+    importlib.import_module('drive.migrations.0023_folder_rollups').backfill_rollups(apps, None)
+    assert rollups(shared) == (15, 2, 1) and rollups(inbox) == (5, 1, 0)
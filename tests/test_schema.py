@@ -0,0 +1,125 @@
+import pytest
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+from drive.models import Folder, File, Share
+from drive.schema import schema
+
+CONTENTS_QUERY = """
+query Contents($folderId: UUID) {
+  contents(folderId: $folderId, first: 100) {
+    edges {
+      node {
+        ... on FileType { id user { email } folder { name } hasShares hasShareLinks shares { id } }
+        ... on FolderType { id user { email } parentFolder { name } hasShares hasShareLinks files { id } folders { id } ancestors { id } }
+      }
+    }
+  }
+}
+"""
+
+def execute(query, user, **variables):
+    request = RequestFactory().post('/graphql/')
+    request.user = user
+    result = schema.execute(query, context_value=request, variable_values=variables)
+    assert result.errors is None, result.errors
+    return result.data
+
+def populate(user, guest, parent, count):
+    for i in range(count):
+        folder = Folder.objects.create(user=user, name=f'folder{i}', parent_folder=parent)
+        Folder.objects.create(user=user, name='child', parent_folder=folder)
+        file = File.objects.create(user=user, folder=parent, name=f'file{i}.txt', file=SimpleUploadedFile('a.txt', b'data'))
+        File.objects.create(user=user, folder=folder, name='nested.txt', file=SimpleUploadedFile('b.txt', b'data'))
+        Share.objects.create(shared_by=user, shared_with=guest, file=file)
+
+@pytest.mark.django_db
+def test_contents_query_count_does_not_grow_with_rows(user, guest):
+    small = Folder.objects.create(user=user, name='small')
+    large = Folder.objects.create(user=user, name='large')
+    populate(user, guest, small, 2)
+    populate(user, guest, large, 10)
+
+    counts = []
+    for folder, expected in ((small, 4), (large, 20)):
+        with CaptureQueriesContext(connection) as queries:
+            data = execute(CONTENTS_QUERY, user, folderId=str(folder.id))
+        assert len(data['contents']['edges']) == expected
+        counts.append(len(queries))
+    assert counts[0] == counts[1]
+
+@pytest.mark.django_db
+def test_computed_fields_are_resolved_per_row(user, guest):
+    folder = Folder.objects.create(user=user, name='folder')
+    populate(user, guest, folder, 1)
+    data = execute(CONTENTS_QUERY, user, folderId=str(folder.id))
+    items = {edge['node']['id']: edge['node'] for edge in data['contents']['edges']}
+    shared = File.objects.get(name='file0.txt')
+    subfolder = Folder.objects.get(name='folder0')
+    assert items[str(shared.id)]['hasShares'] is True
+    assert items[str(shared.id)]['folder'] == {'name': 'folder'}
+    assert items[str(subfolder.id)]['hasShares'] is False
+    assert len(items[str(subfolder.id)]['files']) == 1
+    assert items[str(subfolder.id)]['ancestors'] == [{'id': str(folder.id)}]
+
+@pytest.mark.django_db
+def test_contents_pages_merge_files_and_folders_newest_first(user, guest):
+    folder = Folder.objects.create(user=user, name='folder')
+    populate(user, guest, folder, 3)
+    expected = sorted(
+        [*File.objects.filter(folder=folder), *Folder.objects.filter(parent_folder=folder)],
+        key=lambda item: (item.created_at, item.id.hex),
+        reverse=True,
+    )
+    query = """
+    query Page($folderId: UUID, $after: String) {
+      contents(folderId: $folderId, first: 4, after: $after) {
+        edges { node { ... on FileType { id } ... on FolderType { id } } }
+        pageInfo { hasNextPage endCursor }
+      }
+    }
+    """
+    seen, after = [], None
+    while True:
+        page = execute(query, user, folderId=str(folder.id), after=after)['contents']
+        seen.extend(edge['node']['id'] for edge in page['edges'])
+        if not page['pageInfo']['hasNextPage']:
+            break
+        after = page['pageInfo']['endCursor']
+    assert seen == [str(item.id) for item in expected]
+
+@pytest.mark.django_db
+def test_search_ranks_prefix_and_fuzzy_matches(user, guest):
+    folder = Folder.objects.create(user=user, name='Holiday_Photos')
+    File.objects.create(user=user, folder=folder, name='photo_archive.zip', file=SimpleUploadedFile('a.zip', b'data'))
+    File.objects.create(user=user, name='my_photos.txt', file=SimpleUploadedFile('b.txt', b'data'))
+    File.objects.create(user=guest, name='photo_of_guest.txt', file=SimpleUploadedFile('c.txt', b'data'))
+    query = """
+    query Search($q: String!) {
+      search(query: $q) { edges { node { ... on FileType { name } ... on FolderType { name } } } }
+    }
+    """
+    names = [edge['node']['name'] for edge in execute(query, user, q='photo')['search']['edges']]
+    assert names[0] == 'photo_archive.zip'
+    assert set(names) == {'photo_archive.zip', 'my_photos.txt', 'Holiday_Photos'}
+    fuzzy = [edge['node']['name'] for edge in execute(query, user, q='holliday')['search']['edges']]
+    assert fuzzy[0] == 'Holiday_Photos'
+
+@pytest.mark.django_db
+def test_search_index_follows_renames_and_deletes(user):
+    file = File.objects.create(user=user, name='draft.txt', file=SimpleUploadedFile('a.txt', b'data'))
+    query = 'query Search($q: String!) { search(query: $q) { edges { node { ... on FileType { name } } } } }'
+    file.name = 'final.txt'
+    file.save()
+    assert execute(query, user, q='draft')['search']['edges'] == []
+    assert len(execute(query, user, q='final')['search']['edges']) == 1
+    file.delete()
+    assert execute(query, user, q='final')['search']['edges'] == []
+
+@pytest.mark.django_db
+def test_copy_folder_mutation_returns_the_copy(user):
+    folder = Folder.objects.create(user=user, name='docs')
+    File.objects.create(user=user, folder=folder, name='a.txt', file=SimpleUploadedFile('a.txt', b'data'))
+    mutation = 'mutation Copy($id: UUID!) { copyFolder(id: $id) { folder { name files { name } } } }'
+    assert execute(mutation, user, id=str(folder.pk))['copyFolder']['folder'] == {'name': 'docs-copy', 'files': [{'name': 'a.txt'}]}
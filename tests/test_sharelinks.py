@@ -0,0 +1,94 @@
+import time
+import pytest
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from rest_framework.test import APIClient
+from drive import caching, sharelinks
+from drive.caching import TieredCache
+from drive.checks import check_shared_cache
+from drive.models import Folder, ShareLink
+from drive.sharelinks import ShareLinkError, ShareLinkRateThrottle, resolve_share_link, share_link_cache
+
+User = get_user_model()
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    cache.clear()
+    share_link_cache.local.clear()
+
+@pytest.fixture
+def link(db):
+    user = User.objects.create_user(email='owner@example.com', password='testpassword')
+    folder = Folder.objects.create(user=user, name='public')
+    return ShareLink.objects.create(created_by=user, folder=folder)
+
+@pytest.mark.django_db
+def test_resolved_links_are_served_from_cache(link, django_assert_num_queries):
+    client = APIClient()
+    assert client.get(f'/api/share/{link.pk}/').json()['data']['name'] == 'public'
+
+    with django_assert_num_queries(0):
+        response = client.get(f'/api/share/{link.pk}/')
+    assert response.status_code == 200
+
+    # A cold process falls back on the shared tier
+    share_link_cache.local.clear()
+    with django_assert_num_queries(0):
+        assert resolve_share_link(link.pk).folder.name == 'public'
+
+@pytest.mark.django_db
+def test_cache_follows_link_and_target_changes(link, django_capture_on_commit_callbacks):
+    resolve_share_link(link.pk)
+
+    link.folder.name = 'renamed'
+    link.folder.save()
+    assert resolve_share_link(link.pk).folder.name == 'renamed'
+
+    with django_capture_on_commit_callbacks(execute=True):
+        link.is_active = False
+        link.save()
+    with pytest.raises(ShareLinkError):
+        resolve_share_link(link.pk)
+
+@pytest.mark.django_db
+def test_password_guesses_are_throttled(link, monkeypatch):
+    monkeypatch.setattr(ShareLinkRateThrottle, 'rate', '3/hour', raising=False)
+    link.set_password('secret')
+    link.save()
+    client = APIClient()
+
+    for _ in range(3):
+        assert client.get(f'/api/share/{link.pk}/', {'password': 'guess'}).status_code == 403
+    response = client.get(f'/api/share/{link.pk}/', {'password': 'secret'})
+    assert response.status_code == 429
+    assert int(response['Retry-After']) > 0
+    assert client.get(f'/api/share/{link.pk}/download/', {'password': 'secret'}).status_code == 429
+
+    # Other links are counted apart
+    other = ShareLink.objects.create(created_by=link.created_by, folder=link.folder)
+    assert client.get(f'/api/share/{other.pk}/').status_code == 200
+
+@pytest.mark.django_db
+def test_revocation_reaches_other_workers(link, monkeypatch, django_capture_on_commit_callbacks):
+    # Two workers, each with its own memory tier over the shared backend
+    worker = TieredCache('drive:sharelink', local_ttl=5)
+    monkeypatch.setattr(sharelinks, 'share_link_cache', worker)
+    resolve_share_link(link.pk)
+
+    monkeypatch.setattr(sharelinks, 'share_link_cache', TieredCache('drive:sharelink', local_ttl=5))
+    with django_capture_on_commit_callbacks(execute=True):
+        link.is_active = False
+        link.save()
+
+    # The other worker only keeps its copy for its short local TTL
+    monkeypatch.setattr(sharelinks, 'share_link_cache', worker)
+    now = time.monotonic()
+    monkeypatch.setattr(caching.time, 'monotonic', lambda: now + 6)
+    with pytest.raises(ShareLinkError):
+        resolve_share_link(link.pk)
+
+def test_process_local_cache_is_refused(settings):
+    settings.DEBUG = False
+    assert [e.id for e in check_shared_cache(None)] == ['drive.E001']
+    settings.DEBUG = True
+    assert check_shared_cache(None) == []
@@ -0,0 +1,74 @@
+import pytest
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import transaction
+from drive.models import File, Job
+from drive.tasks import claim, registry, run_pending, task
+
+@pytest.fixture
+def flaky():
+    calls = []
+
+    @task(name='tests.flaky', max_attempts=2, retry_delay=0)
+    def flaky_task(value):
+        calls.append(value)
+        raise RuntimeError('boom')
+
+    yield flaky_task, calls
+    del registry['tests.flaky']
+
+@pytest.mark.django_db
+def test_mime_type_is_detected_after_the_upload(user, django_capture_on_commit_callbacks):
+    with django_capture_on_commit_callbacks(execute=True):
+        file = File.objects.create(user=user, name='doc.pdf', file=SimpleUploadedFile('doc.pdf', b'%PDF-1.4\n%\xe2\xe3'))
+    file.refresh_from_db()
+    assert file.mime_type == ''
+    assert Job.objects.get().task == 'drive.processing.detect_mime_type'
+
+    assert run_pending() == 1
+    file.refresh_from_db()
+    assert file.mime_type == 'application/pdf'
+    assert not Job.objects.exists()
+
+@pytest.mark.django_db
+def test_jobs_are_claimed_once_by_priority_and_retried(flaky, django_capture_on_commit_callbacks):
+    flaky_task, calls = flaky
+    with django_capture_on_commit_callbacks(execute=True):
+        flaky_task.delay('low')
+        Job.objects.create(task='tests.flaky', args=['high'], priority=5, max_attempts=2)
+
+    job = claim('worker-1')
+    assert job.args == ['high'] and job.attempts == 1
+    assert claim('worker-2').args == ['low']
+    assert claim('worker-3') is None
+    Job.objects.update(status=Job.Status.QUEUED, attempts=0)
+
+    run_pending()
+    assert calls == ['high', 'high', 'low', 'low']
+    assert set(Job.objects.values_list('status', flat=True)) == {Job.Status.FAILED}
+    assert 'RuntimeError: boom' in Job.objects.first().last_error
+
+@pytest.mark.django_db
+def test_eager_tasks_run_after_commit(user, settings, django_capture_on_commit_callbacks):
+    settings.DRIVE_TASKS_EAGER = True
+    with django_capture_on_commit_callbacks(execute=True):
+        file = File.objects.create(user=user, name='a.txt', file=SimpleUploadedFile('a.txt', b'plain text'))
+    file.refresh_from_db()
+    assert file.mime_type == 'text/plain'
+    assert not Job.objects.exists()
+
+@pytest.mark.django_db
+def test_jobs_are_queued_with_the_transaction(flaky, settings, django_capture_on_commit_callbacks):
+    flaky_task, calls = flaky
+    with pytest.raises(RuntimeError), transaction.atomic():
+        flaky_task.delay('rolled back')
+        assert Job.objects.filter(task='tests.flaky').exists()
+        raise RuntimeError('abort')
+    assert not Job.objects.exists()
+
+    # Eager failures are retried like queued ones rather than raised into the caller
+    settings.DRIVE_TASKS_EAGER = True
+    with django_capture_on_commit_callbacks(execute=True):
+        flaky_task.delay('eager')
+    job = Job.objects.get()
+    assert calls == ['eager']
+    assert (job.status, job.attempts) == (Job.Status.QUEUED, 1)
@@ -0,0 +1,136 @@
+import pytest
+from datetime import timedelta
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from rest_framework.test import APIClient
+from drive.models import Blob, Change, File, Folder, ShareLink
+from drive.search import SQLITE_INDEX_TABLE, SQLiteSearchBackend
+from drive.sharelinks import ShareLinkError, resolve_share_link, share_link_cache
+from drive.tasks import run_pending
+from drive.trash import purge_trash, restore, trash, trash_many, trashed_items
+
+User = get_user_model()
+
+def make_tree(user, name='root', levels=3, files_per_folder=5):
+    root = parent = Folder.objects.create(user=user, name=name)
+    for level in range(levels):
+        for i in range(files_per_folder):
+            File.objects.create(user=user, folder=parent, name=f'f{i}.txt', file=SimpleUploadedFile('a.txt', f'{level}-{i}'.encode()))
+        parent = Folder.objects.create(user=user, name=f'level{level}', parent_folder=parent)
+    return root
+
+@pytest.mark.django_db
+def test_trash_hides_a_subtree_in_constant_queries(user, django_assert_max_num_queries):
+    small, large = make_tree(user, 'small', levels=1), make_tree(user, 'large', levels=4)
+
+    with django_assert_max_num_queries(9) as small_queries:
+        trash(small)
+    with django_assert_max_num_queries(len(small_queries)):
+        trash(large)
+
+    assert not File.objects.filter(user=user).exists()
+    assert not Folder.objects.filter(user=user).exists()
+    files, folders = trashed_items(user)
+    assert not files.exists()
+    assert {f.pk for f in folders} == {small.pk, large.pk}
+
+@pytest.mark.django_db
+def test_restore_brings_the_subtree_back(user):
+    root = make_tree(user, levels=2)
+    loose = root.folders.get().files.first()
+    trash(loose)
+    trash(root)
+
+    # A new folder may take the name of a trashed one
+    clash = Folder.objects.create(user=user, name='root')
+    with pytest.raises(ValidationError):
+        restore(Folder.all_objects.get(pk=root.pk))
+    clash.delete()
+
+    restore(Folder.all_objects.get(pk=root.pk))
+    assert Folder.objects.filter(user=user).count() == 3
+    # The file trashed on its own stays in the trash
+    assert File.objects.filter(user=user).count() == 9
+    assert list(trashed_items(user)[0]) == [File.all_objects.get(pk=loose.pk)]
+
+@pytest.mark.django_db
+def test_purge_deletes_rows_releases_blobs_and_quota(user, django_capture_on_commit_callbacks):
+    root = make_tree(user, levels=2)
+    keep = File.objects.create(user=user, name='keep.txt', file=SimpleUploadedFile('k.txt', b'keep'))
+    trash(root)
+
+    assert purge_trash() == 0
+    assert User.objects.get(pk=user.pk).used_bytes > keep.size
+
+    with django_capture_on_commit_callbacks(execute=True):
+        assert purge_trash(older_than=timedelta(0), batch_size=3) == 13
+    assert File.all_objects.filter(user=user).count() == 1
+    assert not Folder.all_objects.filter(user=user).exists()
+    assert list(Blob.objects.values_list('pk', flat=True)) == [keep.blob_id]
+    assert User.objects.get(pk=user.pk).used_bytes == keep.size
+
+@pytest.mark.django_db
+def test_trash_endpoints_and_share_links(user, django_capture_on_commit_callbacks):
+    folder = make_tree(user, levels=1)
+    link = ShareLink.objects.create(created_by=user, folder=folder)
+    share_link_cache.local.clear()
+    resolve_share_link(link.pk)
+    client = APIClient()
+    client.force_authenticate(user)
+
+    assert client.delete(f'/api/folders/{folder.pk}/').status_code == 204
+    with pytest.raises(ShareLinkError):
+        resolve_share_link(link.pk)
+    assert [f['id'] for f in client.get('/api/trash/').json()['folders']] == [str(folder.pk)]
+
+    response = client.post('/api/trash/', {'folders': [str(folder.pk), str(user.pk)]}, format='json')
+    assert [r['ok'] for r in response.json()['results']] == [True, False]
+    assert resolve_share_link(link.pk).folder == folder
+
+    trash(folder)
+    with django_capture_on_commit_callbacks(execute=True):
+        assert client.delete('/api/trash/').status_code == 202
+    run_pending()
+    assert not Folder.all_objects.filter(pk=folder.pk).exists()
+
+@pytest.mark.django_db
+def test_purge_does_not_announce_deletes_again(user, django_capture_on_commit_callbacks, django_assert_max_num_queries):
+    small, large = make_tree(user, 'small', levels=1), make_tree(user, 'large', levels=4)
+    deleted = Change.objects.filter(user=user, action=Change.Action.DELETED)
+
+    # Blobs and quotas are released per batch, not per row
+    trash(small)
+    with django_capture_on_commit_callbacks(execute=True), django_assert_max_num_queries(30) as small_queries:
+        assert purge_trash(older_than=timedelta(0)) == 7
+    trash(large)
+    with django_capture_on_commit_callbacks(execute=True), django_assert_max_num_queries(len(small_queries)):
+        assert purge_trash(older_than=timedelta(0)) == 25
+
+    # Trashing announced each subtree once, purging adds nothing
+    assert sorted(deleted.values_list('item_id', flat=True)) == sorted([small.pk, large.pk])
+    assert not Blob.objects.exists()
+    assert User.objects.get(pk=user.pk).used_bytes == 0
+
+@pytest.mark.skipif(connection.vendor != 'sqlite', reason='Checks the SQLite FTS index')
+@pytest.mark.django_db
+def test_trashed_items_leave_the_search_index(user):
+    root = make_tree(user, levels=2)
+    loose = File.objects.create(user=user, name='report.txt', file=SimpleUploadedFile('r.txt', b'report'))
+    backend = SQLiteSearchBackend()
+
+    def found(query):
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT count(*) FROM {SQLITE_INDEX_TABLE} WHERE name LIKE %s', [f'%{query}%'])
+            return cursor.fetchone()[0]
+
+    assert found('level') == 2 and found('f0.txt') == 2 and found('report') == 1
+    trash(root)
+    trash_many(file_ids=[loose.pk])
+    assert found('level') == found('f0.txt') == found('report') == 0
+    assert backend.search(user, 'level', 10) == []
+
+    restore(Folder.all_objects.get(pk=root.pk))
+    restore(File.all_objects.get(pk=loose.pk))
+    assert found('level') == 2 and found('f0.txt') == 2 and found('report') == 1
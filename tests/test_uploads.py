@@ -0,0 +1,130 @@
+import fcntl
+import hashlib
+import os
+import pytest
+from datetime import timedelta
+from django.core.management import call_command
+from django.db import connection
+from django.utils import timezone
+from rest_framework.test import APIClient
+from drive import uploads
+from drive.models import Folder, File, UploadSession
+from drive.uploads import expire_uploads, staging_path
+
+CHUNK = 1024 * 1024
+
+@pytest.fixture
+def client(user):
+    client = APIClient()
+    client.force_authenticate(user=user)
+    return client
+
+def put_chunk(client, upload_id, data, start, total, checksum=None):
+    headers = {'HTTP_CONTENT_RANGE': f'bytes {start}-{start + len(data) - 1}/{total}'}
+    if checksum:
+        headers['HTTP_X_CHUNK_SHA256'] = checksum
+    return client.put(f'/api/uploads/{upload_id}/', data, content_type='application/octet-stream', **headers)
+
+@pytest.mark.django_db
+def test_chunked_upload_resumes_from_last_acknowledged_chunk(client, user):
+    folder = Folder.objects.create(user=user, name='docs')
+    content = b'%PDF-1.4\n' + b'x' * (CHUNK + CHUNK // 2)
+    response = client.post('/api/uploads/', {'name': 'report.pdf', 'size': len(content), 'chunk_size': CHUNK, 'folder': str(folder.id)})
+    assert response.status_code == 201
+    upload_id = response.data['id']
+
+    first, second = content[:CHUNK], content[CHUNK:]
+    response = put_chunk(client, upload_id, first, 0, len(content), hashlib.sha256(first).hexdigest())
+    assert response.data['offset'] == CHUNK
+
+    # A corrupted retry of the second chunk is rejected without moving the offset
+    response = put_chunk(client, upload_id, second, CHUNK, len(content), hashlib.sha256(b'other').hexdigest())
+    assert response.status_code == 409
+    assert response.data['offset'] == CHUNK
+
+    # Sending the first chunk again tells the client where to resume
+    response = put_chunk(client, upload_id, first, 0, len(content))
+    assert response.status_code == 409
+    assert client.get(f'/api/uploads/{upload_id}/').data['offset'] == CHUNK
+
+    assert put_chunk(client, upload_id, second, CHUNK, len(content)).status_code == 200
+    response = client.post(f'/api/uploads/{upload_id}/commit/')
+    assert response.status_code == 201
+
+    file = File.objects.get(pk=response.data['id'])
+    assert file.folder == folder
+    assert file.size == len(content)
+    assert file.mime_type == 'application/pdf'
+    with file.file.open('rb') as stored:
+        assert stored.read() == content
+    assert list(UploadSession.objects.get(pk=upload_id).chunks.values_list('sha256', flat=True)) == [
+        hashlib.sha256(first).hexdigest(), hashlib.sha256(second).hexdigest()
+    ]
+
+@pytest.mark.django_db
+def test_commit_requires_every_chunk(client):
+    response = client.post('/api/uploads/', {'name': 'big.bin', 'size': 2 * CHUNK, 'chunk_size': CHUNK})
+    upload_id = response.data['id']
+    put_chunk(client, upload_id, b'a' * CHUNK, 0, 2 * CHUNK)
+    response = client.post(f'/api/uploads/{upload_id}/commit/')
+    assert response.status_code == 409
+    assert response.data['offset'] == CHUNK
+    assert not File.objects.exists()
+
+@pytest.mark.django_db
+def test_abandoned_uploads_expire(client, user, settings):
+    user.quota = 3 * CHUNK
+    user.save()
+    assert client.post('/api/uploads/', {'name': 'huge.bin', 'size': 4 * CHUNK, 'chunk_size': 128 * CHUNK}).status_code == 400
+
+    upload_id = client.post('/api/uploads/', {'name': 'big.bin', 'size': 2 * CHUNK, 'chunk_size': CHUNK}).data['id']
+    put_chunk(client, upload_id, b'a' * CHUNK, 0, 2 * CHUNK)
+    staged = staging_path(UploadSession.objects.get(pk=upload_id))
+    assert os.path.exists(staged)
+    # The unfinished upload still reserves its space
+    assert client.post('/api/uploads/', {'name': 'more.bin', 'size': 2 * CHUNK}).status_code == 403
+
+    assert expire_uploads() == 0
+    UploadSession.objects.filter(pk=upload_id).update(updated_at=timezone.now() - timedelta(hours=25))
+    assert client.post('/api/uploads/', {'name': 'more.bin', 'size': 2 * CHUNK}).status_code == 201
+    call_command('expire_uploads')
+    assert not UploadSession.objects.filter(pk=upload_id).exists()
+    assert not os.path.exists(staged)
+
+@pytest.mark.django_db
+def test_chunks_of_one_upload_are_written_one_at_a_time(client):
+    upload_id = client.post('/api/uploads/', {'name': 'big.bin', 'size': CHUNK, 'chunk_size': CHUNK}).data['id']
+    staged = staging_path(UploadSession.objects.get(pk=upload_id))
+    os.makedirs(os.path.dirname(staged), exist_ok=True)
+    with open(staged, 'ab') as busy:
+        fcntl.flock(busy, fcntl.LOCK_EX)
+        response = put_chunk(client, upload_id, b'a' * CHUNK, 0, CHUNK)
+    assert response.status_code == 409
+    assert put_chunk(client, upload_id, b'a' * CHUNK, 0, CHUNK).data['offset'] == CHUNK
+
+@pytest.mark.django_db(transaction=True)
+def test_commit_hashes_outside_of_a_transaction(client, monkeypatch):
+    upload_id = client.post('/api/uploads/', {'name': 'big.bin', 'size': 2 * CHUNK, 'chunk_size': CHUNK}).data['id']
+    put_chunk(client, upload_id, b'a' * CHUNK, 0, 2 * CHUNK)
+    put_chunk(client, upload_id, b'b' * CHUNK, CHUNK, 2 * CHUNK)
+    hashed_in = []
+    hash_staging = uploads._hash_staging
+
+    def spy(path):
+        hashed_in.append(connection.in_atomic_block)
+        return hash_staging(path)
+
+    monkeypatch.setattr(uploads, '_hash_staging', spy)
+    response = client.post(f'/api/uploads/{upload_id}/commit/')
+    assert response.status_code == 201
+    assert hashed_in == [False]
+    assert File.objects.get().blob_id == hashlib.sha256(b'a' * CHUNK + b'b' * CHUNK).hexdigest()
+    # Committing again returns the same file
+    assert client.post(f'/api/uploads/{upload_id}/commit/').data['id'] == response.data['id']
+
+@pytest.mark.django_db
+def test_chunk_without_a_body_is_rejected(client):
+    upload_id = client.post('/api/uploads/', {'name': 'big.bin', 'size': CHUNK, 'chunk_size': CHUNK}).data['id']
+    response = client.put(f'/api/uploads/{upload_id}/', HTTP_CONTENT_RANGE=f'bytes 0-{CHUNK - 1}/{CHUNK}')
+    assert response.status_code == 400
+    assert UploadSession.objects.get(pk=upload_id).offset == 0